@@ -4504,7 +4504,7 @@ def page_not_found(e):
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session, make_response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, send_file, session, make_response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from functools import wraps
 from flask_migrate import Migrate
@@ -4515,7 +4515,7 @@ from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from datetime import datetime, timedelta
 import pytz
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, case
 import json
 import os
 import logging
@@ -4527,8 +4527,30 @@ from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill
 
 from config import config
-from models import db, User, Category, Product, Sale, SaleItem, Customer, Payment, Expense, ShoppingList, Return, ReturnItem
+from models import db, User, Category, Product, Sale, SaleItem, Customer, Payment, Expense, ShoppingList, Return, ReturnItem, StockMovement
 from forms import LoginForm, UserForm, CategoryForm, ProductForm, SaleForm, SaleItemForm, StockUpdateForm, CustomerForm, PaymentForm, ExpenseForm, ShoppingListForm
+from debt_ledger import post_sale_to_ledger, post_payment_to_ledger, post_return_to_ledger, global_debt_stats
+from stats_cache import stats_cache, DEBT_STATS_KEY
+from dashboard_metrics import compute_dashboard_metrics
+from date_ranges import egypt_today, egypt_day_start_utc, date_range_filter, in_egypt_day
+from offline_sync import ingest_offline_sales
+from sales_export import (EXPORT_FORMATS, count_export_rows, iter_export_rows,
+                          stream_json, stream_ndjson, stream_csv, stream_xlsx, stream_file)
+from catalog_cache import current_catalog_version, catalog_etag, catalog_payload, catalog_changes, serialize_product
+from sales_rollup import (post_sale_to_rollup, post_payment_to_rollup, post_return_to_rollup,
+                          rollup_totals, rollup_by_day)
+from inventory_analytics import (INVENTORY_COLUMNS, count_inventory_rows, iter_inventory_rows,
+                                 product_filters, product_ordering, inventory_summary)
+from product_search import product_search_filter, search_products
+from product_suggest import suggest_index
+from stock_reservation import requested_quantities, reserve_stock
+from stock_movements import set_stock_reason, record_movements, stock_at, movement_summary
+from product_import import import_products
+from job_queue import job_handler, submit_job, get_job, serialize_job
+from database_export import write_database_xlsx, stream_database_json
+from payment_allocation import allocate_payment, apply_allocation
+from query_profiles import sale_with_lines, sale_with_payments, customer_with_open_sales
+from query_stats import query_stats
 
 app = Flask(__name__)
 
@@ -4547,6 +4569,8 @@ csrf = CSRFProtect(app)
 
 # Initialize security extensions
 mail = Mail(app)
+stats_cache.init_app(app)
+query_stats.init_app(app)
 
 # Rate limiting (disabled in development)
 if not app.debug:
@@ -4694,24 +4718,10 @@ def inject_debt_stats():
     """إضافة إحصائيات الديون إلى جميع القوالب"""
     if current_user.is_authenticated:
         try:
-            # إحصائيات الديون
-            # حساب إجمالي المبيعات الآجلة (غير المدفوعة بالكامل)
-            unpaid_sales_total = db.session.query(func.sum(Sale.total_amount)).filter(
-                Sale.payment_status != 'paid'
-            ).scalar() or 0
-            
-            # حساب إجمالي الدفعات للمبيعات الآجلة
-            total_payments = db.session.query(func.sum(Payment.amount)).join(Sale).filter(
-                Sale.payment_status != 'paid'
-            ).scalar() or 0
-            
-            # إجمالي الديون = إجمالي المبيعات الآجلة - إجمالي الدفعات
-            total_debt = max(0, unpaid_sales_total - total_payments)
-            
-            customers_with_debt = Customer.query.filter(Customer.id.in_(
-                db.session.query(Sale.customer_id).filter(Sale.payment_status != 'paid').distinct()
-            )).count()
-            return dict(global_total_debt=total_debt, global_customers_with_debt=customers_with_debt)
+            # القيم مخزنة مؤقتاً وتُمسح عند أي بيع أو دفعة أو مرتجع
+            stats = stats_cache.get_or_compute(DEBT_STATS_KEY, global_debt_stats)
+            return dict(global_total_debt=stats['total_debt'],
+                        global_customers_with_debt=stats['customers_with_debt'])
         except:
             return dict(global_total_debt=0, global_customers_with_debt=0)
     return dict(global_total_debt=0, global_customers_with_debt=0)
@@ -4981,202 +4991,97 @@ def send_password_reset_email(user, token):
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get statistics
-    total_products = Product.query.count()
-    low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock_threshold).count()
-    out_of_stock_products = Product.query.filter(Product.stock_quantity <= 0).count()
-    total_categories = Category.query.count()
-    
-    # Sales statistics
-    today = datetime.now().date()
-    today_sales = Sale.query.filter(func.date(Sale.sale_date) == today).all()
-    today_revenue = sum(sale.total_amount for sale in today_sales)
-    
-    # This month sales
-    month_start = datetime.now().replace(day=1).date()
-    month_sales = Sale.query.filter(func.date(Sale.sale_date) >= month_start).all()
-    month_revenue = sum(sale.total_amount for sale in month_sales)
-    
-    # حساب أرباح ومصاريف الشهر الحالي
-    month_profit = sum(sale.total_profit for sale in month_sales)
-    month_cost = sum(sale.cost_amount for sale in month_sales)
-    
-    # مصاريف الشهر الحالي
-    month_expenses = Expense.query.filter(func.date(Expense.expense_date) >= month_start).all()
-    month_total_expenses = sum(expense.amount for expense in month_expenses)
-    
-    # صافي ربح الشهر
-    month_net_profit = month_profit - month_total_expenses
-    
-    # إحصائيات اليوم
-    today_profit = sum(sale.total_profit for sale in today_sales)
-    today_expenses = Expense.query.filter(func.date(Expense.expense_date) == today).all()
-    today_total_expenses = sum(expense.amount for expense in today_expenses)
-    today_net_profit = today_profit - today_total_expenses
-    
-    # حساب المرتجعات اليوم (فقط المقبولة أو قيد المراجعة)
-    today_returns = Return.query.filter(
-        func.date(Return.return_date) == today,
-        Return.status.in_(['pending', 'approved'])
-    ).all()
-    today_refunds = sum(return_transaction.refund_amount for return_transaction in today_returns)
-    
-    # صافي الإيرادات اليوم (المبيعات - المرتجعات)
-    today_net_revenue = today_revenue - today_refunds
+    metrics = compute_dashboard_metrics()
     
     # Recent sales
-    recent_sales = Sale.query.order_by(desc(Sale.sale_date)).limit(5).all()
+    recent_sales = Sale.query.options(db.joinedload(Sale.user)).order_by(desc(Sale.sale_date)).limit(5).all()
     
     # Low stock alerts
     low_stock_alerts = Product.query.filter(Product.stock_quantity <= Product.min_stock_threshold).all()
     
-    # Top selling products (this month)
-    top_products = db.session.query(
-        Product.name_ar,
-        func.sum(SaleItem.quantity).label('total_sold')
-    ).join(SaleItem).join(Sale).filter(
-        func.date(Sale.sale_date) >= month_start
-    ).group_by(Product.id).order_by(desc('total_sold')).limit(5).all()
-    
-    # إحصائيات الديون
-    # حساب إجمالي المبيعات الآجلة (غير المدفوعة بالكامل)
-    unpaid_sales_total = db.session.query(func.sum(Sale.total_amount)).filter(
-        Sale.payment_status != 'paid'
-    ).scalar() or 0
-    
-    # حساب إجمالي الدفعات للمبيعات الآجلة
-    total_payments = db.session.query(func.sum(Payment.amount)).join(Sale).filter(
-        Sale.payment_status != 'paid'
-    ).scalar() or 0
-    
-    # إجمالي الديون = إجمالي المبيعات الآجلة - إجمالي الدفعات
-    total_debt = max(0, unpaid_sales_total - total_payments)
-    
-    customers_with_debt = Customer.query.filter(Customer.id.in_(
-        db.session.query(Sale.customer_id).filter(Sale.payment_status != 'paid').distinct()
-    )).count()
-    
     return render_template('dashboard.html', 
-                         total_products=total_products,
-                         low_stock_products=low_stock_products,
-                         out_of_stock_products=out_of_stock_products,
-                         total_categories=total_categories,
-                         today_revenue=today_revenue,
-                         month_revenue=month_revenue,
+                         total_products=metrics.total_products,
+                         low_stock_products=metrics.low_stock_products,
+                         out_of_stock_products=metrics.out_of_stock_products,
+                         total_categories=metrics.total_categories,
+                         today_revenue=metrics.today_revenue,
+                         month_revenue=metrics.month_revenue,
                          # إحصائيات الأرباح والمصاريف
-                         month_profit=month_profit,
-                         month_cost=month_cost,
-                         month_total_expenses=month_total_expenses,
-                         month_net_profit=month_net_profit,
-                         today_profit=today_profit,
-                         today_expenses=today_total_expenses,  # Fixed: added missing today_expenses
-                         today_total_expenses=today_total_expenses,
-                         today_net_profit=today_net_profit,
-                         today_refunds=today_refunds,
-                         today_net_revenue=today_net_revenue,
+                         month_profit=metrics.month_profit,
+                         month_cost=metrics.month_cost,
+                         month_total_expenses=metrics.month_expenses,
+                         month_net_profit=metrics.month_net_profit,
+                         today_profit=metrics.today_profit,
+                         today_expenses=metrics.today_expenses,
+                         today_total_expenses=metrics.today_expenses,
+                         today_net_profit=metrics.today_net_profit,
+                         today_refunds=metrics.today_refunds,
+                         today_net_revenue=metrics.today_net_revenue,
                          recent_sales=recent_sales,
                          low_stock_alerts=low_stock_alerts,
-                         top_products=top_products,
-                         total_debt=total_debt,
-                         customers_with_debt=customers_with_debt)
+                         top_products=metrics.top_products,
+                         total_debt=metrics.total_debt,
+                         customers_with_debt=metrics.customers_with_debt)
+
+@app.route('/api/dashboard/metrics')
+@login_required
+def api_dashboard_metrics():
+    """مؤشرات لوحة التحكم بصيغة JSON"""
+    return jsonify(compute_dashboard_metrics().to_dict())
 
 @app.route('/products')
 @login_required
 @admin_required
 def products():
-    search = request.args.get('search', '', type=str)
-    category_id = request.args.get('category', 0, type=int)
-    stock_status = request.args.get('stock_status', '', type=str)
-    min_price = request.args.get('min_price', type=float)
-    max_price = request.args.get('max_price', type=float)
-    unit_type = request.args.get('unit_type', '', type=str)
-    sort_by = request.args.get('sort_by', 'name', type=str)
-    
-    query = Product.query
-    
-    # تطبيق فلاتر البحث
-    if search:
-        query = query.filter(
-            Product.name_ar.contains(search) | 
-            Product.description_ar.contains(search)
-        )
-    
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-    
-    if stock_status:
-        if stock_status == 'available':
-            query = query.filter(Product.stock_quantity > Product.min_stock_threshold)
-        elif stock_status == 'low':
-            query = query.filter(
-                Product.stock_quantity <= Product.min_stock_threshold,
-                Product.stock_quantity > 0
-            )
-        elif stock_status == 'out':
-            query = query.filter(Product.stock_quantity <= 0)
-    
-    if min_price is not None:
-        query = query.filter(Product.retail_price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(Product.retail_price <= max_price)
-    
-    if unit_type:
-        query = query.filter(Product.unit_type == unit_type)
-    
-    # ترتيب النتائج
-    if sort_by == 'name':
-        query = query.order_by(Product.name_ar)
-    elif sort_by == 'price':
-        query = query.order_by(desc(Product.retail_price))
-    elif sort_by == 'stock':
-        query = query.order_by(desc(Product.stock_quantity))
-    elif sort_by == 'date':
-        query = query.order_by(desc(Product.created_at))
-    else:
-        query = query.order_by(Product.name_ar)
-    
-    # الحصول على جميع المنتجات (بدون تقسيم)
-    products = query.all()
-    categories = Category.query.all()
-    
-    # حساب الإحصائيات
-    total_wholesale_value = 0
-    total_retail_value = 0
-    total_profit = 0
-    total_products_count = len(products)
-    total_stock_quantity = 0
-    
-    for product in products:
-        wholesale_price = product.wholesale_price or 0
-        retail_price = product.retail_price or product.price or 0
-        stock_quantity = product.stock_quantity or 0
-        
-        total_wholesale_value += wholesale_price * stock_quantity
-        total_retail_value += retail_price * stock_quantity
-        total_profit += (retail_price - wholesale_price) * stock_quantity
-        total_stock_quantity += stock_quantity
-    
-    # إحصائيات إضافية
-    low_stock_count = sum(1 for p in products if p.is_low_stock)
-    out_of_stock_count = sum(1 for p in products if p.is_out_of_stock)
+    criteria, sort_by = product_list_filters()
+    page = request.args.get('page', 1, type=int)
     
-    product_stats = {
-        'total_products_count': total_products_count,
-        'total_wholesale_value': total_wholesale_value,
-        'total_retail_value': total_retail_value,
-        'total_profit': total_profit,
-        'total_stock_quantity': total_stock_quantity,
-        'low_stock_count': low_stock_count,
-        'out_of_stock_count': out_of_stock_count,
-        'profit_margin_percentage': (total_profit / total_wholesale_value * 100) if total_wholesale_value > 0 else 0
-    }
+    # صفحة واحدة من المنتجات، والإحصائيات باستعلام تجميعي على نفس الفلاتر
+    products = product_list_page(criteria, sort_by, page)
+    categories = Category.query.order_by(Category.name_ar).all()
+    product_stats = inventory_summary(*criteria)
     
     return render_template('products/list.html', 
                          products=products, 
                          categories=categories,
                          product_stats=product_stats)
 
+@app.route('/api/products/page')
+@login_required
+@admin_required
+def api_products_page():
+    """صفحة من قائمة المنتجات للتمرير اللانهائي"""
+    criteria, sort_by = product_list_filters()
+    page = request.args.get('page', 1, type=int)
+    products = product_list_page(criteria, sort_by, page)
+    
+    return jsonify({
+        'products': [serialize_product(p) for p in products.items],
+        'html': render_template('products/_rows.html', rows=products.items),
+        'page': products.page,
+        'pages': products.pages,
+        'total': products.total,
+        'next_page': products.next_num if products.has_next else None
+    })
+
+def product_list_filters():
+    """شروط الفلترة والترتيب من معاملات الطلب"""
+    criteria = product_filters(
+        search=request.args.get('search', '', type=str),
+        category_id=request.args.get('category', 0, type=int),
+        stock_status=request.args.get('stock_status', '', type=str),
+        min_price=request.args.get('min_price', type=float),
+        max_price=request.args.get('max_price', type=float),
+        unit_type=request.args.get('unit_type', '', type=str)
+    )
+    return criteria, request.args.get('sort_by', 'name', type=str)
+
+def product_list_page(criteria, sort_by, page):
+    return Product.query.options(db.joinedload(Product.category)).filter(
+        *criteria
+    ).order_by(*product_ordering(sort_by)).paginate(
+        page=page, per_page=50, error_out=False)
+
 @app.route('/products/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -5200,6 +5105,7 @@ def add_product():
             unit_description=form.unit_description.data
         )
         db.session.add(product)
+        set_stock_reason('initial', user_id=current_user.id)
         db.session.commit()
         
         # التحقق من نوع الإجراء المطلوب
@@ -5228,6 +5134,7 @@ def edit_product(id):
     if form.validate_on_submit():
         form.populate_obj(product)
         product.updated_at = datetime.utcnow()
+        set_stock_reason('adjustment', user_id=current_user.id)
         db.session.commit()
         
         # التحقق من نوع الإجراء المطلوب
@@ -5456,7 +5363,11 @@ def delete_user(id):
 def customers():
     """عرض قائمة العملاء"""
     customers = Customer.query.order_by(Customer.name).all()
-    return render_template('customers/list.html', customers=customers)
+    # العملاء الذين لهم مبيعات (لا يمكن حذفهم) باستعلام واحد بدلاً من تحميل مبيعات كل عميل
+    customers_with_sales = {
+        row[0] for row in db.session.query(Sale.customer_id).filter(Sale.customer_id.isnot(None)).distinct()
+    }
+    return render_template('customers/list.html', customers=customers, customers_with_sales=customers_with_sales)
 
 @app.route('/customers/add', methods=['GET', 'POST'])
 @login_required
@@ -5537,7 +5448,9 @@ def delete_customer(id):
 def customer_account(id):
     """عرض حساب العميل والديون"""
     customer = Customer.query.get_or_404(id)
-    sales = Sale.query.filter_by(customer_id=id).order_by(desc(Sale.sale_date)).all()
+    sales = Sale.query.filter_by(customer_id=id).options(
+        *sale_with_lines(), *sale_with_payments()
+    ).order_by(desc(Sale.sale_date)).all()
     return render_template('customers/account.html', customer=customer, sales=sales)
 
 @app.route('/customers/<int:customer_id>/sales/<int:sale_id>/payment', methods=['GET', 'POST'])
@@ -5579,6 +5492,8 @@ def add_payment(customer_id, sale_id):
             else:
                 sale.payment_status = 'partial'
             
+            post_payment_to_ledger(sale, form.amount.data)
+            post_payment_to_rollup(sale, form.amount.data, payment.payment_date)
             db.session.commit()
             flash(f'تم تسجيل دفعة بمبلغ {form.amount.data:.2f} ج.م بنجاح', 'success')
             return redirect(url_for('customer_account', id=customer_id))
@@ -5590,21 +5505,18 @@ def add_payment(customer_id, sale_id):
 @admin_required
 def debts_report():
     """تقرير الديون"""
-    # العملاء الذين لديهم ديون
-    customers_with_debts = []
-    customers = Customer.query.all()
+    # العملاء الذين لديهم ديون مرتبين حسب قيمة الدين (الأكبر أولاً)
+    customers = Customer.query.filter(Customer.total_debt > 0).options(
+        *customer_with_open_sales()
+    ).order_by(desc(Customer.total_debt)).all()
     
+    customers_with_debts = []
     for customer in customers:
-        debt = customer.total_debt
-        if debt > 0:
-            customers_with_debts.append({
-                'customer': customer,
-                'debt': debt,
-                'unpaid_sales': [sale for sale in customer.sales if not sale.is_fully_paid]
-            })
-    
-    # ترتيب حسب قيمة الدين (الأكبر أولاً)
-    customers_with_debts.sort(key=lambda x: x['debt'], reverse=True)
+        customers_with_debts.append({
+            'customer': customer,
+            'debt': customer.total_debt,
+            'unpaid_sales': [sale for sale in customer.sales if not sale.is_fully_paid]
+        })
     
     total_debts = sum(item['debt'] for item in customers_with_debts)
     
@@ -5634,23 +5546,24 @@ def sales():
     if date_from:
         try:
             date_from_dt = datetime.strptime(date_from, '%Y-%m-%d').date()
-            query = query.filter(func.date(Sale.sale_date) >= date_from_dt)
+            query = query.filter(*date_range_filter(Sale.sale_date, start_day=date_from_dt))
         except ValueError:
             pass
     
     if date_to:
         try:
             date_to_dt = datetime.strptime(date_to, '%Y-%m-%d').date()
-            query = query.filter(func.date(Sale.sale_date) <= date_to_dt)
+            query = query.filter(*date_range_filter(Sale.sale_date, end_day=date_to_dt))
         except ValueError:
             pass
     
     # Product search filter
-    if product_search:
-        # Join with SaleItem and Product to search in product names
-        query = query.join(SaleItem).join(Product).filter(
-            Product.name_ar.contains(product_search)
-        ).distinct()
+    search_criterion = product_search_filter(product_search, names_only=True)
+    if search_criterion is not None:
+        # المبيعات التي تحتوي منتجاً مطابقاً (بدون join ثم distinct)
+        query = query.filter(Sale.id.in_(
+            db.session.query(SaleItem.sale_id).join(Product).filter(search_criterion)
+        ))
     
     # Seller filter
     if seller_filter:
@@ -5680,7 +5593,7 @@ def sales():
         query = query.filter(Sale.user_id == current_user.id)
     
     # Order by newest first and paginate
-    sales = query.order_by(desc(Sale.sale_date)).paginate(
+    sales = query.options(*sale_with_lines()).order_by(desc(Sale.sale_date)).paginate(
         page=page, per_page=20, error_out=False)
     
     # Get all users for seller filter dropdown
@@ -5700,53 +5613,117 @@ def new_sale():
 def api_products():
     """API endpoint to get all products"""
     try:
-        app.logger.info(f"API products called by user: {current_user.username}")
-        products = Product.query.all()
-        app.logger.info(f"Found {len(products)} products in database")
+        # الإصدار يتغير مع أي تعديل على المنتجات أو الأقسام أو المخزون
+        version = current_catalog_version()
+        etag = catalog_etag(version)
         
-        result = []
-        for p in products:
-            try:
-                # Use safe attribute access with fallbacks
-                wholesale_price = p.wholesale_price if p.wholesale_price else (p.price if p.price else 0)
-                retail_price = p.retail_price if p.retail_price else (p.price if p.price else 0)
-                
-                product_data = {
-                    'id': p.id,
-                    'name': p.name_ar or 'منتج غير محدد',
-                    'wholesale_price': float(wholesale_price),
-                    'retail_price': float(retail_price),
-                    'price': float(retail_price),  # Use retail_price as the main price
-                    'stock': float(p.stock_quantity or 0),
-                    'unit_type': p.unit_type or 'كامل',
-                    'category': p.category.name_ar if p.category else 'غير محدد',
-                    'min_stock_threshold': float(p.min_stock_threshold or 10),
-                    'profit_margin': 0,
-                    'profit_percentage': 0
-                }
-                
-                # Add profit calculations if possible
-                try:
-                    if wholesale_price > 0 and retail_price > 0:
-                        profit_margin = retail_price - wholesale_price
-                        profit_percentage = (profit_margin / wholesale_price) * 100
-                        product_data['profit_margin'] = float(profit_margin)
-                        product_data['profit_percentage'] = float(profit_percentage)
-                except:
-                    pass
-                
-                result.append(product_data)
-            except Exception as e:
-                # Skip problematic products but log the error
-                app.logger.error(f"Error processing product {p.id}: {str(e)}")
-                continue
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = app.response_class(catalog_payload(version), mimetype='application/json')
         
-        app.logger.info(f"Returning {len(result)} products to client")
-        return jsonify(result)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         app.logger.error(f"Error in api_products: {str(e)}")
         return jsonify({'error': 'حدث خطأ في تحميل المنتجات'}), 500
 
+@app.route('/api/products/changes')
+@login_required
+def api_product_changes():
+    """المنتجات المعدلة والمحذوفة منذ آخر مزامنة (since = المؤشر المرسل سابقاً)"""
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'error': 'مؤشر المزامنة غير صحيح'}), 400
+    
+    return jsonify(catalog_changes(since or None))
+
+@app.route('/api/products/suggest')
+@login_required
+def api_product_suggest():
+    """اقتراحات المنتجات أثناء الكتابة (بدون q = الأكثر مبيعاً)"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    in_stock = request.args.get('in_stock', '0') == '1'
+    
+    return jsonify(suggest_index.suggest(query, limit=limit, in_stock_only=in_stock))
+
+@app.route('/api/stock/movements')
+@login_required
+def api_stock_movements():
+    """سجل حركات المخزون (الأحدث أولاً)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'ليس لديك صلاحية للوصول إلى هذه البيانات'}), 403
+    
+    try:
+        start_day = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_day = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+    
+    query = StockMovement.query.filter(*date_range_filter(StockMovement.created_at, start_day, end_day))
+    product_id = request.args.get('product_id', type=int)
+    if product_id:
+        query = query.filter(StockMovement.product_id == product_id)
+    if request.args.get('kind'):
+        query = query.filter(StockMovement.kind == request.args['kind'])
+    
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    movements = query.order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).limit(limit)
+    return jsonify([{
+        'id': m.id,
+        'product_id': m.product_id,
+        'quantity': m.quantity,
+        'kind': m.kind,
+        'sale_id': m.sale_id,
+        'return_id': m.return_id,
+        'user_id': m.user_id,
+        'created_at': m.created_at.isoformat()
+    } for m in movements])
+
+@app.route('/api/stock/at')
+@login_required
+def api_stock_at():
+    """المخزون في نهاية يوم معين (date=YYYY-MM-DD)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'ليس لديك صلاحية للوصول إلى هذه البيانات'}), 403
+    
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+    
+    product_id = request.args.get('product_id', type=int)
+    balances = stock_at(egypt_day_start_utc(day + timedelta(days=1)), [product_id] if product_id else None)
+    return jsonify({
+        'date': day.isoformat(),
+        'stock': {str(pid): quantity for pid, quantity in sorted(balances.items())}
+    })
+
+@app.route('/api/stock/summary')
+@login_required
+def api_stock_summary():
+    """مجموع حركات المخزون لكل منتج ونوع حركة في فترة"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'ليس لديك صلاحية للوصول إلى هذه البيانات'}), 403
+    
+    try:
+        start_day = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+        end_day = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+    
+    summary = movement_summary(
+        egypt_day_start_utc(start_day) if start_day else None,
+        egypt_day_start_utc(end_day + timedelta(days=1)) if end_day else None,
+        request.args.get('product_id', type=int)
+    )
+    return jsonify({str(pid): kinds for pid, kinds in summary.items()})
+
 @app.route('/api/categories')
 @login_required
 def api_categories():
@@ -5783,13 +5760,10 @@ def api_create_sale():
     if not data.get('items'):
         return jsonify({'error': 'لا توجد عناصر في البيع'}), 400
     
-    # Validate stock availability
-    for item in data['items']:
-        product = Product.query.get(item['product_id'])
-        if not product:
-            return jsonify({'error': f'المنتج غير موجود'}), 400
-        if product.stock_quantity < item['quantity']:
-            return jsonify({'error': f'الكمية المطلوبة غير متوفرة للمنتج {product.name_ar}'}), 400
+    try:
+        quantities = requested_quantities(data['items'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Get payment info
     payment_type = data.get('payment_type', 'cash')  # 'cash' or 'credit'
@@ -5814,6 +5788,13 @@ def api_create_sale():
     if payment_type == 'credit' and not customer_id:
         return jsonify({'error': 'يجب اختيار عميل للبيع الآجل'}), 400
     
+    # خصم المخزون لكل الأصناف في جملة شرطية واحدة (آمن مع البيع المتزامن)
+    try:
+        unit_costs = reserve_stock(quantities)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    
     # تحديد حالة الدفع
     if payment_type == 'cash':
         payment_status = 'paid'
@@ -5841,21 +5822,23 @@ def api_create_sale():
     )
     db.session.add(sale)
     db.session.flush()  # Get sale.id
+    record_movements({product_id: -quantity for product_id, quantity in quantities.items()},
+                     'sale', sale_id=sale.id, user_id=current_user.id)
     
-    # Create sale items and update stock
+    # Create sale items (المخزون خُصم مسبقاً)
     for item in data['items']:
         sale_item = SaleItem(
             sale_id=sale.id,
-            product_id=item['product_id'],
+            product_id=int(item['product_id']),
             quantity=item['quantity'],
             unit_price=item['unit_price'],
-            total_price=item['total_price']
+            total_price=item['total_price'],
+            unit_cost=unit_costs[int(item['product_id'])]  # تثبيت سعر الجملة وقت البيع
         )
         db.session.add(sale_item)
-        
-        # Update product stock
-        product = Product.query.get(item['product_id'])
-        product.stock_quantity -= item['quantity']
+    
+    post_sale_to_ledger(sale)
+    post_sale_to_rollup(sale)
     
     # إضافة دفعة في حالة البيع الآجل مع دفعة مقدمة
     if payment_type == 'credit' and paid_amount > 0:
@@ -5867,6 +5850,8 @@ def api_create_sale():
             user_id=current_user.id
         )
         db.session.add(payment)
+        post_payment_to_ledger(sale, paid_amount)
+        post_payment_to_rollup(sale, paid_amount, sale.sale_date)
     
     db.session.commit()
     
@@ -5954,42 +5939,41 @@ def api_export_products():
 @app.route('/api/export/sales')
 @login_required
 def api_export_sales():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    """تصدير أصناف المبيعات بشكل متدفق (format = json أو ndjson أو csv أو xlsx)"""
+    start_date = request.args.get('start_date') or request.args.get('date_from')
+    end_date = request.args.get('end_date') or request.args.get('date_to')
+    export_format = request.args.get('format', 'json').lower()
     
-    query = Sale.query.join(User)
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'صيغة التصدير غير مدعومة'}), 400
     
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date + ' 23:59:59')
+    try:
+        start_day = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
     
     # Filter by user role
-    if current_user.role != 'admin':
-        query = query.filter(Sale.user_id == current_user.id)
-    
-    sales = query.order_by(Sale.sale_date.desc()).all()
-    
-    sales_data = []
-    for sale in sales:
-        for item in sale.sale_items:
-            sales_data.append({
-                'sale_id': sale.id,
-                'sale_date': format_egypt_date_only(sale.sale_date),
-                'sale_time': format_egypt_time_only(sale.sale_date),
-                'seller_name': sale.user.username,
-                'seller_role': sale.user.role,
-                'product_name': item.product.name_ar,
-                'product_category': item.product.category.name_ar if item.product.category else 'غير محدد',
-                'quantity': float(item.quantity),
-                'unit_price': float(item.unit_price),
-                'total_price': float(item.total_price),
-                'unit_type': item.product.unit_type,
-                'sale_total': float(sale.total_amount),
-                'notes': sale.notes or ''
-            })
+    user_id = None if current_user.role == 'admin' else current_user.id
+    
+    row_count = count_export_rows(start_day, end_day, user_id)
+    rows = iter_export_rows(start_day, end_day, user_id)
+    
+    filename = f"sales_{start_date or 'all'}_{end_date or 'all'}"
+    if export_format == 'ndjson':
+        body, mimetype = stream_ndjson(rows), 'application/x-ndjson'
+    elif export_format == 'csv':
+        body, mimetype = stream_csv(rows), 'text/csv; charset=utf-8'
+    elif export_format == 'xlsx':
+        body, mimetype = stream_xlsx(rows), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body, mimetype = stream_json(rows), 'application/json'
     
-    return jsonify(sales_data)
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['X-Total-Count'] = str(row_count)
+    if export_format != 'json':
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    return response
 
 @app.route('/api/quick-payment', methods=['POST'])
 @login_required
@@ -6008,56 +5992,27 @@ def api_quick_payment():
         # Get customer
         customer = Customer.query.get_or_404(customer_id)
         
-        # Get unpaid sales for this customer
-        unpaid_sales = Sale.query.filter(
-            Sale.customer_id == customer_id,
-            Sale.payment_status.in_(['unpaid', 'partial'])
-        ).order_by(Sale.sale_date.asc()).all()
+        # توزيع المبلغ على المبيعات غير المسددة بالأقدم أولاً
+        allocations, remaining_amount = allocate_payment(customer.id, amount)
         
-        if not unpaid_sales:
+        if not allocations:
             return jsonify({'success': False, 'message': 'لا توجد ديون لهذا العميل'}), 400
         
-        remaining_amount = amount
-        payments_made = []
-        
-        # Distribute payment across unpaid sales
-        for sale in unpaid_sales:
-            if remaining_amount <= 0:
-                break
-            
-            sale_remaining = sale.remaining_amount
-            if sale_remaining <= 0:
-                continue
-            
-            payment_amount = min(remaining_amount, sale_remaining)
-            
-            # Create payment record
-            payment = Payment(
-                sale_id=sale.id,
-                amount=payment_amount,
-                payment_method=payment_method,
-                notes=f"{notes} - تسديد سريع",
-                user_id=current_user.id
-            )
-            
-            db.session.add(payment)
-            
-            # Update sale payment status
-            sale_total_paid = sale.paid_amount + payment_amount
-            if sale_total_paid >= sale.total_amount:
-                sale.payment_status = 'paid'
-            else:
-                sale.payment_status = 'partial'
-            
-            payments_made.append({
-                'sale_id': sale.id,
-                'amount': payment_amount
+        # معاينة التوزيع دون تسجيل
+        if data.get('preview'):
+            return jsonify({
+                'success': True,
+                'preview': True,
+                'allocations': [{key: a[key] for key in ('sale_id', 'amount', 'remaining_before', 'status')}
+                                for a in allocations],
+                'remaining_amount': remaining_amount
             })
-            
-            remaining_amount -= payment_amount
         
+        apply_allocation(customer.id, allocations, payment_method, f"{notes} - تسديد سريع", current_user.id)
         db.session.commit()
         
+        payments_made = [{'sale_id': a['sale_id'], 'amount': a['amount']} for a in allocations]
+        
         message = f"تم تسديد {amount:.2f} ج.م بنجاح"
         if remaining_amount > 0:
             message += f" (متبقي {remaining_amount:.2f} ج.م كرصيد)"
@@ -6124,50 +6079,32 @@ def api_stock_status():
 @app.route('/api/export/inventory')
 @login_required
 def api_export_inventory():
+    """تصدير المخزون مع مبيعات كل منتج بشكل متدفق (format = json أو ndjson أو csv أو xlsx)"""
     if current_user.role not in ['admin', 'seller']:
-        abort(403)
-    
-    # Get products with stock status
-    products = Product.query.join(Category).all()
-    
-    inventory_data = []
-    for product in products:
-        # Calculate stock status
-        if product.stock_quantity <= 0:
-            status = 'نفدت الكمية'
-            status_en = 'Out of Stock'
-        elif product.stock_quantity <= 10:
-            status = 'كمية قليلة'
-            status_en = 'Low Stock'
-        else:
-            status = 'متوفر'
-            status_en = 'Available'
-        
-        # Calculate total sales for this product
-        total_sold = db.session.query(db.func.sum(SaleItem.quantity)).filter(
-            SaleItem.product_id == product.id
-        ).scalar() or 0
-        
-        total_revenue = db.session.query(db.func.sum(SaleItem.total_price)).filter(
-            SaleItem.product_id == product.id
-        ).scalar() or 0
-        
-        inventory_data.append({
-            'product_id': product.id,
-            'product_name': product.name_ar,
-            'category': product.category.name_ar if product.category else 'غير محدد',
-            'current_stock': float(product.stock_quantity),
-            'unit_type': product.unit_type,
-            'unit_price': float(product.price),
-            'stock_value': float(product.stock_quantity * product.price),
-            'is_whole_unit': product.is_whole_unit,
-            'status_ar': status,
-            'status_en': status_en,
-            'total_sold': float(total_sold),
-            'total_revenue': float(total_revenue)
-        })
+        return jsonify({'error': 'ليس لديك صلاحية'}), 403
+    
+    export_format = request.args.get('format', 'json').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'صيغة التصدير غير مدعومة'}), 400
+    
+    row_count = count_inventory_rows()
+    rows = iter_inventory_rows()
+    
+    if export_format == 'ndjson':
+        body, mimetype = stream_ndjson(rows), 'application/x-ndjson'
+    elif export_format == 'csv':
+        body, mimetype = stream_csv(rows, INVENTORY_COLUMNS), 'text/csv; charset=utf-8'
+    elif export_format == 'xlsx':
+        body = stream_xlsx(rows, INVENTORY_COLUMNS, 'المخزون')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body, mimetype = stream_json(rows), 'application/json'
     
-    return jsonify(inventory_data)
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['X-Total-Count'] = str(row_count)
+    if export_format != 'json':
+        response.headers['Content-Disposition'] = f'attachment; filename=inventory.{export_format}'
+    return response
 
 @app.route('/reports')
 @login_required
@@ -6182,32 +6119,30 @@ def reports():
     end_date = request.args.get('end_date')
     
     if not start_date:
-        start_date = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+        start_date = egypt_today().replace(day=1).strftime('%Y-%m-%d')
     if not end_date:
-        end_date = datetime.now().strftime('%Y-%m-%d')
+        end_date = egypt_today().strftime('%Y-%m-%d')
     
     # Convert to datetime objects
     start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
     end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
     
-    # Sales in date range
-    sales = Sale.query.filter(
-        and_(func.date(Sale.sale_date) >= start_dt,
-             func.date(Sale.sale_date) <= end_dt)
-    ).all()
+    # نطاقات UTC للأيام المحلية (تستخدم فهارس أعمدة التاريخ)
+    sale_in_range = date_range_filter(Sale.sale_date, start_dt, end_dt)
     
-    total_revenue = sum(sale.total_amount for sale in sales)
-    total_sales_count = len(sales)
+    # مجاميع الفترة من ملخص المبيعات اليومي
+    totals = rollup_totals(start_dt, end_dt)
+    
+    total_revenue = totals['revenue']
+    total_sales_count = totals['sales_count']
     
     # حساب الأرباح والتكاليف
-    total_profit = sum(sale.total_profit for sale in sales)
-    total_cost = sum(sale.cost_amount for sale in sales)
+    total_profit, total_cost = totals['profit'], totals['cost']
     profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
     
     # حساب المصاريف في نفس الفترة
     expenses = Expense.query.filter(
-        and_(func.date(Expense.expense_date) >= start_dt,
-             func.date(Expense.expense_date) <= end_dt)
+        *date_range_filter(Expense.expense_date, start_dt, end_dt)
     ).all()
     
     total_expenses = sum(expense.amount for expense in expenses)
@@ -6229,83 +6164,57 @@ def reports():
         func.sum(SaleItem.quantity).label('total_sold'),
         func.sum(SaleItem.total_price).label('total_revenue')
     ).join(SaleItem).join(Sale).filter(
-        and_(func.date(Sale.sale_date) >= start_dt,
-             func.date(Sale.sale_date) <= end_dt)
+        *sale_in_range
     ).group_by(Product.id).order_by(desc('total_sold')).all()
     
     # Daily sales chart data
-    daily_sales_raw = db.session.query(
-        func.date(Sale.sale_date).label('date'),
-        func.sum(Sale.total_amount).label('total')
-    ).filter(
-        and_(func.date(Sale.sale_date) >= start_dt,
-             func.date(Sale.sale_date) <= end_dt)
-    ).group_by(func.date(Sale.sale_date)).order_by('date').all()
-    
-    # Convert to JSON-serializable format
-    daily_sales = []
-    for row in daily_sales_raw:
-        date_str = row.date if isinstance(row.date, str) else row.date.strftime('%Y-%m-%d')
-        daily_sales.append({'date': date_str, 'total': float(row.total or 0)})
+    daily_sales = [
+        {'date': row.date.strftime('%Y-%m-%d'), 'total': float(row.revenue or 0)}
+        for row in rollup_by_day(start_dt, end_dt) if row.sales_count
+    ]
     
     # Debt-related statistics
     # Total debts across all customers
-    total_debts = sum(customer.total_debt for customer in Customer.query.all())
+    total_debts = db.session.query(func.sum(Customer.total_debt)).scalar() or 0
     
     # Count customers with debts
-    customers_with_debts = Customer.query.filter(
-        Customer.id.in_(
-            db.session.query(Sale.customer_id).filter(
-                Sale.payment_status.in_(['unpaid', 'partial'])
-            ).distinct()
-        )
-    ).count()
+    customers_with_debts = Customer.query.filter(Customer.total_debt > 0).count()
     
     # Credit sales in date range
-    credit_sales = Sale.query.filter(
-        and_(func.date(Sale.sale_date) >= start_dt,
-             func.date(Sale.sale_date) <= end_dt,
-             Sale.payment_type == 'credit')
-    ).all()
-    total_credit_sales = len(credit_sales)
+    total_credit_sales = totals['credit_count']
     
     # Total payments in date range
-    total_payments = db.session.query(func.sum(Payment.amount)).join(Sale).filter(
-        and_(func.date(Payment.payment_date) >= start_dt,
-             func.date(Payment.payment_date) <= end_dt)
-    ).scalar() or 0
+    total_payments = totals['payments']
     
     # Payment rate calculation
-    total_credit_amount = sum(sale.total_amount for sale in credit_sales)
+    total_credit_amount = totals['credit_revenue']
     payment_rate = (total_payments / total_credit_amount * 100) if total_credit_amount > 0 else 0
     
-    # Top debtors
+    # Top debtors (highest debt first, top 10)
     top_debtors = []
-    customers_with_debt = Customer.query.join(Sale).filter(
-        Sale.payment_status.in_(['unpaid', 'partial'])
-    ).distinct().all()
+    customers_with_debt = Customer.query.filter(Customer.total_debt > 0).order_by(
+        desc(Customer.total_debt)
+    ).limit(10).all()
+    
+    # عدد المبيعات غير المسددة وآخر بيع لكل عميل في استعلام مجمّع واحد
+    debtor_sales = {
+        row.customer_id: row for row in db.session.query(
+            Sale.customer_id,
+            func.sum(case((Sale.payment_status.in_(['unpaid', 'partial']), 1), else_=0)).label('unpaid_count'),
+            func.max(Sale.sale_date).label('last_sale_date')
+        ).filter(
+            Sale.customer_id.in_([customer.id for customer in customers_with_debt])
+        ).group_by(Sale.customer_id)
+    } if customers_with_debt else {}
     
     for customer in customers_with_debt:
-        if customer.total_debt > 0:
-            unpaid_sales_count = Sale.query.filter(
-                Sale.customer_id == customer.id,
-                Sale.payment_status.in_(['unpaid', 'partial'])
-            ).count()
-            
-            last_sale = Sale.query.filter(
-                Sale.customer_id == customer.id
-            ).order_by(Sale.sale_date.desc()).first()
-            
-            top_debtors.append((
-                customer,
-                customer.total_debt,
-                unpaid_sales_count,
-                last_sale.sale_date if last_sale else None
-            ))
-    
-    # Sort by debt amount (highest first) and take top 10
-    top_debtors.sort(key=lambda x: x[1], reverse=True)
-    top_debtors = top_debtors[:10]
+        sales_row = debtor_sales.get(customer.id)
+        top_debtors.append((
+            customer,
+            customer.total_debt,
+            sales_row.unpaid_count if sales_row else 0,
+            sales_row.last_sale_date if sales_row else None
+        ))
     
     return render_template('reports/index.html',
                          start_date=start_date,
@@ -6349,11 +6258,16 @@ def expenses():
     if expense_type:
         query = query.filter(Expense.expense_type == expense_type)
     
-    if start_date:
-        query = query.filter(func.date(Expense.expense_date) >= start_date)
-    
-    if end_date:
-        query = query.filter(func.date(Expense.expense_date) <= end_date)
+    try:
+        if start_date:
+            query = query.filter(*date_range_filter(
+                Expense.expense_date, start_day=datetime.strptime(start_date, '%Y-%m-%d').date()))
+        
+        if end_date:
+            query = query.filter(*date_range_filter(
+                Expense.expense_date, end_day=datetime.strptime(end_date, '%Y-%m-%d').date()))
+    except ValueError:
+        flash('صيغة التاريخ غير صحيحة', 'error')
     
     expenses = query.order_by(desc(Expense.expense_date)).paginate(
         page=page, per_page=20, error_out=False)
@@ -6602,6 +6516,7 @@ def update_stock():
     if form.validate_on_submit():
         product = Product.query.get(form.product_id.data)
         product.stock_quantity += form.quantity.data
+        set_stock_reason('restock', user_id=current_user.id)
         db.session.commit()
         flash(f'تم تحديث مخزون {product.name_ar} بنجاح', 'success')
         return redirect(url_for('products'))
@@ -7075,137 +6990,42 @@ def debug_export():
 @app.route('/api/export/full-database')
 @login_required
 def api_export_full_database():
+    """تصدير قاعدة البيانات كاملة: ملف XLSX بورقة لكل جدول (format=json لمستند JSON متدفق)"""
     if current_user.role not in ['admin', 'seller']:
-        abort(403)
+        return jsonify({'error': 'ليس لديك صلاحية لتصدير البيانات'}), 403
+    
+    include_users = current_user.role == 'admin'
+    if request.args.get('format', 'xlsx').lower() == 'json':
+        return app.response_class(stream_with_context(stream_database_json(include_users)), mimetype='application/json')
+    
+    body = stream_file(lambda output: write_database_xlsx(output, include_users))
+    response = app.response_class(stream_with_context(body),
+                                  mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response.headers['Content-Disposition'] = f"attachment; filename=full_database_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.xlsx"
+    return response
+
+@app.route('/api/export/full-database/jobs', methods=['POST'])
+@login_required
+def api_export_full_database_job():
+    """تصدير قاعدة البيانات كمهمة خلفية - يعيد رقم المهمة"""
+    if current_user.role not in ['admin', 'seller']:
+        return jsonify({'error': 'ليس لديك صلاحية لتصدير البيانات'}), 403
     
-    try:
-        data = {}
-        
-        # Basic report summary
-        data['report_summary'] = [{
-            'تاريخ التقرير': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'عدد المنتجات': Product.query.count(),
-            'عدد العملاء': Customer.query.count(),
-            'عدد المبيعات': Sale.query.count(),
-            'عدد الفئات': Category.query.count()
-        }]
-        
-        # Products - basic info only
-        products_data = []
-        for p in Product.query.all():
-            products_data.append({
-                'رقم المنتج': p.id,
-                'اسم المنتج': p.name_ar,
-                'سعر الجملة': float(p.wholesale_price),
-                'سعر البيع': float(p.retail_price),
-                'الكمية': float(p.stock_quantity),
-                'نوع الوحدة': p.unit_type,
-                'الحد الأدنى': float(p.min_stock_threshold)
-            })
-        data['products'] = products_data
-        
-        # Categories
-        categories_data = []
-        for c in Category.query.all():
-            categories_data.append({
-                'رقم الفئة': c.id,
-                'اسم الفئة': c.name_ar,
-                'الوصف': c.description_ar or ''
-            })
-        data['categories'] = categories_data
-        
-        # Customers
-        customers_data = []
-        for c in Customer.query.all():
-            customers_data.append({
-                'رقم العميل': c.id,
-                'اسم العميل': c.name,
-                'الهاتف': c.phone or '',
-                'العنوان': c.address or '',
-                'ملاحظات': c.notes or ''
-            })
-        data['customers'] = customers_data
-        
-        # Sales - basic info only
-        sales_data = []
-        for s in Sale.query.all():
-            sales_data.append({
-                'رقم البيع': s.id,
-                'تاريخ البيع': str(s.sale_date),
-                'المبلغ': float(s.total_amount),
-                'نوع الدفع': s.payment_type,
-                'حالة الدفع': s.payment_status,
-                'ملاحظات': s.notes or ''
-            })
-        data['sales'] = sales_data
-        
-        # Sale Items
-        sale_items_data = []
-        for si in SaleItem.query.all():
-            sale_items_data.append({
-                'رقم البيع': si.sale_id,
-                'رقم المنتج': si.product_id,
-                'الكمية': float(si.quantity),
-                'سعر الوحدة': float(si.unit_price),
-                'الإجمالي': float(si.total_price)
-            })
-        data['sale_items'] = sale_items_data
-        
-        # Payments
-        payments_data = []
-        for p in Payment.query.all():
-            payments_data.append({
-                'رقم الدفعة': p.id,
-                'رقم البيع': p.sale_id,
-                'المبلغ': float(p.amount),
-                'تاريخ الدفع': str(p.payment_date),
-                'طريقة الدفع': p.payment_method,
-                'ملاحظات': p.notes or ''
-            })
-        data['payments'] = payments_data
-        
-        # Expenses
-        expenses_data = []
-        for e in Expense.query.all():
-            expenses_data.append({
-                'رقم المصروف': e.id,
-                'الوصف': e.description,
-                'المبلغ': float(e.amount),
-                'النوع': e.expense_type,
-                'التاريخ': str(e.expense_date),
-                'ملاحظات': e.notes or ''
-            })
-        data['expenses'] = expenses_data
-        
-        # Users (admin only)
-        if current_user.role == 'admin':
-            users_data = []
-            for u in User.query.all():
-                users_data.append({
-                    'رقم المستخدم': u.id,
-                    'اسم المستخدم': u.username,
-                    'الدور': u.role,
-                    'تاريخ الإنشاء': str(u.created_at)
-                })
-            data['users'] = users_data
-        
-        return jsonify(data)
-        
-    except Exception as e:
-        # Log the actual error for debugging
-        print(f"Export error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        return jsonify({
-            'error': 'حدث خطأ في تصدير البيانات',
-            'message': str(e)
-        }), 500
-
-@app.route('/api/export/test-database')
-@login_required
-def api_test_database_export():
-    """Simple test endpoint for database export"""
+    job_id = submit_job('export_full_database', {'include_users': current_user.role == 'admin'},
+                        user_id=current_user.id)
+    return jsonify({'job_id': job_id, 'status_url': url_for('api_job_status', job_id=job_id)}), 202
+
+@job_handler('export_full_database')
+def run_full_database_export(job, params):
+    path = job.result_file(f"full_database_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.xlsx",
+                           'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    with open(path, 'wb') as output:
+        return write_database_xlsx(output, include_users=params.get('include_users', False), progress=job.progress)
+
+@app.route('/api/export/test-database')
+@login_required
+def api_test_database_export():
+    """Simple test endpoint for database export"""
     try:
         data = {
             'status': 'success',
@@ -7339,6 +7159,7 @@ def api_create_return():
         # تحديث إجمالي المرتجع وقيمة المرتجعات
         return_obj.total_amount = total_amount
         return_obj.refund_amount = total_amount  # قيمة المرتجعات تساوي إجمالي المرتجع
+        post_return_to_rollup(return_obj, total_amount)
         
         db.session.commit()
         
@@ -7429,13 +7250,18 @@ def api_process_return(return_id):
         
         # إذا تم قبول المرتجع، تحديث المخزون
         if action == 'approve':
+            set_stock_reason('return', sale_id=return_obj.sale_id, return_id=return_obj.id, user_id=current_user.id)
             for return_item in return_obj.return_items:
                 # إضافة الكمية المرتجعة إلى المخزون إذا كانت في حالة جيدة
                 if return_item.condition in ['جيد', 'good']:
                     product = return_item.product
                     product.stock_quantity += return_item.quantity_returned
+            
+            # خصم المرتجع من دين العميل إذا تم استرداده كرصيد
+            post_return_to_ledger(return_obj)
         else:
             # إذا تم رفض المرتجع، إعادة قيمة المرتجعات إلى صفر
+            post_return_to_rollup(return_obj, -(return_obj.refund_amount or 0))
             return_obj.refund_amount = 0
         
         db.session.commit()
@@ -7565,182 +7391,28 @@ def api_products_import_excel():
             return jsonify({'success': False, 'message': 'حجم الملف كبير جداً. الحد الأقصى 5 ميجابايت'}), 400
         
         update_existing = request.form.get('update_existing') == 'true'
+        dry_run = request.form.get('dry_run') == 'true'
         
-        # قراءة ملف Excel باستخدام openpyxl
         try:
-            wb = load_workbook(file)
-            ws = wb.active
+            result = import_products(file, update_existing=update_existing, dry_run=dry_run, user_id=current_user.id)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 400
         except Exception as e:
+            db.session.rollback()
             return jsonify({'success': False, 'message': f'خطأ في قراءة ملف Excel: {str(e)}'}), 400
         
-        # قراءة العناوين من الصف الأول
-        headers = []
-        for cell in ws[1]:
-            if cell.value:
-                headers.append(str(cell.value).strip())
-            else:
-                headers.append('')
-        
-        # التحقق من الأعمدة المطلوبة
-        required_columns = ['اسم المنتج', 'الفئة', 'سعر الجملة', 'سعر البيع', 'الكمية']
-        missing_columns = [col for col in required_columns if col not in headers]
+        app.logger.info(f"Import summary: added={result['added_count']}, updated={result['updated_count']}, "
+                        f"skipped={result['skipped_count']}, errors={len(result['errors'])}, dry_run={dry_run}")
         
-        if missing_columns:
-            return jsonify({
-                'success': False, 
-                'message': f'أعمدة مفقودة: {", ".join(missing_columns)}'
-            }), 400
-        
-        # إنشاء فهرس للأعمدة
-        column_index = {}
-        for i, header in enumerate(headers):
-            if header:
-                column_index[header] = i
-        
-        # إحصائيات الاستيراد
-        added_count = 0
-        updated_count = 0
-        skipped_count = 0
-        errors = []
-        
-        # تعريف دالة مساعدة خارج الحلقة
-        def get_cell_value(row, column_name, default=''):
-            if column_name in column_index and column_index[column_name] < len(row):
-                value = row[column_index[column_name]]
-                if value is None:
-                    return default
-                value_str = str(value).strip()
-                return value_str if value_str.lower() not in ['none', 'nan', ''] else default
-            return default
-        
-        # إضافة logging للتشخيص
-        app.logger.info(f"Starting import process. Total rows to process: {ws.max_row - 1}")
-        
-        # معالجة كل صف (بداية من الصف الثاني)
-        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-            try:
-                # تجاهل الصفوف الفارغة
-                if not any(row) or all(v is None or str(v).strip() == '' for v in row):
-                    app.logger.debug(f"Skipping empty row {row_num}")
-                    continue
-                
-                product_name = get_cell_value(row, 'اسم المنتج')
-                category_name = get_cell_value(row, 'الفئة')
-                
-                app.logger.debug(f"Processing row {row_num}: product='{product_name}', category='{category_name}'")
-                
-                # التحقق من البيانات الأساسية
-                if not product_name or product_name.lower() in ['none', 'nan', '']:
-                    errors.append(f'الصف {row_num}: اسم المنتج فارغ أو غير صحيح')
-                    skipped_count += 1
-                    continue
-                
-                try:
-                    wholesale_price_str = get_cell_value(row, 'سعر الجملة', '0')
-                    retail_price_str = get_cell_value(row, 'سعر البيع', '0')
-                    stock_quantity_str = get_cell_value(row, 'الكمية', '0')
-                    
-                    wholesale_price = float(wholesale_price_str)
-                    retail_price = float(retail_price_str)
-                    stock_quantity = float(stock_quantity_str)
-                except (ValueError, TypeError) as e:
-                    errors.append(f'الصف {row_num}: خطأ في تحويل الأرقام - {str(e)}')
-                    skipped_count += 1
-                    continue
-                
-                if wholesale_price <= 0 or retail_price <= 0:
-                    errors.append(f'الصف {row_num}: أسعار غير صحيحة')
-                    skipped_count += 1
-                    continue
-                
-                if retail_price <= wholesale_price:
-                    errors.append(f'الصف {row_num}: سعر البيع يجب أن يكون أكبر من سعر الجملة')
-                    skipped_count += 1
-                    continue
-                
-                # البحث عن الفئة
-                category = Category.query.filter_by(name_ar=category_name).first()
-                if not category:
-                    errors.append(f'الصف {row_num}: الفئة "{category_name}" غير موجودة')
-                    skipped_count += 1
-                    continue
-                
-                # التحقق من وجود المنتج
-                existing_product = Product.query.filter_by(name_ar=product_name).first()
-                
-                if existing_product and not update_existing:
-                    skipped_count += 1
-                    continue
-                
-                # البيانات الاختيارية
-                description = get_cell_value(row, 'وصف المنتج')
-                
-                try:
-                    min_stock = float(get_cell_value(row, 'الحد الأدنى للمخزون', '10'))
-                except (ValueError, TypeError):
-                    min_stock = 10
-                
-                unit_type = get_cell_value(row, 'نوع الوحدة', 'كامل')
-                if unit_type not in ['كامل', 'جزئي']:
-                    unit_type = 'كامل'
-                
-                unit_description = get_cell_value(row, 'وصف الوحدة')
-                
-                if existing_product and update_existing:
-                    # تحديث المنتج الموجود
-                    app.logger.info(f"Updating existing product: {product_name}")
-                    existing_product.description_ar = description
-                    existing_product.category_id = category.id
-                    existing_product.wholesale_price = wholesale_price
-                    existing_product.retail_price = retail_price
-                    existing_product.price = retail_price
-                    existing_product.stock_quantity = stock_quantity
-                    existing_product.min_stock_threshold = min_stock
-                    existing_product.unit_type = unit_type
-                    existing_product.unit_description = unit_description
-                    existing_product.updated_at = datetime.utcnow()
-                    updated_count += 1
-                else:
-                    # إضافة منتج جديد
-                    app.logger.info(f"Adding new product: {product_name}")
-                    new_product = Product(
-                        name_ar=product_name,
-                        description_ar=description,
-                        category_id=category.id,
-                        wholesale_price=wholesale_price,
-                        retail_price=retail_price,
-                        price=retail_price,
-                        stock_quantity=stock_quantity,
-                        min_stock_threshold=min_stock,
-                        unit_type=unit_type,
-                        unit_description=unit_description
-                    )
-                    db.session.add(new_product)
-                    added_count += 1
-                    
-                app.logger.info(f"Row {row_num} processed successfully")
-                
-            except Exception as e:
-                app.logger.error(f'Error processing row {row_num}: {str(e)}')
-                errors.append(f'الصف {row_num}: {str(e)}')
-                skipped_count += 1
-                continue
+        if dry_run:
+            db.session.rollback()
+            return jsonify({'success': True, 'message': 'تم التحقق من الملف دون حفظ', 'dry_run': True, **result})
         
         # حفظ التغييرات
         try:
-            app.logger.info(f"Import summary: added={added_count}, updated={updated_count}, skipped={skipped_count}, errors={len(errors)}")
             db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': 'تم استيراد المنتجات بنجاح',
-                'added_count': added_count,
-                'updated_count': updated_count,
-                'skipped_count': skipped_count,
-                'errors': errors[:10],  # أول 10 أخطاء فقط
-                'total_rows_processed': added_count + updated_count + skipped_count
-            })
-            
+            return jsonify({'success': True, 'message': 'تم استيراد المنتجات بنجاح', **result})
         except Exception as e:
             db.session.rollback()
             return jsonify({
@@ -7755,6 +7427,62 @@ def api_products_import_excel():
             'message': f'خطأ في معالجة الملف: {str(e)}'
         }), 500
 
+@app.route('/api/products/import-excel/jobs', methods=['POST'])
+@login_required
+@admin_required
+def api_products_import_excel_job():
+    """استيراد ملف المنتجات كمهمة خلفية - يعيد رقم المهمة ويُتابع من /api/jobs/<id>"""
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'message': 'لم يتم اختيار ملف'}), 400
+    
+    if not file.filename.lower().endswith(('.xlsx', '.xls')):
+        return jsonify({'success': False, 'message': 'نوع الملف غير مدعوم. يرجى استخدام ملف Excel'}), 400
+    
+    job_id = submit_job('import_products', {
+        'update_existing': request.form.get('update_existing') == 'true',
+        'dry_run': request.form.get('dry_run') == 'true',
+        'user_id': current_user.id
+    }, user_id=current_user.id, upload=file)
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('api_job_status', job_id=job_id)}), 202
+
+@job_handler('import_products')
+def run_products_import(job, params):
+    # حفظ كل دفعة على حدة حتى لا تتعطل نقاط البيع بقفل الكتابة طوال الاستيراد
+    result = import_products(params['input_path'], update_existing=params.get('update_existing', False),
+                             dry_run=params.get('dry_run', False), user_id=params.get('user_id'),
+                             progress=job.progress, commit_batches=True)
+    if params.get('dry_run'):
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return result
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def api_job_status(job_id):
+    """حالة مهمة خلفية ونسبة تقدمها"""
+    job = get_job(job_id)
+    if not job or (job.user_id != current_user.id and not current_user.is_admin()):
+        return jsonify({'error': 'المهمة غير موجودة'}), 404
+    
+    data = serialize_job(job)
+    if data['has_file']:
+        data['download_url'] = url_for('api_job_result', job_id=job.id)
+    return jsonify(data)
+
+@app.route('/api/jobs/<job_id>/result')
+@login_required
+def api_job_result(job_id):
+    """تحميل ملف نتيجة المهمة"""
+    job = get_job(job_id)
+    if not job or (job.user_id != current_user.id and not current_user.is_admin()):
+        return jsonify({'error': 'المهمة غير موجودة'}), 404
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'error': 'لا يوجد ملف نتيجة لهذه المهمة'}), 404
+    
+    return send_file(job.result_path, mimetype=job.result_mimetype, as_attachment=True, download_name=job.result_name)
+
 @app.route('/api/products/debug-excel', methods=['POST'])
 @login_required
 @admin_required
@@ -7830,12 +7558,7 @@ def price_ticket():
 def api_search_products():
     """البحث عن المنتجات لتيكت الأسعار"""
     query = request.args.get('q', '').strip()
-    products = []
-    
-    if query:
-        products = Product.query.filter(
-            Product.name_ar.contains(query)
-        ).order_by(Product.name_ar).limit(10).all()
+    products = search_products(query, limit=10)
     
     return jsonify([{
         'id': product.id,
@@ -8013,72 +7736,8 @@ def api_sync():
         }
 
         if sync_type == 'sales':
-            # مزامنة المبيعات المحفوظة محلياً
-            for sale_data in sync_data:
-                try:
-                    # التحقق من البيانات المطلوبة
-                    if not sale_data.get('items') or len(sale_data['items']) == 0:
-                        results['errors'].append({
-                            'data': sale_data,
-                            'error': 'لا توجد عناصر في البيع'
-                        })
-                        continue
-
-                    # إنشاء المبيعة
-                    sale = Sale(
-                        subtotal=sale_data.get('subtotal', 0),
-                        total_amount=sale_data.get('total_amount', 0),
-                        discount_type=sale_data.get('discount_type', 'none'),
-                        discount_value=sale_data.get('discount_value', 0),
-                        discount_amount=sale_data.get('discount_amount', 0),
-                        user_id=current_user.id,
-                        customer_id=sale_data.get('customer_id'),
-                        payment_status=sale_data.get('payment_status', 'paid'),
-                        payment_type=sale_data.get('payment_type', 'cash'),
-                        notes=sale_data.get('notes', ''),
-                        sale_date=datetime.utcnow()
-                    )
-
-                    db.session.add(sale)
-                    db.session.flush()  # للحصول على sale.id
-
-                    # إضافة عناصر البيع
-                    for item_data in sale_data['items']:
-                        product = Product.query.get(item_data['product_id'])
-                        if not product:
-                            raise ValueError(f"المنتج رقم {item_data['product_id']} غير موجود")
-
-                        # التحقق من الكمية المتوفرة
-                        if product.stock_quantity < item_data['quantity']:
-                            raise ValueError(f"الكمية المطلوبة من {product.name_ar} غير متوفرة")
-
-                        sale_item = SaleItem(
-                            sale_id=sale.id,
-                            product_id=item_data['product_id'],
-                            quantity=item_data['quantity'],
-                            unit_price=item_data['unit_price'],
-                            total_price=item_data['total_price']
-                        )
-
-                        db.session.add(sale_item)
-
-                        # تحديث المخزون
-                        product.stock_quantity -= item_data['quantity']
-
-                    db.session.commit()
-                    
-                    results['success'].append({
-                        'local_id': sale_data.get('local_id'),
-                        'server_id': sale.id,
-                        'sale_date': sale.sale_date.isoformat()
-                    })
-
-                except Exception as e:
-                    db.session.rollback()
-                    results['errors'].append({
-                        'data': sale_data,
-                        'error': str(e)
-                    })
+            # مزامنة المبيعات المحفوظة محلياً دفعة واحدة (مع تجاهل المكرر حسب local_id)
+            results = ingest_offline_sales(sync_data, current_user.id)
 
         elif sync_type == 'customers':
             # مزامنة العملاء الجدد
@@ -8134,6 +7793,34 @@ def api_sync():
         return jsonify({'error': 'حدث خطأ أثناء المزامنة'}), 500
 
 
+@app.route('/api/admin/cache-stats')
+@login_required
+@admin_required
+def api_cache_stats():
+    """عدادات الذاكرة المؤقتة للإحصائيات العامة"""
+    return jsonify(stats_cache.stats())
+
+@app.route('/admin/perf')
+@login_required
+@admin_required
+def admin_perf():
+    """أداء الصفحات: النسب المئوية لزمن كل مسار وعدد استعلاماته وآخر الطلبات البطيئة"""
+    return render_template('perf.html',
+                         endpoints=query_stats.endpoint_stats(),
+                         slow_requests=query_stats.slow_requests(),
+                         slow_ms=query_stats.slow_ms,
+                         slow_queries=query_stats.slow_queries)
+
+@app.route('/api/admin/perf-stats')
+@login_required
+@admin_required
+def api_perf_stats():
+    """نفس إحصائيات /admin/perf بصيغة JSON"""
+    return jsonify({
+        'endpoints': query_stats.endpoint_stats(),
+        'slow_requests': query_stats.slow_requests()
+    })
+
 @app.route('/api/offline-status')
 @login_required
 def api_offline_status():
@@ -8149,13 +7836,13 @@ def api_offline_status():
         total_customers = Customer.query.count()
         
         # إحصائيات المبيعات اليومية
-        today = datetime.utcnow().date()
+        today = egypt_today()
         today_sales = Sale.query.filter(
-            func.date(Sale.sale_date) == today
+            in_egypt_day(Sale.sale_date, today)
         ).count()
         
         today_revenue = db.session.query(func.sum(Sale.total_amount)).filter(
-            func.date(Sale.sale_date) == today
+            in_egypt_day(Sale.sale_date, today)
         ).scalar() or 0
 
         return jsonify({
@@ -8418,56 +8105,32 @@ def api_daily_revenue():
                 'error': 'تاريخ البداية يجب أن يكون قبل تاريخ النهاية'
             }), 400
         
-        # بناء الاستعلام الأساسي
-        query = db.session.query(
-            func.date(Sale.sale_date).label('date'),
-            func.count(Sale.id).label('sales_count'),
-            func.sum(Sale.total_amount).label('total_revenue'),
-            func.sum(Sale.discount_amount).label('total_discounts'),
-            func.avg(Sale.total_amount).label('avg_sale')
-        ).group_by(func.date(Sale.sale_date))
-        
-        # تطبيق الفلاتر
-        if date_from_dt:
-            query = query.filter(func.date(Sale.sale_date) >= date_from_dt)
-        
-        if date_to_dt:
-            query = query.filter(func.date(Sale.sale_date) <= date_to_dt)
-        
-        # تطبيق صلاحيات المستخدم
-        if not current_user.is_admin():
-            query = query.filter(Sale.user_id == current_user.id)
-        
-        # ترتيب النتائج
-        daily_revenue = query.order_by(desc(func.date(Sale.sale_date))).all()
+        # قراءة المجاميع اليومية من ملخص المبيعات (مع تطبيق صلاحيات المستخدم)
+        daily_revenue = rollup_by_day(
+            date_from_dt, date_to_dt,
+            user_id=None if current_user.is_admin() else current_user.id,
+            newest_first=True
+        )
         
         # تحويل النتائج إلى JSON
         result = []
         for day in daily_revenue:
-            # التعامل مع التاريخ بشكل آمن
-            if isinstance(day.date, str):
-                date_str = day.date
-                date_obj = datetime.strptime(day.date, '%Y-%m-%d').date()
-            else:
-                date_str = day.date.strftime('%Y-%m-%d')
-                date_obj = day.date
+            if not day.sales_count:
+                continue
             
-            # حساب المرتجعات لهذا اليوم (فقط المقبولة أو قيد المراجعة)
-            day_returns = Return.query.filter(
-                func.date(Return.return_date) == date_obj,
-                Return.status.in_(['pending', 'approved'])
-            ).all()
-            day_refunds = sum(return_obj.refund_amount for return_obj in day_returns)
+            total_revenue = float(day.revenue or 0)
+            total_discounts = float(day.discounts or 0)
+            day_refunds = float(day.refunds or 0)
             
             result.append({
-                'date': date_str,
-                'date_ar': date_obj.strftime('%d/%m/%Y') if hasattr(date_obj, 'strftime') else str(date_obj),
+                'date': day.date.strftime('%Y-%m-%d'),
+                'date_ar': day.date.strftime('%d/%m/%Y'),
                 'sales_count': int(day.sales_count),
-                'total_revenue': float(day.total_revenue or 0),
-                'total_discounts': float(day.total_discounts or 0),
-                'total_refunds': float(day_refunds),
-                'avg_sale': float(day.avg_sale or 0),
-                'net_revenue': float((day.total_revenue or 0) - (day.total_discounts or 0) - day_refunds)
+                'total_revenue': total_revenue,
+                'total_discounts': total_discounts,
+                'total_refunds': day_refunds,
+                'avg_sale': total_revenue / day.sales_count,
+                'net_revenue': total_revenue - total_discounts - day_refunds
             })
         
         return jsonify({
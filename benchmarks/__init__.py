@@ -0,0 +1,16 @@
+"""
+قياس أداء نقطة البيع تحت الحمل
+يبني قاعدة بيانات بحجم ثابت، ويشغل gunicorn بعامل واحد (أو أكثر) عليها، ثم يرسل حملاً
+متزامناً على البيع والكتالوج والبحث والمزامنة والتقارير والتصدير، ويكتب النتائج JSON
+مع رقم الـ commit لمقارنتها بين الإصدارات.
+
+    python -m benchmarks run --size 10k --users 8 --duration 60
+    python -m benchmarks run --size 10k --database postgresql://localhost/sara_bench
+    python -m benchmarks run --size 1k --mix checkout=1          # البيع فقط: أقصى عدد مبيعات/ثانية
+    python -m benchmarks compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+القاعدة المحددة بـ --database تُحذف وتُبنى من جديد (إلا مع --reuse)، فلا تستخدم قاعدة حقيقية.
+"""
+
+# الحجم -> عدد المنتجات وعدد المبيعات
+DATASET_SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
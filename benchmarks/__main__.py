@@ -0,0 +1,149 @@
+"""
+أوامر القياس: python -m benchmarks seed | run | compare
+"""
+
+import os
+import sys
+
+import click
+
+from benchmarks import DATASET_SIZES
+from benchmarks.server import PROJECT_DIR, BenchmarkServer
+from benchmarks.driver import DEFAULT_MIX, BenchmarkError, run_load
+from benchmarks.results import run_metadata, write_result, load_result, compare_results
+
+sys.path.insert(0, PROJECT_DIR)
+
+DEFAULT_DATABASE = f"sqlite:///{os.path.join(PROJECT_DIR, 'bench.db')}"
+
+
+def _use_database(database_url):
+    """تحميل التطبيق بإعدادات benchmark على قاعدة القياس (قبل أول استيراد لـ app)"""
+    os.environ['FLASK_CONFIG'] = 'benchmark'
+    os.environ['BENCH_DATABASE_URL'] = database_url
+    from app import app
+    return app
+
+
+def _seed(database_url, size):
+    app = _use_database(database_url)
+    from benchmarks.dataset import build_dataset
+    with app.app_context():
+        counts = build_dataset(size, echo=click.echo)
+    click.echo(f"✅ Seeded {size} dataset: {', '.join(f'{name}={count}' for name, count in counts.items())}")
+    return counts
+
+
+def _parse_mix(value):
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        try:
+            mix[name.strip()] = float(weight) if weight else 1.0
+        except ValueError:
+            raise click.BadParameter(f'Invalid weight for {name}: {weight}')
+    return mix
+
+
+@click.group()
+def cli():
+    """Load benchmarks for the POS endpoints"""
+    pass
+
+
+@cli.command()
+@click.option('--size', type=click.Choice(list(DATASET_SIZES)), default='10k', help='Products and sales to generate')
+@click.option('--database', default=lambda: os.environ.get('BENCH_DATABASE_URL', DEFAULT_DATABASE),
+              help='Benchmark database URL (dropped and rebuilt)')
+def seed(size, database):
+    """Build the benchmark dataset"""
+    _seed(database, size)
+
+
+@cli.command()
+@click.option('--size', type=click.Choice(list(DATASET_SIZES)), default='10k', help='Products and sales to generate')
+@click.option('--database', default=lambda: os.environ.get('BENCH_DATABASE_URL', DEFAULT_DATABASE),
+              help='Benchmark database URL (dropped and rebuilt)')
+@click.option('--reuse', is_flag=True, help='Reuse the existing benchmark database instead of reseeding')
+@click.option('--url', default=None, help='Benchmark an already running server instead of starting gunicorn')
+@click.option('--workers', type=int, default=1, help='gunicorn workers')
+@click.option('--threads', type=int, default=1, help='Threads per gunicorn worker')
+@click.option('--port', type=int, default=8077, help='Port for the gunicorn server')
+@click.option('--users', type=int, default=4, help='Concurrent virtual users')
+@click.option('--duration', type=float, default=30, help='Measured seconds')
+@click.option('--warmup', type=float, default=5, help='Unmeasured seconds before the run')
+@click.option('--mix', default=None, help=f"Scenario weights, e.g. checkout=5,catalog=1 (default: "
+              f"{','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items())})")
+@click.option('--seed', 'random_seed', type=int, default=1, help='Random seed for the load driver')
+@click.option('--output', default=None, help='Results folder (default: benchmarks/results)')
+def run(size, database, reuse, url, workers, threads, port, users, duration, warmup, mix, random_seed, output):
+    """Seed the dataset, start gunicorn and run the load"""
+    mix = _parse_mix(mix)
+
+    if reuse:
+        app = _use_database(database)
+        from benchmarks.dataset import dataset_counts
+        with app.app_context():
+            counts = dataset_counts()
+    else:
+        counts = _seed(database, size)
+
+    from benchmarks.dataset import BENCH_USERS, BENCH_PASSWORD
+    username = BENCH_USERS[0][0]
+
+    click.echo(f"🚀 {users} users for {duration:g}s ({warmup:g}s warmup)...")
+    try:
+        if url:
+            load = run_load(url, username, BENCH_PASSWORD, users, duration, warmup, mix, random_seed)
+            server = {'url': url}
+        else:
+            with BenchmarkServer(database, port=port, workers=workers, threads=threads) as running:
+                load = run_load(running.url, username, BENCH_PASSWORD, users, duration, warmup, mix, random_seed)
+            server = {'gunicorn_workers': workers, 'gunicorn_threads': threads}
+    except BenchmarkError as e:
+        click.echo(f"❌ {e}")
+        sys.exit(1)
+
+    result = run_metadata()
+    result.update({
+        'database': {'backend': database.split(':', 1)[0].split('+', 1)[0], 'size': size, 'rows': counts},
+        'server': server,
+        'load': {'users': users, 'duration': duration, 'warmup': warmup, 'seed': random_seed, 'mix': load['mix']},
+        'scenarios': load['scenarios'],
+        'total': load['total']
+    })
+    path = write_result(result, output)
+
+    click.echo(f"{'Scenario':<10} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    click.echo("-" * 72)
+    for name, stats in list(load['scenarios'].items()) + [('total', load['total'])]:
+        if stats:
+            click.echo(f"{name:<10} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>8} "
+                       f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['mean_queries'] or '':>8}")
+    click.echo(f"✅ Results written to {path}")
+
+
+@cli.command()
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+def compare(old, new):
+    """Compare two result files"""
+    before, after = load_result(old), load_result(new)
+    for label, result in (('old', before), ('new', after)):
+        click.echo(f"{label}: {(result.get('commit') or '?')[:8]}{' (dirty)' if result.get('dirty') else ''} "
+                   f"{result['database']['backend']} {result['database']['size']} "
+                   f"users={result['load']['users']} {result['created_at']}")
+    if (before['database']['backend'], before['database']['size']) != (after['database']['backend'], after['database']['size']):
+        click.echo("⚠️  Different database or dataset size - numbers are not directly comparable")
+
+    click.echo(f"{'Scenario':<10} {'metric':<13} {'old':>10} {'new':>10} {'change':>9}")
+    click.echo("-" * 56)
+    for name, metric, old_value, new_value, change in compare_results(before, after):
+        click.echo(f"{name:<10} {metric:<13} {str(old_value if old_value is not None else '-'):>10} "
+                   f"{str(new_value if new_value is not None else '-'):>10} {change:>9}")
+
+
+if __name__ == '__main__':
+    cli()
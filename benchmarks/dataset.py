@@ -0,0 +1,146 @@
+"""
+بيانات القياس
+قاعدة بيانات تجريبية بحجم ثابت (1k أو 10k أو 100k منتج ومثلها مبيعات) تُبنى بجمل
+insert جماعية ثم تُعاد منها الملخصات (دفتر الديون، الملخص اليومي، فهرس البحث)
+كما يفعل manage.py. نفس البذرة تعطي نفس البيانات في كل مرة.
+يجب استدعاؤها داخل app_context لتطبيق يعمل بإعدادات benchmark.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, func
+
+from models import db, User, Category, Product, Customer, Sale, SaleItem, Payment
+from add_sample_products import SAMPLE_PRODUCTS
+from schema_upgrades import run_upgrades
+from debt_ledger import rebuild_ledger
+from sales_rollup import rebuild_rollups
+from product_search import rebuild_search_index
+from stock_movements import take_stock_snapshot
+from benchmarks import DATASET_SIZES
+
+BENCH_PASSWORD = 'bench-pass-123'
+BENCH_USERS = [('bench_admin', 'admin'), ('bench_seller_1', 'seller'), ('bench_seller_2', 'seller')]
+
+BATCH_SIZE = 5000
+CATEGORY_COUNT = 20
+HISTORY_DAYS = 365
+
+# مخزون كبير حتى لا تفشل مبيعات القياس بسبب نفاد الكمية
+BENCH_STOCK = 1000000
+
+
+def _insert_returning_ids(model, rows):
+    """إضافة الصفوف على دفعات - يعيد أرقامها بنفس الترتيب"""
+    ids = []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    for start in range(0, len(rows), BATCH_SIZE):
+        ids.extend(db.session.execute(statement, rows[start:start + BATCH_SIZE]).scalars())
+    return ids
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def build_dataset(size, seed=42, echo=print):
+    """حذف قاعدة القياس وإعادة بنائها بالحجم المطلوب - يعيد عدد الصفوف لكل جدول"""
+    count = DATASET_SIZES[size]
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    db.drop_all()
+    run_upgrades(echo=lambda message: None)
+
+    users = []
+    for username, role in BENCH_USERS:
+        user = User(username=username, role=role, is_active=True)
+        user.set_password(BENCH_PASSWORD)
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    user_ids = [user.id for user in users]
+
+    category_ids = _insert_returning_ids(Category, [
+        {'name_ar': f'فئة {i + 1}', 'description_ar': f'فئة قياس رقم {i + 1}'} for i in range(CATEGORY_COUNT)
+    ])
+
+    echo(f'📦 {count} products...')
+    product_rows = []
+    for i in range(count):
+        name, description, wholesale, retail, _, min_stock = SAMPLE_PRODUCTS[i % len(SAMPLE_PRODUCTS)]
+        product_rows.append({
+            'name_ar': f'{name} {i // len(SAMPLE_PRODUCTS) + 1}',
+            'description_ar': description,
+            'category_id': category_ids[i % CATEGORY_COUNT],
+            'wholesale_price': wholesale,
+            'retail_price': retail,
+            'price': retail,
+            'stock_quantity': BENCH_STOCK,
+            'min_stock_threshold': min_stock,
+            'unit_type': 'كامل',
+            'created_at': now,
+            'updated_at': now
+        })
+    product_ids = _insert_returning_ids(Product, product_rows)
+    prices = {product_id: (row['retail_price'], row['wholesale_price']) for product_id, row in zip(product_ids, product_rows)}
+
+    customer_ids = _insert_returning_ids(Customer, [
+        {'name': f'عميل قياس {i + 1}', 'phone': f'010{i:08d}', 'created_at': now}
+        for i in range(max(10, count // 20))
+    ])
+
+    echo(f'🧾 {count} sales...')
+    sale_rows, sale_lines = [], []
+    for i in range(count):
+        sale_date = now - timedelta(days=rng.randint(0, HISTORY_DAYS - 1), seconds=rng.randint(0, 86399))
+        lines = [(product_id, rng.randint(1, 3)) for product_id in rng.sample(product_ids, rng.randint(1, 4))]
+        total = sum(prices[product_id][0] * quantity for product_id, quantity in lines)
+        credit = i % 3 == 0
+        sale_rows.append({
+            'subtotal': total,
+            'total_amount': total,
+            'sale_date': sale_date,
+            'user_id': rng.choice(user_ids),
+            'customer_id': rng.choice(customer_ids) if credit or i % 5 == 0 else None,
+            'payment_type': 'credit' if credit else 'cash',
+            'payment_status': 'partial' if credit else 'paid',
+            'notes': ''
+        })
+        sale_lines.append(lines)
+    sale_ids = _insert_returning_ids(Sale, sale_rows)
+
+    item_rows, payment_rows = [], []
+    for sale_id, sale, lines in zip(sale_ids, sale_rows, sale_lines):
+        for product_id, quantity in lines:
+            retail, wholesale = prices[product_id]
+            item_rows.append({
+                'sale_id': sale_id, 'product_id': product_id, 'quantity': quantity,
+                'unit_price': retail, 'total_price': retail * quantity, 'unit_cost': wholesale
+            })
+        if sale['payment_type'] == 'credit':
+            payment_rows.append({
+                'sale_id': sale_id, 'amount': round(sale['total_amount'] / 2, 2),
+                'payment_date': sale['sale_date'], 'payment_method': 'نقدي', 'user_id': sale['user_id']
+            })
+    _insert(SaleItem, item_rows)
+    _insert(Payment, payment_rows)
+    db.session.commit()
+
+    echo('🔄 Rebuilding ledger, rollups and search index...')
+    rebuild_ledger()
+    rebuild_rollups()
+    rebuild_search_index()
+    take_stock_snapshot()
+
+    return dataset_counts()
+
+
+def dataset_counts():
+    """عدد الصفوف في الجداول الأساسية لقاعدة القياس"""
+    return {
+        model.__tablename__: db.session.query(func.count(model.id)).scalar()
+        for model in (Product, Customer, Sale, SaleItem, Payment)
+    }
@@ -0,0 +1,264 @@
+"""
+مولّد الحمل
+عدد من المستخدمين الافتراضيين (خيوط) يسجل كل منهم الدخول بجلسته ثم ينفذ سيناريوهات
+مختارة عشوائياً بالأوزان المحددة حتى انتهاء المدة. يُسجل لكل طلب زمنه وحالته وعدد
+استعلاماته (ترويسة X-Query-Count) ويُجمع الناتج لكل سيناريو.
+يعتمد على المكتبة القياسية فقط (http.client) حتى لا يضيف اعتماديات للمشروع.
+"""
+
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+# السيناريو -> الوزن الافتراضي في الحمل المختلط
+DEFAULT_MIX = {'checkout': 50, 'catalog': 15, 'search': 10, 'sync': 10, 'report': 10, 'export': 5}
+
+SYNC_BATCH = 5
+
+_LOGIN_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+_PAGE_TOKEN = re.compile(r'var csrf_token = "([^"]+)"')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class HttpSession:
+    """اتصال HTTP دائم بملفات تعريف الارتباط (بدون التقيد بعلامة Secure لأن القياس محلي)"""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.csrf_token = None
+        self._connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """تنفيذ طلب - يعيد (الحالة، الترويسات، المحتوى)"""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # العامل أغلق الاتصال الدائم - إعادة المحاولة مرة باتصال جديد
+                self.close()
+                if attempt:
+                    raise
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.headers.get('Connection', '').lower() == 'close':
+            self.close()
+        return response.status, response.headers, content
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def post_json(self, path, payload):
+        return self.request('POST', path, body=json.dumps(payload), headers={
+            'Content-Type': 'application/json',
+            'X-CSRFToken': self.csrf_token or ''
+        })
+
+    def login(self, username, password):
+        status, _, content = self.get('/')
+        match = _LOGIN_TOKEN.search(content.decode('utf-8'))
+        if status != 200 or not match:
+            raise BenchmarkError(f'تعذر فتح صفحة الدخول ({status})')
+
+        status, headers, _ = self.request('POST', '/', body=urlencode({
+            'csrf_token': match.group(1), 'username': username, 'password': password
+        }), headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        if status != 302 or urlsplit(headers.get('Location', '')).path in ('', '/'):
+            raise BenchmarkError(f'فشل تسجيل الدخول للمستخدم {username} ({status})')
+
+        # تسجيل الدخول يمسح الجلسة فيُقرأ رمز CSRF الجديد من صفحة البيع
+        status, _, content = self.get('/sales/new')
+        match = _PAGE_TOKEN.search(content.decode('utf-8'))
+        if status != 200 or not match:
+            raise BenchmarkError(f'تعذر قراءة رمز CSRF ({status})')
+        self.csrf_token = match.group(1)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class Catalog:
+    """المنتجات المتاحة للسيناريوهات (تُقرأ مرة من /api/products)"""
+
+    def __init__(self, session):
+        status, _, content = session.get('/api/products')
+        if status != 200:
+            raise BenchmarkError(f'تعذر تحميل المنتجات ({status})')
+        products = json.loads(content)
+        self.products = [(product['id'], product['retail_price']) for product in products]
+        self.search_terms = sorted({product['name'].split()[0] for product in products})
+        if not self.products:
+            raise BenchmarkError('قاعدة القياس لا تحتوي منتجات')
+
+
+def _sale_items(rng, catalog):
+    items = []
+    for product_id, price in rng.sample(catalog.products, rng.randint(1, 4)):
+        quantity = rng.randint(1, 3)
+        items.append({'product_id': product_id, 'quantity': quantity,
+                      'unit_price': price, 'total_price': price * quantity})
+    return items
+
+
+def checkout(session, catalog, rng):
+    items = _sale_items(rng, catalog)
+    total = sum(item['total_price'] for item in items)
+    return session.post_json('/api/sales', {
+        'items': items, 'subtotal': total, 'total_amount': total, 'payment_type': 'cash'
+    })
+
+
+def catalog_list(session, catalog, rng):
+    return session.get('/api/products')
+
+
+def search(session, catalog, rng):
+    return session.get('/api/products/suggest?' + urlencode({'q': rng.choice(catalog.search_terms)}))
+
+
+def sync(session, catalog, rng):
+    sales = []
+    for _ in range(SYNC_BATCH):
+        items = _sale_items(rng, catalog)
+        total = sum(item['total_price'] for item in items)
+        sales.append({'local_id': uuid.uuid4().hex, 'items': items, 'subtotal': total, 'total_amount': total})
+    return session.post_json('/api/sync', {'type': 'sales', 'data': sales})
+
+
+def report(session, catalog, rng):
+    return session.get('/reports')
+
+
+def export(session, catalog, rng):
+    start = (date.today() - timedelta(days=30)).isoformat()
+    return session.get('/api/export/sales?' + urlencode({'format': 'csv', 'date_from': start}))
+
+
+SCENARIOS = {
+    'checkout': checkout,
+    'catalog': catalog_list,
+    'search': search,
+    'sync': sync,
+    'report': report,
+    'export': export
+}
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(samples, elapsed):
+    """تجميع العينات (السيناريو، الحالة، الزمن، الاستعلامات) لكل سيناريو وإجمالاً"""
+    grouped = defaultdict(list)
+    for sample in samples:
+        grouped[sample[0]].append(sample)
+
+    def stats(rows):
+        latencies = sorted(row[2] * 1000 for row in rows)
+        queries = [row[3] for row in rows if row[3] is not None]
+        errors = sum(1 for row in rows if row[1] >= 400)
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'rps': round(len(rows) / elapsed, 2) if elapsed else 0,
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(_percentile(latencies, 0.5), 2),
+            'p90_ms': round(_percentile(latencies, 0.9), 2),
+            'p95_ms': round(_percentile(latencies, 0.95), 2),
+            'p99_ms': round(_percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'mean_queries': round(sum(queries) / len(queries), 2) if queries else None
+        }
+
+    return {
+        'scenarios': {name: stats(rows) for name, rows in sorted(grouped.items())},
+        'total': stats(samples) if samples else None
+    }
+
+
+def run_load(base_url, username, password, users=4, duration=30, warmup=5, mix=None, seed=1):
+    """تشغيل الحمل - يعيد ملخص النتائج لكل سيناريو
+    العينات خلال أول warmup ثانية لا تُحتسب"""
+    mix = mix or DEFAULT_MIX
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise BenchmarkError(f"سيناريو غير معروف: {', '.join(sorted(unknown))}")
+    names = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in names]
+
+    sessions = []
+    for _ in range(users):
+        session = HttpSession(base_url)
+        session.login(username, password)
+        sessions.append(session)
+    catalog = Catalog(sessions[0])
+
+    samples = []
+    failures = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    def worker(index, session):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        try:
+            while True:
+                began = time.perf_counter()
+                if began >= deadline:
+                    break
+                name = rng.choices(names, weights)[0]
+                status, headers, _ = SCENARIOS[name](session, catalog, rng)
+                finished = time.perf_counter()
+                if began >= measure_from:
+                    query_count = headers.get('X-Query-Count')
+                    local.append((name, status, finished - began, int(query_count) if query_count else None))
+        except Exception as e:
+            with lock:
+                failures.append(f'{type(e).__name__}: {e}')
+        finally:
+            session.close()
+            with lock:
+                samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i, session), daemon=True) for i, session in enumerate(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if failures:
+        raise BenchmarkError(f'توقف {len(failures)} مستخدم افتراضي: {failures[0]}')
+
+    result = summarize(samples, duration)
+    result['mix'] = {name: mix[name] for name in names}
+    return result
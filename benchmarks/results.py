@@ -0,0 +1,79 @@
+"""
+ملفات نتائج القياس
+كل تشغيل يُكتب في ملف JSON واحد مع رقم الـ commit وبيئة التشغيل وحجم البيانات،
+واسم الملف يبدأ بالتاريخ فتترتب النتائج زمنياً.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+import sqlalchemy
+
+from benchmarks.server import PROJECT_DIR
+
+RESULTS_FOLDER = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=PROJECT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata():
+    """الـ commit الحالي وبيئة التشغيل"""
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sqlalchemy': sqlalchemy.__version__
+        }
+    }
+
+
+def write_result(result, folder=None):
+    """حفظ النتيجة - يعيد مسار الملف"""
+    folder = folder or RESULTS_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    commit = (result.get('commit') or 'nocommit')[:8]
+    filename = f"{stamp}_{commit}_{result['database']['backend']}_{result['database']['size']}.json"
+    path = os.path.join(folder, filename)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_result(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return ''
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def compare_results(old, new):
+    """صفوف المقارنة لكل سيناريو: (السيناريو، المقياس، القديم، الجديد، نسبة التغير)"""
+    rows = []
+    names = sorted(set(old['scenarios']) | set(new['scenarios']))
+    for name in names + ['total']:
+        before = old['total'] if name == 'total' else old['scenarios'].get(name)
+        after = new['total'] if name == 'total' else new['scenarios'].get(name)
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_queries', 'errors'):
+            old_value = before.get(metric) if before else None
+            new_value = after.get(metric) if after else None
+            rows.append((name, metric, old_value, new_value, _change(old_value, new_value)))
+    return rows
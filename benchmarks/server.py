@@ -0,0 +1,73 @@
+"""
+تشغيل خادم القياس
+gunicorn بنفس نقطة الدخول في Procfile (wsgi:app) وبإعدادات benchmark، بعدد عمال وخيوط
+محدد حتى تُقاس سعة العامل الواحد.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark_env(database_url):
+    """متغيرات البيئة لعملية تعمل على قاعدة القياس"""
+    env = dict(os.environ)
+    env['FLASK_CONFIG'] = 'benchmark'
+    env['BENCH_DATABASE_URL'] = database_url
+    return env
+
+
+def wait_until_ready(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f'الخادم لم يستجب خلال {timeout} ثانية: {base_url}')
+
+
+class BenchmarkServer:
+    """gunicorn في عملية فرعية - يُستخدم مع with"""
+
+    def __init__(self, database_url, port=8077, workers=1, threads=1):
+        self.database_url = database_url
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.url = f'http://127.0.0.1:{port}'
+        self._process = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'wsgi:app',
+             '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers),
+             '--threads', str(self.threads),
+             '--log-level', 'warning'],
+            cwd=PROJECT_DIR,
+            env=benchmark_env(self.database_url)
+        )
+        try:
+            wait_until_ready(self.url)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+            self._process = None
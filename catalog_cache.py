@@ -0,0 +1,194 @@
+"""
+إصدار كتالوج المنتجات
+عداد في جدول catalog_version يزيد عند أي إضافة أو تعديل أو حذف لمنتج أو قسم
+(ويشمل ذلك تغير المخزون مع كل بيع). الزيادة تتم بعد نجاح المعاملة في معاملة قصيرة
+مستقلة، فلا يبقى صف العداد مقفلاً طوال معاملة البيع ولا تنتظر المبيعات المتزامنة
+بعضها عليه. يُستخدم الإصدار كـ ETag لواجهة /api/products، ويُحفظ نص JSON الجاهز لآخر إصدار في الذاكرة حتى لا يُعاد
+بناؤه إلا بعد تغير الكتالوج.
+
+للمزامنة التدريجية يعيد catalog_changes() المنتجات المعدلة منذ مؤشر زمني
+(Product.updated_at) وأرقام المنتجات المحذوفة من جدول product_tombstone.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Product, Category, CatalogVersion, ProductTombstone
+
+CATALOG_ROW_ID = 1
+
+# النماذج التي يغير تعديلها محتوى الكتالوج
+_CATALOG_MODELS = (Product, Category)
+
+_DIRTY_KEY = 'catalog_dirty'
+_RENAMED_CATEGORIES_KEY = 'catalog_renamed_categories'
+
+# هامش تداخل لمؤشر المزامنة حتى لا تضيع تعديلات معاملات طويلة أُكملت بعد قراءة المؤشر
+CURSOR_OVERLAP = timedelta(seconds=60)
+
+_payload_lock = threading.Lock()
+_payload = (None, None)  # (الإصدار، نص JSON)
+
+
+def current_catalog_version():
+    """الإصدار الحالي للكتالوج"""
+    return db.session.execute(
+        select(CatalogVersion.version).where(CatalogVersion.id == CATALOG_ROW_ID)
+    ).scalar() or 0
+
+
+def catalog_etag(version):
+    return f'catalog-{version}'
+
+
+def _bump_catalog_version(connection):
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        table.update().where(table.c.id == CATALOG_ROW_ID).values(version=table.c.version + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        connection.execute(table.insert().values(id=CATALOG_ROW_ID, version=1, updated_at=now))
+
+
+@event.listens_for(Session, 'before_flush')
+def _mark_catalog_changes(session, flush_context, instances):
+    dirty = session.dirty
+    for obj in chain(session.new, session.deleted, dirty):
+        if isinstance(obj, _CATALOG_MODELS) and (obj not in dirty or session.is_modified(obj)):
+            session.info[_DIRTY_KEY] = True
+            break
+
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            session.add(ProductTombstone(product_id=obj.id))
+
+    # اسم القسم جزء من بيانات المنتج، فتغييره يعني تعديل منتجات القسم
+    for obj in dirty:
+        if isinstance(obj, Category) and inspect(obj).attrs.name_ar.history.has_changes():
+            session.info.setdefault(_RENAMED_CATEGORIES_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_renamed_categories(session, flush_context):
+    renamed = session.info.pop(_RENAMED_CATEGORIES_KEY, None)
+    if renamed:
+        table = Product.__table__
+        session.connection().execute(
+            table.update().where(table.c.category_id.in_(renamed)).values(updated_at=datetime.utcnow())
+        )
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_on_bulk_write(state):
+    """الكتابة الجماعية (insert/update/delete) لا تمر بالـ flush"""
+    mapper = state.bind_mapper
+    if (state.is_insert or state.is_update or state.is_delete) and mapper is not None and mapper.class_ in _CATALOG_MODELS:
+        state.session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    if session.in_nested_transaction() or not session.info.pop(_DIRTY_KEY, False):
+        return
+
+    # البيانات أصبحت مرئية قبل زيادة الإصدار، فلا يُخزن إصدار جديد ببيانات قديمة
+    try:
+        with session.get_bind(CatalogVersion.__mapper__).begin() as connection:
+            _bump_catalog_version(connection)
+    except SQLAlchemyError as e:
+        current_app.logger.error(f'تعذر تحديث إصدار الكتالوج: {e}')
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_catalog_changes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_DIRTY_KEY, None)
+
+
+def serialize_product(p):
+    """تمثيل المنتج في كتالوج نقطة البيع"""
+    wholesale_price = p.wholesale_price if p.wholesale_price else (p.price if p.price else 0)
+    retail_price = p.retail_price if p.retail_price else (p.price if p.price else 0)
+
+    product_data = {
+        'id': p.id,
+        'name': p.name_ar or 'منتج غير محدد',
+        'wholesale_price': float(wholesale_price),
+        'retail_price': float(retail_price),
+        'price': float(retail_price),  # Use retail_price as the main price
+        'stock': float(p.stock_quantity or 0),
+        'unit_type': p.unit_type or 'كامل',
+        'category': p.category.name_ar if p.category else 'غير محدد',
+        'min_stock_threshold': float(p.min_stock_threshold or 10),
+        'profit_margin': 0,
+        'profit_percentage': 0
+    }
+
+    if wholesale_price > 0 and retail_price > 0:
+        profit_margin = retail_price - wholesale_price
+        product_data['profit_margin'] = float(profit_margin)
+        product_data['profit_percentage'] = float((profit_margin / wholesale_price) * 100)
+
+    return product_data
+
+
+def build_catalog_payload():
+    """نص JSON لكل المنتجات مع أقسامها في استعلام واحد"""
+    products = Product.query.options(db.joinedload(Product.category)).order_by(Product.id).all()
+
+    result = []
+    for p in products:
+        try:
+            result.append(serialize_product(p))
+        except Exception as e:
+            # Skip problematic products but log the error
+            current_app.logger.error(f"Error processing product {p.id}: {str(e)}")
+
+    return current_app.json.dumps(result)
+
+
+def catalog_payload(version):
+    """نص JSON للكتالوج لإصدار معين (يُبنى مرة واحدة لكل إصدار)"""
+    global _payload
+    cached_version, body = _payload
+    if cached_version == version:
+        return body
+
+    body = build_catalog_payload()
+    with _payload_lock:
+        _payload = (version, body)
+    return body
+
+
+def catalog_changes(since=None):
+    """المنتجات المعدلة والمحذوفة منذ المؤشر (أو الكتالوج كاملاً بدون مؤشر)"""
+    cursor = datetime.utcnow()
+    query = Product.query.options(db.joinedload(Product.category))
+    deleted_ids = []
+
+    if since is not None:
+        window_start = since - CURSOR_OVERLAP
+        query = query.filter(Product.updated_at >= window_start)
+        deleted_ids = [
+            product_id for (product_id,) in db.session.query(ProductTombstone.product_id).filter(
+                ProductTombstone.deleted_at >= window_start
+            ).distinct()
+        ]
+
+    updated = [serialize_product(p) for p in query.order_by(Product.id).all()]
+    updated_ids = {item['id'] for item in updated}
+
+    return {
+        'full': since is None,
+        'cursor': cursor.isoformat(),
+        'updated': updated,
+        # رقم أُعيد استخدامه لمنتج جديد يظهر في updated فقط
+        'deleted': [product_id for product_id in deleted_ids if product_id not in updated_ids]
+    }
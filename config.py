@@ -14,7 +14,6 @@ class Config:
     
     # Database configuration
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_RECORD_QUERIES = True
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -26,10 +25,32 @@ class Config:
     APP_NAME = os.environ.get('APP_NAME', 'إدارة Sara Store')
     APP_VERSION = os.environ.get('APP_VERSION', '1.0.0')
     
+    # Global stats cache (header debt badge); set STATS_CACHE_URL to share it between workers
+    STATS_CACHE_URL = os.environ.get('STATS_CACHE_URL')
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+    
+    # SQL instrumentation: X-Query-Count/Server-Timing headers, slow request log and /admin/perf
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_QUERIES = int(os.environ.get('SLOW_REQUEST_QUERIES', 50))
+    QUERY_STATS_WINDOW = int(os.environ.get('QUERY_STATS_WINDOW', 500))
+    
     # Upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     
+    # Background jobs (long imports/exports): job table in its own SQLite file, thread workers per process
+    SQLALCHEMY_BINDS = {'jobs': os.environ.get('JOBS_DATABASE_URL', 'sqlite:///jobs.db')}
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+    JOB_FOLDER = os.environ.get('JOB_FOLDER', 'jobs')
+    JOB_RETENTION = timedelta(hours=int(os.environ.get('JOB_RETENTION_HOURS', 24)))
+    # Running jobs without a heartbeat, or queued jobs not started, for this long are treated as lost
+    JOB_STALE_AFTER = timedelta(minutes=int(os.environ.get('JOB_STALE_MINUTES', 10)))
+    
+    # Backups (python manage.py backup-db): folder and number of full backups to keep
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER', 'backups')
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+    
     # Email settings (for password reset)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -135,14 +156,37 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {'jobs': 'sqlite:///:memory:'}
     WTF_CSRF_ENABLED = False
     LOGIN_DISABLED = True
 
+class BenchmarkConfig(Config):
+    """Load benchmark configuration (python -m benchmarks): dedicated database, no rate limits"""
+    DEBUG = False
+    TESTING = False
+    
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{os.path.abspath('bench.db')}"
+    if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
+        SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_BINDS = {'jobs': os.environ.get('BENCH_JOBS_DATABASE_URL', f"sqlite:///{os.path.abspath('bench_jobs.db')}")}
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_size': 10,
+        'max_overflow': 20
+    }
+    
+    # The load driver would otherwise hit the default 1000/hour limit within seconds
+    RATELIMIT_ENABLED = False
+    
+    LOG_TO_STDOUT = True
+    LOG_LEVEL = 'WARNING'
+
 # Configuration dictionary
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'vps': VPSConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
     'default': DevelopmentConfig
 } 
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+إعدادات pytest المشتركة
+التطبيق يعمل بإعدادات testing (قاعدة بيانات في الذاكرة). seed_store تبني متجراً تجريبياً
+بحجم قابل للتغيير من منتجات add_sample_products، و logged_in_client عميل اختبار بجلسة مستخدم.
+الـ fixture المسمى store يبني المتجر ويبقي سياق التطبيق مفتوحاً أثناء الاختبار.
+"""
+
+import os
+
+# يجب تحديد الإعدادات قبل استيراد التطبيق حتى لا تُستخدم قاعدة البيانات الحقيقية
+os.environ['FLASK_CONFIG'] = 'testing'
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import app as flask_app
+from models import db, User, Category, Product, Customer, Sale, SaleItem, Payment
+from add_sample_products import SAMPLE_PRODUCTS, create_sample_categories, sample_category_map, sample_product_category
+from debt_ledger import rebuild_ledger
+from sales_rollup import rebuild_rollups
+from stats_cache import stats_cache
+
+
+def seed_store(scale, seed=1):
+    """متجر تجريبي: منتجات add_sample_products و scale عميل و 5 * scale بيع خلال آخر 30 يوماً
+    (نصفها آجل بدفعة جزئية) - يعيد رقم المدير"""
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    stats_cache.invalidate()
+
+    admin = User(username='admin', role='admin', is_active=True)
+    admin.set_password('admin123')
+    seller = User(username='seller', role='seller', is_active=True)
+    seller.set_password('seller123')
+    db.session.add_all([admin, seller])
+    create_sample_categories()
+
+    categories = Category.query.all()
+    category_map = sample_category_map(categories)
+    products = [
+        Product(name_ar=name, description_ar=desc, wholesale_price=wholesale, retail_price=retail,
+                stock_quantity=stock * scale, min_stock_threshold=min_stock, unit_type='كامل',
+                category_id=sample_product_category(i, category_map, categories[0].id))
+        for i, (name, desc, wholesale, retail, stock, min_stock) in enumerate(SAMPLE_PRODUCTS)
+    ]
+    customers = [Customer(name=f'عميل {i}', phone=f'0100000{i:04d}') for i in range(scale)]
+    db.session.add_all(products + customers)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for i in range(5 * scale):
+        credit = i % 2 == 1
+        items = [
+            SaleItem(product_id=product.id, quantity=rng.randint(1, 3),
+                     unit_price=product.retail_price, unit_cost=product.wholesale_price)
+            for product in rng.sample(products, 3)
+        ]
+        total = sum(item.total_price for item in items)
+        sale = Sale(
+            subtotal=total, total_amount=total, sale_items=items,
+            sale_date=now - timedelta(days=rng.randint(0, 29), minutes=i),
+            user_id=rng.choice([admin, seller]).id,
+            customer_id=customers[(i // 2) % scale].id if credit or i % 3 == 0 else None,
+            payment_type='credit' if credit else 'cash',
+            payment_status='partial' if credit else 'paid'
+        )
+        if credit:
+            sale.payments = [Payment(amount=round(total / 3, 2), user_id=admin.id, payment_date=sale.sale_date)]
+        db.session.add(sale)
+
+    db.session.commit()
+    rebuild_ledger()
+    rebuild_rollups()
+    return admin.id
+
+
+def logged_in_client(app, user_id):
+    """عميل اختبار بجلسة المستخدم - كل طلب يبدأ بجلسة قاعدة بيانات جديدة فلا يخفي التحميل الكسول"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(WTF_CSRF_ENABLED=False, LOGIN_DISABLED=False, RATELIMIT_ENABLED=False)
+    flask_app.login_manager.session_protection = None
+    return flask_app
+
+
+@pytest.fixture
+def store(app, request):
+    """متجر seed_store بحجم request.param (الافتراضي 2) داخل سياق التطبيق - يعيد رقم المدير
+    لحجم آخر: @pytest.mark.parametrize('store', [4], indirect=True)"""
+    with app.app_context():
+        yield seed_store(getattr(request, 'param', 2))
+
+
+def set_stock(product_id, quantity):
+    db.session.execute(update(Product).where(Product.id == product_id).values(stock_quantity=quantity))
+    db.session.commit()
+
+
+def stock_of(product_id):
+    """المخزون الحالي من قاعدة البيانات (وليس من نسخة الجلسة)"""
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock_quantity
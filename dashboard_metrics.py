@@ -0,0 +1,135 @@
+"""
+مؤشرات لوحة التحكم
+تُحسب جميع المؤشرات بعدد قليل من الاستعلامات التجميعية (مجاميع شرطية لليوم
+والشهر) بدلاً من تحميل صفوف المبيعات والمصاريف وجمعها في Python.
+النتيجة نفسها تُستخدم في صفحة لوحة التحكم وفي واجهة JSON.
+"""
+
+from dataclasses import dataclass, asdict, field
+
+from sqlalchemy import func, case, desc
+
+from models import db, Product, Category, Sale, SaleItem, Expense, Return
+from debt_ledger import global_debt_stats
+from stats_cache import stats_cache, DEBT_STATS_KEY
+from date_ranges import egypt_today, date_range_filter, in_egypt_day
+
+
+@dataclass(frozen=True)
+class DashboardMetrics:
+    """مؤشرات لوحة التحكم لليوم والشهر الحالي"""
+    total_products: int = 0
+    low_stock_products: int = 0
+    out_of_stock_products: int = 0
+    total_categories: int = 0
+
+    today_revenue: float = 0.0
+    today_profit: float = 0.0
+    today_expenses: float = 0.0
+    today_refunds: float = 0.0
+
+    month_revenue: float = 0.0
+    month_profit: float = 0.0
+    month_cost: float = 0.0
+    month_expenses: float = 0.0
+
+    total_debt: float = 0.0
+    customers_with_debt: int = 0
+
+    # (اسم المنتج، الكمية المباعة) لأكثر المنتجات مبيعاً هذا الشهر
+    top_products: list = field(default_factory=list)
+
+    @property
+    def today_net_profit(self):
+        return self.today_profit - self.today_expenses
+
+    @property
+    def today_net_revenue(self):
+        return self.today_revenue - self.today_refunds
+
+    @property
+    def month_net_profit(self):
+        return self.month_profit - self.month_expenses
+
+    def to_dict(self):
+        data = asdict(self)
+        data['top_products'] = [
+            {'name': name, 'quantity': quantity} for name, quantity in self.top_products
+        ]
+        data['today_net_profit'] = self.today_net_profit
+        data['today_net_revenue'] = self.today_net_revenue
+        data['month_net_profit'] = self.month_net_profit
+        return data
+
+
+def _today_and_month_sums(date_column, value_column, today):
+    """مجموع شرطي لليوم ومجموع كامل لصفوف الشهر في نفس المرور"""
+    return (
+        func.coalesce(func.sum(case((in_egypt_day(date_column, today), value_column), else_=0)), 0),
+        func.coalesce(func.sum(value_column), 0)
+    )
+
+
+def compute_dashboard_metrics(today=None, top_limit=5):
+    """حساب جميع مؤشرات لوحة التحكم"""
+    today = today or egypt_today()
+    month_start = today.replace(day=1)
+    sale_in_month = date_range_filter(Sale.sale_date, month_start, today)
+
+    # المنتجات والأقسام في استعلام واحد
+    product_row = db.session.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(case((Product.stock_quantity <= Product.min_stock_threshold, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Product.stock_quantity <= 0, 1), else_=0)), 0),
+        db.session.query(func.count(Category.id)).scalar_subquery()
+    ).one()
+
+    # الإيرادات
+    revenue_row = db.session.query(
+        *_today_and_month_sums(Sale.sale_date, Sale.total_amount, today)
+    ).filter(*sale_in_month).one()
+
+    # الأرباح والتكلفة من تكلفة الوحدة المسجلة وقت البيع
+    profit_row = db.session.query(
+        *_today_and_month_sums(Sale.sale_date, SaleItem.profit, today),
+        func.coalesce(func.sum(SaleItem.cost_total), 0)
+    ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).filter(*sale_in_month).one()
+
+    # المصاريف
+    expense_row = db.session.query(
+        *_today_and_month_sums(Expense.expense_date, Expense.amount, today)
+    ).filter(*date_range_filter(Expense.expense_date, month_start, today)).one()
+
+    # المرتجعات اليوم (فقط المقبولة أو قيد المراجعة)
+    today_refunds = db.session.query(func.coalesce(func.sum(Return.refund_amount), 0)).filter(
+        in_egypt_day(Return.return_date, today),
+        Return.status.in_(['pending', 'approved'])
+    ).scalar()
+
+    top_products = db.session.query(
+        Product.name_ar,
+        func.sum(SaleItem.quantity).label('total_sold')
+    ).join(SaleItem).join(Sale).filter(
+        *sale_in_month
+    ).group_by(Product.id).order_by(desc('total_sold')).limit(top_limit).all()
+
+    # الديون من نفس القيمة المخزنة التي يستخدمها رأس الصفحة
+    debt = stats_cache.get_or_compute(DEBT_STATS_KEY, global_debt_stats)
+
+    return DashboardMetrics(
+        total_products=product_row[0],
+        low_stock_products=int(product_row[1]),
+        out_of_stock_products=int(product_row[2]),
+        total_categories=product_row[3],
+        today_revenue=float(revenue_row[0]),
+        today_profit=float(profit_row[0]),
+        today_expenses=float(expense_row[0]),
+        today_refunds=float(today_refunds),
+        month_revenue=float(revenue_row[1]),
+        month_profit=float(profit_row[1]),
+        month_cost=float(profit_row[2]),
+        month_expenses=float(expense_row[1]),
+        total_debt=debt['total_debt'],
+        customers_with_debt=debt['customers_with_debt'],
+        top_products=[tuple(row) for row in top_products]
+    )
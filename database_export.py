@@ -0,0 +1,160 @@
+"""
+تصدير قاعدة البيانات كاملة
+ورقة لكل جدول أساسي بأسماء أعمدة عربية. كل جدول يُقرأ كأعمدة فقط على دفعات
+(yield_per) ويُكتب صفاً بصف إلى ملف XLSX بوضع الكتابة فقط أو إلى JSON متدفق،
+فلا يزيد استهلاك الذاكرة مع حجم قاعدة البيانات.
+تُستخدم في /api/export/full-database وفي مهمة الخلفية export_full_database.
+"""
+
+import json
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from models import db, User, Category, Product, Sale, SaleItem, Customer, Payment, Expense
+from sales_export import EXPORT_BATCH_SIZE, write_xlsx_sheets
+
+
+def _number(value):
+    return float(value or 0)
+
+
+def _text(value):
+    return value or ''
+
+
+def _string(value):
+    return str(value)
+
+
+# (المفتاح، اسم الورقة، النموذج، [(العمود، العنوان، التحويل)]) بترتيب الأوراق في الملف
+EXPORT_TABLES = [
+    ('sales', 'المبيعات', Sale, [
+        (Sale.id, 'رقم البيع', None),
+        (Sale.sale_date, 'تاريخ البيع', _string),
+        (Sale.total_amount, 'المبلغ', _number),
+        (Sale.payment_type, 'نوع الدفع', None),
+        (Sale.payment_status, 'حالة الدفع', None),
+        (Sale.notes, 'ملاحظات', _text),
+    ]),
+    ('sale_items', 'تفاصيل المبيعات', SaleItem, [
+        (SaleItem.sale_id, 'رقم البيع', None),
+        (SaleItem.product_id, 'رقم المنتج', None),
+        (SaleItem.quantity, 'الكمية', _number),
+        (SaleItem.unit_price, 'سعر الوحدة', _number),
+        (SaleItem.total_price, 'الإجمالي', _number),
+    ]),
+    ('customers', 'العملاء', Customer, [
+        (Customer.id, 'رقم العميل', None),
+        (Customer.name, 'اسم العميل', None),
+        (Customer.phone, 'الهاتف', _text),
+        (Customer.address, 'العنوان', _text),
+        (Customer.notes, 'ملاحظات', _text),
+    ]),
+    ('products', 'المنتجات', Product, [
+        (Product.id, 'رقم المنتج', None),
+        (Product.name_ar, 'اسم المنتج', None),
+        (Product.wholesale_price, 'سعر الجملة', _number),
+        (Product.retail_price, 'سعر البيع', _number),
+        (Product.stock_quantity, 'الكمية', _number),
+        (Product.unit_type, 'نوع الوحدة', None),
+        (Product.min_stock_threshold, 'الحد الأدنى', _number),
+    ]),
+    ('categories', 'الفئات', Category, [
+        (Category.id, 'رقم الفئة', None),
+        (Category.name_ar, 'اسم الفئة', None),
+        (Category.description_ar, 'الوصف', _text),
+    ]),
+    ('payments', 'المدفوعات', Payment, [
+        (Payment.id, 'رقم الدفعة', None),
+        (Payment.sale_id, 'رقم البيع', None),
+        (Payment.amount, 'المبلغ', _number),
+        (Payment.payment_date, 'تاريخ الدفع', _string),
+        (Payment.payment_method, 'طريقة الدفع', None),
+        (Payment.notes, 'ملاحظات', _text),
+    ]),
+    ('expenses', 'المصاريف', Expense, [
+        (Expense.id, 'رقم المصروف', None),
+        (Expense.description, 'الوصف', None),
+        (Expense.amount, 'المبلغ', _number),
+        (Expense.expense_type, 'النوع', None),
+        (Expense.expense_date, 'التاريخ', _string),
+        (Expense.notes, 'ملاحظات', _text),
+    ]),
+    ('users', 'المستخدمين', User, [
+        (User.id, 'رقم المستخدم', None),
+        (User.username, 'اسم المستخدم', None),
+        (User.role, 'الدور', None),
+        (User.created_at, 'تاريخ الإنشاء', _string),
+    ]),
+]
+
+# جداول لا تُصدّر إلا للمدير
+ADMIN_ONLY_TABLES = {'users'}
+
+
+def export_tables(include_users=False):
+    return [table for table in EXPORT_TABLES if include_users or table[0] not in ADMIN_ONLY_TABLES]
+
+
+def _summary():
+    counts = db.session.execute(select(
+        select(func.count(Product.id)).scalar_subquery(),
+        select(func.count(Customer.id)).scalar_subquery(),
+        select(func.count(Sale.id)).scalar_subquery(),
+        select(func.count(Category.id)).scalar_subquery()
+    )).one()
+    return {
+        'تاريخ التقرير': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'عدد المنتجات': counts[0],
+        'عدد العملاء': counts[1],
+        'عدد المبيعات': counts[2],
+        'عدد الفئات': counts[3]
+    }
+
+
+def iter_table_rows(model, columns):
+    """صفوف الجدول كقوائم قيم جاهزة للكتابة، مقروءة على دفعات بترتيب المفتاح الأساسي"""
+    statement = select(*[column for column, _, _ in columns]).order_by(model.id)
+    converters = [convert for _, _, convert in columns]
+    for row in db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+        yield [convert(value) if convert else value for convert, value in zip(converters, row)]
+
+
+def _counted(rows, counts, key):
+    counts[key] = 0
+    for row in rows:
+        counts[key] += 1
+        yield row
+
+
+def write_database_xlsx(output, include_users=False, progress=None):
+    """كتابة ملف XLSX بورقة لكل جدول - يعيد عدد الصفوف لكل جدول
+    progress(نسبة) تُستدعى عند بدء كل ورقة"""
+    tables = export_tables(include_users)
+    summary = _summary()
+    counts = {'report_summary': 1}
+
+    def sheets():
+        yield 'ملخص التقرير', list(summary), [list(summary.values())]
+        for done, (key, title, model, columns) in enumerate(tables):
+            if progress:
+                progress(done / len(tables))
+            yield title, [header for _, header, _ in columns], _counted(iter_table_rows(model, columns), counts, key)
+
+    write_xlsx_sheets(sheets(), output)
+    return counts
+
+
+def stream_database_json(include_users=False):
+    """نفس البيانات كمستند JSON واحد {المفتاح: [صفوف]} يُرسل جدولاً جدولاً"""
+    yield '{"report_summary": [' + json.dumps(_summary(), ensure_ascii=False) + ']'
+    for key, _, model, columns in export_tables(include_users):
+        headers = [header for _, header, _ in columns]
+        yield f', "{key}": ['
+        separator = ''
+        for row in iter_table_rows(model, columns):
+            yield separator + json.dumps(dict(zip(headers, row)), ensure_ascii=False)
+            separator = ','
+        yield ']'
+    yield '}'
@@ -0,0 +1,52 @@
+"""
+نطاقات التاريخ بتوقيت مصر
+التواريخ مخزنة بتوقيت UTC، لذلك يتحول اليوم المحلي (بتوقيت القاهرة) إلى نطاق
+نصف مفتوح [بداية اليوم، بداية اليوم التالي) بتوقيت UTC. المقارنة المباشرة
+بالعمود بدلاً من func.date(column) تسمح باستخدام الفهرس على عمود التاريخ.
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+EGYPT_TZ = pytz.timezone('Africa/Cairo')
+
+
+def egypt_today():
+    """تاريخ اليوم بتوقيت مصر"""
+    return datetime.now(EGYPT_TZ).date()
+
+
+def to_egypt_date(utc_datetime):
+    """اليوم المحلي (بتوقيت مصر) لقيمة تاريخ مخزنة بتوقيت UTC"""
+    if utc_datetime.tzinfo is None:
+        utc_datetime = pytz.utc.localize(utc_datetime)
+    return utc_datetime.astimezone(EGYPT_TZ).date()
+
+
+def egypt_day_start_utc(day):
+    """بداية اليوم المحلي بتوقيت UTC (بدون معلومات المنطقة الزمنية مثل القيم المخزنة)"""
+    local_midnight = EGYPT_TZ.localize(datetime(day.year, day.month, day.day))
+    return local_midnight.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def egypt_day_range(start_day, end_day=None):
+    """نطاق UTC نصف مفتوح يغطي الأيام المحلية من start_day إلى end_day شاملة"""
+    end_day = end_day or start_day
+    return egypt_day_start_utc(start_day), egypt_day_start_utc(end_day + timedelta(days=1))
+
+
+def date_range_filter(column, start_day=None, end_day=None):
+    """شروط فلترة قابلة لاستخدام الفهرس على عمود تاريخ لأيام محلية (أي طرف اختياري)"""
+    criteria = []
+    if start_day:
+        criteria.append(column >= egypt_day_start_utc(start_day))
+    if end_day:
+        criteria.append(column < egypt_day_start_utc(end_day + timedelta(days=1)))
+    return criteria
+
+
+def in_egypt_day(column, day):
+    """شرط وقوع قيمة العمود داخل يوم محلي واحد"""
+    start, end = egypt_day_range(day)
+    return (column >= start) & (column < end)
@@ -0,0 +1,388 @@
+"""
+النسخ الاحتياطي لقاعدة البيانات
+- نسخة كاملة: SQLite عبر VACUUM INTO (لقطة متسقة من معاملة قراءة واحدة أثناء عمل
+  التطبيق، أو واجهة backup في الإصدارات القديمة) ثم ضغط gzip، و PostgreSQL عبر
+  pg_dump بالصيغة المضغوطة custom.
+- نسخة تزايدية: ملف NDJSON مضغوط بالصفوف المتغيرة منذ آخر نسخة فقط. الجداول التي
+  بها updated_at تُقرأ بها، وجداول الإضافة فقط (APPEND_ONLY_TABLES) برقم أكبر من آخر
+  رقم في النسخة السابقة، وباقي الجداول الصغيرة تُنسخ كاملة. الحذف لا يظهر في النسخ
+  التزايدية (عدا المنتجات عبر product_tombstone) ويظهر في النسخة الكاملة التالية.
+- كل نسخة تُسجل في manifest.json مع بصمة sha256 وعدد الصفوف، ويُتحقق منها بعد
+  إنشائها (فك الضغط و PRAGMA integrity_check ومطابقة عدد الصفوف).
+- الاحتفاظ: آخر BACKUP_KEEP نسخ كاملة مع النسخ التزايدية المبنية عليها.
+- الاستعادة (SQLite): النسخة الكاملة ثم النسخ التزايدية بعدها بالترتيب في ملف جديد،
+  ثم فحص السلامة. في PostgreSQL تُستعاد النسخة الكاملة بـ pg_restore، والنسخ التزايدية
+  للتصدير فقط.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, func, or_
+
+from models import db
+
+MANIFEST_NAME = 'manifest.json'
+
+# جداول لا تُعدّل صفوفها بعد إضافتها: يكفي نسخ الأرقام الأكبر من آخر نسخة
+APPEND_ONLY_TABLES = ('sale', 'sale_item', 'payment', 'stock_movement', 'stock_snapshot', 'product_tombstone')
+
+# صفوف تتغير بإضافة صفوف في جدول آخر: حالة البيع تتغير مع كل دفعة جديدة عليه
+RELATED_CHANGES = {'sale': [('payment', 'sale_id')]}
+
+# هامش تداخل لعمود updated_at حتى لا تضيع تعديلات معاملات بدأت قبل النسخة السابقة
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def backup_folder():
+    folder = current_app.config.get('BACKUP_FOLDER', 'backups')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def load_manifest(folder):
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(folder, entries):
+    path = os.path.join(folder, MANIFEST_NAME)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=folder, delete=False) as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    os.replace(f.name, path)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _gzip_file(source, target):
+    with open(source, 'rb') as src, gzip.open(target, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+
+
+def _main_tables():
+    """جداول قاعدة البيانات الرئيسية بترتيب الاعتماد (بدون جداول binds أخرى مثل المهام)"""
+    return [table for table in db.metadata.sorted_tables if table.info.get('bind_key') is None]
+
+
+def _id_watermarks():
+    """أكبر رقم في كل جدول إضافة فقط"""
+    tables = {table.name: table for table in _main_tables()}
+    return {
+        name: db.session.execute(select(func.max(tables[name].c.id))).scalar() or 0
+        for name in APPEND_ONLY_TABLES if name in tables
+    }
+
+
+def _sqlite_path():
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return url.database
+
+
+def _sqlite_row_counts(path):
+    connection = sqlite3.connect(path)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%'"
+        )]
+        return {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        connection.close()
+
+
+def _sqlite_hot_copy(source_path, target_path):
+    """نسخة متسقة من قاعدة SQLite تعمل (VACUUM INTO من SQLite 3.27، وإلا واجهة backup)"""
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        if sqlite3.sqlite_version_info >= (3, 27, 0):
+            source.execute('VACUUM INTO ?', (target_path,))
+        else:
+            target = sqlite3.connect(target_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+def _postgres_dump(target_path):
+    """pg_dump بكلمة المرور في PGPASSWORD - لا تظهر في سطر الأوامر (ps) ولا في رسائل الخطأ"""
+    url = db.engine.url
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = str(url.password)
+    command = ['pg_dump', '--format=custom', '--no-owner', f'--file={target_path}', f'--dbname={url.database}']
+    if url.host:
+        command.append(f'--host={url.host}')
+    if url.port:
+        command.append(f'--port={url.port}')
+    if url.username:
+        command.append(f'--username={url.username}')
+    subprocess.run(command, check=True, env=env)
+
+
+def create_full_backup(folder):
+    """نسخة كاملة مضغوطة - تعيد سجل النسخة في manifest"""
+    started = datetime.utcnow()
+    stamp = started.strftime('%Y%m%d_%H%M%S')
+    watermarks = _id_watermarks()
+    sqlite_path = _sqlite_path()
+
+    if sqlite_path:
+        filename = f'sara_full_{stamp}.db.gz'
+        with tempfile.TemporaryDirectory(dir=folder) as workdir:
+            copy_path = os.path.join(workdir, 'copy.db')
+            _sqlite_hot_copy(sqlite_path, copy_path)
+            rows = _sqlite_row_counts(copy_path)
+            _gzip_file(copy_path, os.path.join(folder, filename))
+        engine = 'sqlite'
+    elif db.engine.url.get_backend_name() == 'postgresql':
+        filename = f'sara_full_{stamp}.dump'
+        _postgres_dump(os.path.join(folder, filename))
+        rows, engine = None, 'postgresql'
+    else:
+        raise ValueError(f'نوع قاعدة البيانات غير مدعوم للنسخ الاحتياطي: {db.engine.url.get_backend_name()}')
+
+    return _record(folder, {
+        'file': filename,
+        'kind': 'full',
+        'engine': engine,
+        'base': filename,
+        'created_at': started.isoformat(),
+        'ids': watermarks,
+        'rows': rows
+    })
+
+
+def _changed_rows_query(table, previous):
+    """استعلام صفوف الجدول المتغيرة منذ النسخة السابقة - None يعني نسخ الجدول كاملاً"""
+    since = datetime.fromisoformat(previous['created_at']) - WATERMARK_OVERLAP
+    last_ids = previous.get('ids', {})
+
+    if 'updated_at' in table.c:
+        return select(table).where(or_(table.c.updated_at >= since, table.c.updated_at.is_(None)))
+
+    if table.name in last_ids:
+        criteria = [table.c.id > last_ids[table.name]]
+        tables = {t.name: t for t in _main_tables()}
+        for related_name, column in RELATED_CHANGES.get(table.name, []):
+            related = tables[related_name]
+            criteria.append(table.c.id.in_(
+                select(related.c[column]).where(related.c.id > last_ids.get(related_name, 0))
+            ))
+        return select(table).where(or_(*criteria))
+
+    return None
+
+
+def create_incremental_backup(folder):
+    """نسخة بالصفوف المتغيرة منذ آخر نسخة - تعيد None إذا لم توجد نسخة كاملة سابقة"""
+    entries = load_manifest(folder)
+    if not entries:
+        return None
+    previous = entries[-1]
+
+    started = datetime.utcnow()
+    watermarks = _id_watermarks()
+    filename = f"sara_incr_{started.strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+    rows = {}
+
+    with gzip.open(os.path.join(folder, filename), 'wt', encoding='utf-8', compresslevel=6) as output:
+        output.write(json.dumps({'since': previous['file'], 'created_at': started.isoformat()}) + '\n')
+        for table in _main_tables():
+            query = _changed_rows_query(table, previous)
+            mode = 'full' if query is None else 'changed'
+            if query is None:
+                query = select(table)
+
+            output.write(json.dumps({'table': table.name, 'mode': mode, 'columns': list(table.c.keys())}) + '\n')
+            count = 0
+            for row in db.session.execute(query.execution_options(yield_per=1000)):
+                output.write(json.dumps(list(row), ensure_ascii=False, default=str) + '\n')
+                count += 1
+            rows[table.name] = count
+
+    return _record(folder, {
+        'file': filename,
+        'kind': 'incremental',
+        'engine': db.engine.url.get_backend_name(),
+        'base': previous['base'],
+        'created_at': started.isoformat(),
+        'ids': watermarks,
+        'rows': rows
+    })
+
+
+def _record(folder, entry):
+    path = os.path.join(folder, entry['file'])
+    entry['size'] = os.path.getsize(path)
+    entry['sha256'] = _sha256(path)
+    entries = load_manifest(folder)
+    entries.append(entry)
+    _save_manifest(folder, entries)
+    return entry
+
+
+def verify_backup(folder, entry):
+    """التحقق من قابلية استعادة النسخة - يعيد قائمة المشاكل (فارغة إذا كانت سليمة)"""
+    path = os.path.join(folder, entry['file'])
+    if not os.path.exists(path):
+        return [f"الملف غير موجود: {entry['file']}"]
+    if _sha256(path) != entry.get('sha256'):
+        return ['بصمة الملف لا تطابق المسجل في manifest']
+
+    problems = []
+    if entry['kind'] == 'full' and entry['engine'] == 'sqlite':
+        with tempfile.TemporaryDirectory(dir=folder) as workdir:
+            restored = os.path.join(workdir, 'restore.db')
+            with gzip.open(path, 'rb') as src, open(restored, 'wb') as dst:
+                shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+            connection = sqlite3.connect(restored)
+            try:
+                result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+            finally:
+                connection.close()
+            if result != 'ok':
+                problems.append(f'فحص السلامة: {result}')
+            elif _sqlite_row_counts(restored) != entry['rows']:
+                problems.append('عدد الصفوف بعد الاستعادة لا يطابق النسخة')
+
+    elif entry['kind'] == 'full':
+        listing = subprocess.run(['pg_restore', '--list', path], capture_output=True, text=True)
+        if listing.returncode != 0:
+            problems.append(f'pg_restore: {listing.stderr.strip()}')
+
+    else:
+        counts = {}
+        table = None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            next(f)
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    table = record['table']
+                    counts[table] = 0
+                else:
+                    counts[table] += 1
+        if counts != entry['rows']:
+            problems.append('عدد الصفوف في الملف لا يطابق النسخة')
+
+    return problems
+
+
+def restore_chain(folder, filename=None):
+    """النسخة الكاملة والنسخ التزايدية اللازمة لاستعادة filename (الافتراضي: آخر نسخة)"""
+    entries = load_manifest(folder)
+    names = [entry['file'] for entry in entries]
+    if filename is not None and filename not in names:
+        raise ValueError(f'النسخة غير موجودة في manifest: {filename}')
+    last = names.index(filename) if filename is not None else len(entries) - 1
+    if last < 0:
+        raise ValueError('لا توجد نسخ احتياطية')
+
+    base = entries[last]['base']
+    return [entry for entry in entries[:last + 1] if entry['base'] == base]
+
+
+def _sqlite_value(value):
+    # أعمدة JSON تُكتب في النسخة التزايدية ككائنات وتُخزن في SQLite كنص
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+
+def _apply_incremental(connection, path):
+    """تطبيق نسخة تزايدية على قاعدة SQLite: الجداول الكاملة تُستبدل والمتغيرة تُضاف أو تُحدث"""
+    deleted_products = []
+    insert = None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        next(f)
+        for line in f:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                table, columns = record['table'], record['columns']
+                if record['mode'] == 'full':
+                    connection.execute(f'DELETE FROM "{table}"')
+                quoted = ', '.join(f'"{column}"' for column in columns)
+                placeholders = ', '.join('?' for _ in columns)
+                insert = f'INSERT OR REPLACE INTO "{table}" ({quoted}) VALUES ({placeholders})'
+                product_id_index = columns.index('product_id') if table == 'product_tombstone' else None
+                continue
+
+            connection.execute(insert, [_sqlite_value(value) for value in record])
+            if product_id_index is not None:
+                deleted_products.append(record[product_id_index])
+
+    # المنتجات المحذوفة بعد النسخة السابقة لا تظهر إلا في سجل الحذف
+    connection.executemany('DELETE FROM product WHERE id = ?', [(product_id,) for product_id in deleted_products])
+
+
+def restore_backup(folder, target_path, filename=None):
+    """استعادة نسخة SQLite (الكاملة ثم التزايدية حتى filename) في ملف جديد target_path
+    - يعيد قائمة المشاكل (فارغة إذا نجحت الاستعادة)"""
+    chain = restore_chain(folder, filename)
+    if chain[0]['engine'] != 'sqlite':
+        raise ValueError('الاستعادة متاحة لنسخ SQLite فقط - استخدم pg_restore للنسخة الكاملة من PostgreSQL')
+    if os.path.exists(target_path):
+        raise ValueError(f'الملف موجود بالفعل: {target_path}')
+
+    for entry in chain:
+        problems = verify_backup(folder, entry)
+        if problems:
+            return [f"{entry['file']}: {problem}" for problem in problems]
+
+    with gzip.open(os.path.join(folder, chain[0]['file']), 'rb') as src, open(target_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+
+    connection = sqlite3.connect(target_path)
+    try:
+        with connection:
+            for entry in chain[1:]:
+                _apply_incremental(connection, os.path.join(folder, entry['file']))
+        result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+        problems = [] if result == 'ok' else [f'فحص السلامة: {result}']
+
+        # كل الصفوف المضافة قبل آخر نسخة يجب أن تكون موجودة بعد الاستعادة
+        for table, last_id in chain[-1].get('ids', {}).items():
+            restored_id = connection.execute(f'SELECT MAX(id) FROM "{table}"').fetchone()[0] or 0
+            if restored_id < last_id:
+                problems.append(f'الجدول {table}: آخر رقم بعد الاستعادة {restored_id} أقل من {last_id}')
+    finally:
+        connection.close()
+    return problems
+
+
+def rotate_backups(folder, keep):
+    """حذف النسخ الكاملة الأقدم من آخر keep نسخة مع نسخها التزايدية - يعيد أسماء الملفات المحذوفة"""
+    entries = load_manifest(folder)
+    fulls = [entry['file'] for entry in entries if entry['kind'] == 'full']
+    kept_bases = set(fulls[-keep:]) if keep > 0 else set(fulls)
+
+    removed = [entry['file'] for entry in entries if entry['base'] not in kept_bases]
+    for filename in removed:
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    _save_manifest(folder, [entry for entry in entries if entry['base'] in kept_bases])
+    return removed
@@ -0,0 +1,150 @@
+"""
+دفتر ديون العملاء
+يحتفظ بأرصدة مجمعة لكل عميل على جدول customer بدلاً من المرور على
+جميع المبيعات والدفعات عند كل عرض للدين
+"""
+
+from sqlalchemy import func, case, update
+
+from models import db, Customer, Sale, Payment, Return
+from stats_cache import stats_cache, invalidate_after_commit, DEBT_STATS_KEY
+
+# طريقة الاسترداد التي تخصم قيمة المرتجع من دين العميل
+CREDIT_REFUND_METHOD = 'رصيد'
+
+# أقصى فرق مقبول بين الرصيد المخزن والرصيد المحسوب
+LEDGER_TOLERANCE = 0.01
+
+
+def apply_ledger_delta(customer_id, sales=0.0, paid=0.0, returned=0.0):
+    """تعديل أرصدة العميل بشكل ذري داخل المعاملة الحالية"""
+    if not customer_id or not (sales or paid or returned):
+        return
+
+    db.session.execute(
+        update(Customer)
+        .where(Customer.id == customer_id)
+        .values(
+            ledger_sales_total=Customer.ledger_sales_total + sales,
+            ledger_paid_total=Customer.ledger_paid_total + paid,
+            ledger_returned_total=Customer.ledger_returned_total + returned
+        )
+    )
+    invalidate_after_commit(db.session, DEBT_STATS_KEY)
+
+
+def post_sale_to_ledger(sale):
+    """تسجيل بيع جديد في دفتر العميل (البيع النقدي مدفوع بالكامل)"""
+    paid = sale.total_amount if sale.payment_type == 'cash' else 0
+    apply_ledger_delta(sale.customer_id, sales=sale.total_amount, paid=paid)
+
+
+def post_payment_to_ledger(sale, amount):
+    """تسجيل دفعة على بيع آجل"""
+    apply_ledger_delta(sale.customer_id, paid=amount)
+
+
+def post_return_to_ledger(return_obj):
+    """خصم المرتجع المقبول من دين العميل إذا تم استرداده كرصيد في الحساب"""
+    if return_obj.status != 'approved' or return_obj.refund_method != CREDIT_REFUND_METHOD:
+        return
+    apply_ledger_delta(return_obj.sale.customer_id, returned=return_obj.refund_amount or 0)
+
+
+def global_debt_stats():
+    """إجمالي الديون وعدد العملاء المدينين من الأرصدة المخزنة في استعلام واحد"""
+    total_debt, customers_with_debt = db.session.query(
+        func.coalesce(func.sum(Customer.total_debt), 0),
+        func.count(Customer.id)
+    ).filter(Customer.total_debt > 0).one()
+    return {'total_debt': float(total_debt), 'customers_with_debt': customers_with_debt}
+
+
+def compute_ledger_totals():
+    """حساب أرصدة جميع العملاء من صفوف المبيعات والدفعات والمرتجعات الخام"""
+    totals = {}
+
+    def row_for(customer_id):
+        return totals.setdefault(customer_id, [0.0, 0.0, 0.0])
+
+    sales_rows = db.session.query(
+        Sale.customer_id,
+        func.sum(Sale.total_amount),
+        func.sum(case((Sale.payment_type == 'cash', Sale.total_amount), else_=0))
+    ).filter(Sale.customer_id.isnot(None)).group_by(Sale.customer_id)
+
+    for customer_id, sales_total, cash_total in sales_rows:
+        row = row_for(customer_id)
+        row[0] += float(sales_total or 0)
+        row[1] += float(cash_total or 0)
+
+    payment_rows = db.session.query(
+        Sale.customer_id,
+        func.sum(Payment.amount)
+    ).join(Payment, Payment.sale_id == Sale.id).filter(
+        Sale.customer_id.isnot(None)
+    ).group_by(Sale.customer_id)
+
+    for customer_id, paid_total in payment_rows:
+        row_for(customer_id)[1] += float(paid_total or 0)
+
+    return_rows = db.session.query(
+        Sale.customer_id,
+        func.sum(Return.refund_amount)
+    ).join(Return, Return.sale_id == Sale.id).filter(
+        Sale.customer_id.isnot(None),
+        Return.status == 'approved',
+        Return.refund_method == CREDIT_REFUND_METHOD
+    ).group_by(Sale.customer_id)
+
+    for customer_id, returned_total in return_rows:
+        row_for(customer_id)[2] += float(returned_total or 0)
+
+    return totals
+
+
+def verify_ledger():
+    """مقارنة الأرصدة المخزنة بالأرصدة المحسوبة وإرجاع قائمة الفروق"""
+    expected = compute_ledger_totals()
+    mismatches = []
+
+    stored_rows = db.session.query(
+        Customer.id, Customer.name,
+        Customer.ledger_sales_total, Customer.ledger_paid_total, Customer.ledger_returned_total
+    )
+
+    for customer_id, name, sales_total, paid_total, returned_total in stored_rows:
+        stored = (sales_total or 0, paid_total or 0, returned_total or 0)
+        wanted = tuple(expected.get(customer_id, (0.0, 0.0, 0.0)))
+        if any(abs(a - b) > LEDGER_TOLERANCE for a, b in zip(stored, wanted)):
+            mismatches.append({
+                'customer_id': customer_id,
+                'name': name,
+                'stored': stored,
+                'expected': wanted
+            })
+
+    return mismatches
+
+
+def rebuild_ledger():
+    """إعادة بناء أرصدة جميع العملاء من البيانات الخام - يعيد عدد العملاء المحدثين"""
+    expected = compute_ledger_totals()
+    customer_ids = [row[0] for row in db.session.query(Customer.id)]
+
+    mappings = []
+    for customer_id in customer_ids:
+        sales_total, paid_total, returned_total = expected.get(customer_id, (0.0, 0.0, 0.0))
+        mappings.append({
+            'id': customer_id,
+            'ledger_sales_total': sales_total,
+            'ledger_paid_total': paid_total,
+            'ledger_returned_total': returned_total
+        })
+
+    if mappings:
+        db.session.bulk_update_mappings(Customer, mappings)
+    db.session.commit()
+    stats_cache.invalidate(DEBT_STATS_KEY)
+
+    return len(mappings)
@@ -109,6 +109,7 @@ with app.app_context():
     else:
         print('Admin user already exists')
 "
+$VENV_DIR/bin/python manage.py upgrade-db
 
 # Create Gunicorn configuration
 print_status "Creating Gunicorn configuration..."
@@ -0,0 +1,183 @@
+"""
+تحليلات المخزون
+الكمية المباعة والإيرادات وقيمة المخزون وحالة كل منتج تُحسب في استعلام واحد:
+المنتجات مع قسمها مع LEFT JOIN على مجاميع أصناف المبيعات حسب المنتج. حالة
+المخزون تعتمد على min_stock_threshold لكل منتج.
+"""
+
+from sqlalchemy import func, case, desc
+
+from models import db, Product, Category, SaleItem
+from product_search import product_search_filter
+
+# عدد الصفوف المقروءة في كل دفعة عند التصدير
+INVENTORY_BATCH_SIZE = 1000
+
+# (الحالة، العربية، الإنجليزية)
+STOCK_STATUSES = {
+    'out': ('نفدت الكمية', 'Out of Stock'),
+    'low': ('كمية قليلة', 'Low Stock'),
+    'available': ('متوفر', 'Available'),
+}
+
+# (المفتاح، العنوان في CSV و XLSX)
+INVENTORY_COLUMNS = [
+    ('product_id', 'رقم المنتج'),
+    ('product_name', 'المنتج'),
+    ('category', 'الفئة'),
+    ('current_stock', 'المخزون الحالي'),
+    ('min_stock_threshold', 'الحد الأدنى'),
+    ('unit_type', 'نوع الوحدة'),
+    ('unit_price', 'سعر الوحدة'),
+    ('stock_value', 'قيمة المخزون'),
+    ('status_ar', 'الحالة'),
+    ('total_sold', 'الكمية المباعة'),
+    ('total_revenue', 'إجمالي الإيرادات'),
+]
+
+
+def stock_status_expr():
+    """حالة المخزون كتعبير SQL: out أو low أو available"""
+    return case(
+        (Product.stock_quantity <= 0, 'out'),
+        (Product.stock_quantity <= Product.min_stock_threshold, 'low'),
+        else_='available'
+    )
+
+
+def selling_price_expr():
+    """سعر البيع المعتمد للمنتج (price القديم إذا لم يحدد سعر البيع)"""
+    return func.coalesce(Product.price, Product.retail_price, 0)
+
+
+def product_filters(search='', category_id=0, stock_status='', min_price=None, max_price=None, unit_type=''):
+    """شروط فلترة المنتجات المستخدمة في صفحة المنتجات والتقارير"""
+    criteria = []
+
+    search_criterion = product_search_filter(search)
+    if search_criterion is not None:
+        criteria.append(search_criterion)
+
+    if category_id:
+        criteria.append(Product.category_id == category_id)
+
+    if stock_status == 'available':
+        criteria.append(Product.stock_quantity > Product.min_stock_threshold)
+    elif stock_status == 'low':
+        criteria.extend([Product.stock_quantity <= Product.min_stock_threshold, Product.stock_quantity > 0])
+    elif stock_status == 'out':
+        criteria.append(Product.stock_quantity <= 0)
+
+    if min_price is not None:
+        criteria.append(Product.retail_price >= min_price)
+
+    if max_price is not None:
+        criteria.append(Product.retail_price <= max_price)
+
+    if unit_type:
+        criteria.append(Product.unit_type == unit_type)
+
+    return criteria
+
+
+def product_ordering(sort_by='name'):
+    """ترتيب قائمة المنتجات مع رقم المنتج لترتيب ثابت بين الصفحات"""
+    orderings = {
+        'name': [Product.name_ar],
+        'price': [desc(Product.retail_price)],
+        'stock': [desc(Product.stock_quantity)],
+        'date': [desc(Product.created_at)],
+    }
+    return orderings.get(sort_by, orderings['name']) + [Product.id]
+
+
+def _sales_by_product():
+    return db.session.query(
+        SaleItem.product_id.label('product_id'),
+        func.sum(SaleItem.quantity).label('total_sold'),
+        func.sum(SaleItem.total_price).label('total_revenue')
+    ).group_by(SaleItem.product_id).subquery()
+
+
+def inventory_query(*criteria):
+    """صف لكل منتج مع مبيعاته وقيمة مخزونه وحالته"""
+    sales = _sales_by_product()
+    price = selling_price_expr()
+
+    return db.session.query(
+        Product.id.label('product_id'),
+        Product.name_ar.label('product_name'),
+        func.coalesce(Category.name_ar, 'غير محدد').label('category'),
+        Product.stock_quantity.label('current_stock'),
+        Product.min_stock_threshold.label('min_stock_threshold'),
+        Product.unit_type.label('unit_type'),
+        price.label('unit_price'),
+        Product.wholesale_price.label('wholesale_price'),
+        (Product.stock_quantity * price).label('stock_value'),
+        stock_status_expr().label('status'),
+        func.coalesce(sales.c.total_sold, 0).label('total_sold'),
+        func.coalesce(sales.c.total_revenue, 0).label('total_revenue')
+    ).outerjoin(
+        Category, Product.category_id == Category.id
+    ).outerjoin(
+        sales, sales.c.product_id == Product.id
+    ).filter(*criteria)
+
+
+def count_inventory_rows(*criteria):
+    """عدد المنتجات في تصدير المخزون"""
+    return db.session.query(func.count(Product.id)).filter(*criteria).scalar()
+
+
+def iter_inventory_rows(*criteria):
+    """صفوف تصدير المخزون كقواميس، مقروءة على دفعات"""
+    query = inventory_query(*criteria).order_by(Product.id).execution_options(yield_per=INVENTORY_BATCH_SIZE)
+
+    for row in query:
+        status_ar, status_en = STOCK_STATUSES[row.status]
+        yield {
+            'product_id': row.product_id,
+            'product_name': row.product_name,
+            'category': row.category,
+            'current_stock': float(row.current_stock or 0),
+            'min_stock_threshold': float(row.min_stock_threshold or 0),
+            'unit_type': row.unit_type,
+            'unit_price': float(row.unit_price or 0),
+            'stock_value': float(row.stock_value or 0),
+            'is_whole_unit': row.unit_type == 'كامل',
+            'status': row.status,
+            'status_ar': status_ar,
+            'status_en': status_en,
+            'total_sold': float(row.total_sold),
+            'total_revenue': float(row.total_revenue)
+        }
+
+
+def inventory_summary(*criteria):
+    """مجاميع المخزون للمنتجات المطابقة في استعلام واحد"""
+    retail = func.coalesce(func.nullif(Product.retail_price, 0), Product.price, 0)
+    wholesale = func.coalesce(Product.wholesale_price, 0)
+    stock = func.coalesce(Product.stock_quantity, 0)
+
+    row = db.session.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(wholesale * stock), 0),
+        func.coalesce(func.sum(retail * stock), 0),
+        func.coalesce(func.sum(stock), 0),
+        func.coalesce(func.sum(case((Product.stock_quantity <= Product.min_stock_threshold, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Product.stock_quantity <= 0, 1), else_=0)), 0)
+    ).filter(*criteria).one()
+
+    count, wholesale_value, retail_value, stock_quantity, low_stock, out_of_stock = row
+    total_profit = float(retail_value) - float(wholesale_value)
+
+    return {
+        'total_products_count': count,
+        'total_wholesale_value': float(wholesale_value),
+        'total_retail_value': float(retail_value),
+        'total_profit': total_profit,
+        'total_stock_quantity': float(stock_quantity),
+        'low_stock_count': int(low_stock),
+        'out_of_stock_count': int(out_of_stock),
+        'profit_margin_percentage': (total_profit / float(wholesale_value) * 100) if wholesale_value else 0
+    }
@@ -0,0 +1,253 @@
+"""
+مهام الخلفية
+الأعمال الطويلة (استيراد ملف منتجات كبير، تصدير قاعدة البيانات) تُسجل في جدول
+background_job (قاعدة SQLite مستقلة عبر bind "jobs") وتُنفذ في خيوط ThreadPoolExecutor
+داخل نفس العملية، فيعود الطلب فوراً برقم المهمة ولا ينشغل عامل gunicorn بها.
+
+الحالة والتقدم تُكتب في جدول المهام باتصال منفصل قصير، فتظهر لأي عامل يستقبل
+طلب /api/jobs/<id> حتى أثناء معاملة المهمة نفسها على قاعدة البيانات الرئيسية.
+
+الخيط المنفذ يحدّث heartbeat_at كل HEARTBEAT_INTERVAL ثانية. إذا أُعيد تشغيل العامل
+(timeout أو max_requests أو نشر جديد) تتوقف الإشارة، فتُعلَّم المهمة الجارية فاشلة
+بعد JOB_STALE_AFTER وتُعاد المهام التي بقيت في الانتظار إلى طابور العامل الحالي
+(recover_stale_jobs عند إضافة مهمة أو متابعة مهمة متوقفة).
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, delete, func
+
+from models import db, BackgroundJob
+
+# نوع المهمة -> الدالة المنفذة handler(job, params) وتعيد نتيجة قابلة للتحويل إلى JSON
+JOB_HANDLERS = {}
+
+# الفترة بين إشارات الحياة من الخيط المنفذ بالثواني
+HEARTBEAT_INTERVAL = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+_requeued = set()  # المهام المعادة إلى طابور هذه العملية (حتى لا تُعاد مع كل متابعة)
+
+
+def job_handler(kind):
+    """تسجيل دالة تنفيذ لنوع مهمة"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def job_folder(app=None):
+    """مجلد ملفات المهام (المدخلات المرفوعة وملفات النتائج)"""
+    app = app or current_app
+    folder = app.config.get('JOB_FOLDER', 'jobs')
+    if not os.path.isabs(folder):
+        folder = os.path.join(app.instance_path, folder)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _jobs_engine():
+    return db.engines['jobs']
+
+
+def _update_job(job_id, **values):
+    """تحديث صف المهمة في معاملة مستقلة عن جلسة المهمة"""
+    table = BackgroundJob.__table__
+    with _jobs_engine().begin() as connection:
+        return connection.execute(table.update().where(table.c.id == job_id).values(**values)).rowcount
+
+
+class JobContext:
+    """ما تحتاجه دالة التنفيذ: الإبلاغ عن التقدم وتحديد ملف النتيجة"""
+
+    def __init__(self, job_id, folder):
+        self.id = job_id
+        self.folder = folder
+
+    def progress(self, fraction, message=None):
+        values = {'progress': max(0.0, min(float(fraction), 1.0))}
+        if message is not None:
+            values['message'] = message[:200]
+        _update_job(self.id, **values)
+
+    def result_file(self, filename, mimetype):
+        """مسار ملف النتيجة الذي تكتب فيه المهمة - يُحمّل من /api/jobs/<id>/result باسم filename"""
+        path = os.path.join(self.folder, f'{self.id}-result{os.path.splitext(filename)[1]}')
+        _update_job(self.id, result_path=path, result_name=filename, result_mimetype=mimetype)
+        return path
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 1), thread_name_prefix='job')
+        return _executor
+
+
+def submit_job(kind, params=None, user_id=None, upload=None):
+    """إضافة مهمة للطابور - upload ملف مرفوع يُحفظ ويُمرر مساره في params['input_path']"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'نوع مهمة غير معروف: {kind}')
+
+    app = current_app._get_current_object()
+    purge_old_jobs()
+    recover_stale_jobs(app)
+
+    job_id = uuid.uuid4().hex
+    params = dict(params or {})
+    if upload is not None:
+        extension = os.path.splitext(upload.filename or '')[1].lower()
+        params['input_path'] = os.path.join(job_folder(app), f'{job_id}-input{extension}')
+        upload.save(params['input_path'])
+
+    with _jobs_engine().begin() as connection:
+        connection.execute(BackgroundJob.__table__.insert().values(
+            id=job_id, kind=kind, status='queued', progress=0,
+            params=json.dumps(params, ensure_ascii=False), user_id=user_id, created_at=datetime.utcnow()
+        ))
+
+    _get_executor(app).submit(_run_job, app, job_id)
+    return job_id
+
+
+def _heartbeat(app, job_id, stopped):
+    while not stopped.wait(HEARTBEAT_INTERVAL):
+        try:
+            with app.app_context():
+                _update_job(job_id, heartbeat_at=datetime.utcnow())
+        except Exception:
+            app.logger.exception(f'Background job {job_id} heartbeat failed')
+
+
+def _run_job(app, job_id):
+    with app.app_context():
+        # المطالبة بالمهمة بشرط أنها ما زالت في الانتظار حتى لا تُنفذ مرتين
+        table = BackgroundJob.__table__
+        now = datetime.utcnow()
+        with _jobs_engine().begin() as connection:
+            claimed = connection.execute(
+                table.update().where(table.c.id == job_id, table.c.status == 'queued')
+                .values(status='running', started_at=now, heartbeat_at=now)
+            ).rowcount
+            if not claimed:
+                return
+            kind, params = connection.execute(select(table.c.kind, table.c.params).where(table.c.id == job_id)).one()
+
+        stopped = threading.Event()
+        threading.Thread(target=_heartbeat, args=(app, job_id, stopped), daemon=True,
+                         name=f'job-heartbeat-{job_id[:8]}').start()
+
+        params = json.loads(params or '{}')
+        try:
+            result = JOB_HANDLERS[kind](JobContext(job_id, job_folder(app)), params)
+            _update_job(
+                job_id, status='done', progress=1, finished_at=datetime.utcnow(),
+                result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+            )
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception(f'Background job {job_id} ({kind}) failed')
+            _update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        finally:
+            stopped.set()
+            _remove_input(params)
+
+
+def _remove_input(params):
+    if params.get('input_path') and os.path.exists(params['input_path']):
+        os.remove(params['input_path'])
+
+
+def _is_stale(job, now=None):
+    """مهمة جارية بلا إشارة حياة أو منتظرة لم يأخذها أي عامل خلال JOB_STALE_AFTER"""
+    cutoff = (now or datetime.utcnow()) - current_app.config['JOB_STALE_AFTER']
+    if job.status == 'running':
+        return (job.heartbeat_at or job.started_at or job.created_at) < cutoff
+    return job.status == 'queued' and job.created_at < cutoff
+
+
+def recover_stale_jobs(app=None):
+    """تعليم المهام الجارية التي توقف عاملها فاشلة وإعادة المنتظرة القديمة إلى الطابور
+    - يعيد (عدد الفاشلة، عدد المعادة)"""
+    app = app or current_app._get_current_object()
+    cutoff = datetime.utcnow() - app.config['JOB_STALE_AFTER']
+    table = BackgroundJob.__table__
+    last_seen = func.coalesce(table.c.heartbeat_at, table.c.started_at, table.c.created_at)
+
+    failed = []
+    with _jobs_engine().begin() as connection:
+        stale = connection.execute(
+            select(table.c.id, table.c.params).where(table.c.status == 'running', last_seen < cutoff)
+        ).all()
+        for job_id, params in stale:
+            if connection.execute(
+                table.update().where(table.c.id == job_id, table.c.status == 'running', last_seen < cutoff)
+                .values(status='failed', error='توقف العامل المنفذ قبل انتهاء المهمة', finished_at=datetime.utcnow())
+            ).rowcount:
+                failed.append((job_id, params))
+        queued = connection.execute(
+            select(table.c.id).where(table.c.status == 'queued', table.c.created_at < cutoff)
+        ).scalars().all()
+
+    for job_id, params in failed:
+        app.logger.warning(f'Background job {job_id} lost its worker - marked as failed')
+        _remove_input(json.loads(params or '{}'))
+
+    # _run_job يطالب بالمهمة بشرط أنها ما زالت منتظرة، فلا تُنفذ مرتين إذا أخذها عامل آخر
+    with _executor_lock:
+        queued = [job_id for job_id in queued if job_id not in _requeued]
+        _requeued.update(queued)
+    for job_id in queued:
+        _get_executor(app).submit(_run_job, app, job_id)
+
+    return len(failed), len(queued)
+
+
+def get_job(job_id):
+    job = db.session.get(BackgroundJob, job_id)
+    if job is not None and _is_stale(job):
+        recover_stale_jobs()
+        db.session.refresh(job)
+    return job
+
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': round(job.progress or 0, 4),
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'has_file': bool(job.result_path) and job.status == 'done',
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def purge_old_jobs():
+    """حذف المهام وملفاتها الأقدم من JOB_RETENTION - يعيد عدد المهام المحذوفة"""
+    cutoff = datetime.utcnow() - current_app.config['JOB_RETENTION']
+    table = BackgroundJob.__table__
+    with _jobs_engine().begin() as connection:
+        paths = connection.execute(
+            select(table.c.result_path).where(table.c.created_at < cutoff, table.c.result_path.isnot(None))
+        ).scalars().all()
+        count = connection.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    return count
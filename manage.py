@@ -303,29 +303,164 @@ def cleanup_logs(days):
 
 
 @cli.command()
-def backup_db():
-    """Create database backup"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # Check if using PostgreSQL or SQLite
-    database_url = app.config.get('SQLALCHEMY_DATABASE_URI', '')
-    
-    if 'postgresql' in database_url:
-        # PostgreSQL backup
-        backup_file = f"backup_postgresql_{timestamp}.sql"
-        os.system(f"pg_dump library_db > {backup_file}")
-        click.echo(f"✅ PostgreSQL database backed up to: {backup_file}")
-    
-    elif 'sqlite' in database_url:
-        # SQLite backup
-        import shutil
-        db_file = database_url.replace('sqlite:///', '')
-        backup_file = f"backup_sqlite_{timestamp}.db"
-        shutil.copy2(db_file, backup_file)
-        click.echo(f"✅ SQLite database backed up to: {backup_file}")
-    
-    else:
-        click.echo("❌ Unknown database type for backup.")
+@click.option('--incremental', is_flag=True, help='Only export rows changed since the last backup')
+@click.option('--keep', type=int, default=None, help='Full backups to keep (default: BACKUP_KEEP)')
+@click.option('--no-verify', is_flag=True, help='Skip the restore verification step')
+def backup_db(incremental, keep, no_verify):
+    """Create a compressed hot backup (full, or incremental since the last backup)"""
+    with app.app_context():
+        from db_backup import (backup_folder, create_full_backup, create_incremental_backup,
+                               verify_backup, rotate_backups)
+        
+        folder = backup_folder()
+        entry = create_incremental_backup(folder) if incremental else None
+        if incremental and entry is None:
+            click.echo("ℹ️  No previous backup found, creating a full backup instead")
+        if entry is None:
+            entry = create_full_backup(folder)
+        
+        click.echo(f"✅ {entry['kind'].capitalize()} backup saved to: {os.path.join(folder, entry['file'])} "
+                   f"({entry['size'] / 1024 / 1024:.1f} MB)")
+        
+        if not no_verify:
+            problems = verify_backup(folder, entry)
+            if problems:
+                for problem in problems:
+                    click.echo(f"❌ {problem}")
+                sys.exit(1)
+            click.echo("✅ Backup verified")
+        
+        removed = rotate_backups(folder, app.config.get('BACKUP_KEEP', 7) if keep is None else keep)
+        if removed:
+            click.echo(f"🗑️  Removed {len(removed)} old backup files")
+
+
+@cli.command()
+@click.argument('filename', required=False)
+def verify_backup(filename):
+    """Verify a backup file from the manifest (default: the latest one)"""
+    with app.app_context():
+        from db_backup import backup_folder, load_manifest, verify_backup as verify
+        
+        folder = backup_folder()
+        entries = [entry for entry in load_manifest(folder) if filename in (None, entry['file'])]
+        if not entries:
+            click.echo("❌ Backup not found in manifest")
+            sys.exit(1)
+        
+        problems = verify(folder, entries[-1])
+        if problems:
+            for problem in problems:
+                click.echo(f"❌ {problem}")
+            sys.exit(1)
+        click.echo(f"✅ {entries[-1]['file']} is restorable")
+
+
+@cli.command()
+@click.argument('target', type=click.Path(dir_okay=False))
+@click.option('--backup', 'filename', default=None, help='Restore up to this backup file (default: the latest one)')
+def restore_backup(target, filename):
+    """Restore a SQLite backup (full + incrementals) into a new database file and check it"""
+    with app.app_context():
+        from db_backup import backup_folder, restore_chain, restore_backup as restore
+        
+        folder = backup_folder()
+        try:
+            chain = restore_chain(folder, filename)
+            problems = restore(folder, target, filename)
+        except ValueError as e:
+            click.echo(f"❌ {e}")
+            sys.exit(1)
+        
+        if problems:
+            for problem in problems:
+                click.echo(f"❌ {problem}")
+            sys.exit(1)
+        click.echo(f"✅ Restored {chain[0]['file']} + {len(chain) - 1} incremental backups into: {target}")
+
+
+@cli.command()
+def upgrade_db():
+    """Apply schema upgrades (add missing columns and backfill their data)"""
+    with app.app_context():
+        from schema_upgrades import run_upgrades
+        run_upgrades(echo=click.echo)
+        click.echo("✅ Database schema is up to date!")
+
+
+@cli.command()
+@click.option('--check-only', is_flag=True, help='Only report drift, do not rebuild')
+def rebuild_debt_ledger(check_only):
+    """Rebuild customer debt balances from raw sales/payments and verify them"""
+    with app.app_context():
+        from debt_ledger import rebuild_ledger, verify_ledger
+        
+        if not check_only:
+            count = rebuild_ledger()
+            click.echo(f"🔄 Rebuilt debt ledger for {count} customers")
+        
+        mismatches = verify_ledger()
+        if not mismatches:
+            click.echo("✅ Debt ledger matches raw sales and payments")
+            return
+        
+        click.echo(f"❌ Debt ledger drift for {len(mismatches)} customers:")
+        click.echo("-" * 80)
+        for item in mismatches:
+            click.echo(f"   - #{item['customer_id']} {item['name']}: "
+                       f"stored {item['stored']} / expected {item['expected']}")
+        sys.exit(1)
+
+
+@cli.command()
+def rebuild_rollups():
+    """Rebuild the daily sales summary from raw sales, payments and returns"""
+    with app.app_context():
+        from sales_rollup import rebuild_rollups as rebuild
+        
+        count = rebuild()
+        click.echo(f"✅ Rebuilt daily sales summary: {count} day/seller rows")
+
+
+@cli.command()
+def rebuild_search_index():
+    """Rebuild the normalized Arabic product search index"""
+    with app.app_context():
+        from product_search import rebuild_search_index as rebuild
+        
+        count = rebuild()
+        click.echo(f"✅ Rebuilt product search index: {count} products")
+
+
+@cli.command()
+def snapshot_stock():
+    """Checkpoint current stock levels (run periodically, e.g. nightly from cron)"""
+    with app.app_context():
+        from stock_movements import take_stock_snapshot
+        
+        count = take_stock_snapshot()
+        click.echo(f"✅ Stock snapshot saved for {count} products")
+
+
+@cli.command()
+@click.option('--fix', is_flag=True, help='Record correction movements for any drift')
+def reconcile_stock(fix):
+    """Compare product stock with the stock movement journal"""
+    with app.app_context():
+        from stock_movements import reconcile_stock as reconcile
+        
+        drift = reconcile(fix=fix)
+        if not drift:
+            click.echo("✅ Stock matches the movement journal")
+            return
+        
+        click.echo(f"{'🔧 Corrected' if fix else '❌ Stock drift for'} {len(drift)} products:")
+        click.echo("-" * 80)
+        for item in drift:
+            click.echo(f"   - #{item['product_id']} {item['name']}: "
+                       f"stock {item['stock']:g} / journal {item['journal']:g}")
+        if not fix:
+            sys.exit(1)
 
 
 @cli.command()
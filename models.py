@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
@@ -7,6 +9,9 @@ import hashlib
 
 db = SQLAlchemy()
 
+# فروق التقريب الأقل من نصف قرش لا تعتبر ديناً
+DEBT_EPSILON = 0.005
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -162,7 +167,7 @@ class Product(db.Model):
     unit_type = db.Column(db.String(50), nullable=False, default='كامل')  # 'كامل' or 'جزئي'
     unit_description = db.Column(db.String(100))  # وصف الوحدة مثل "صفحة" أو "فصل"
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     sale_items = db.relationship('SaleItem', backref='product', lazy=True)
@@ -209,34 +214,49 @@ class Customer(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # دفتر الديون (أرصدة مجمعة تُحدَّث مع كل بيع ودفعة ومرتجع - انظر debt_ledger.py)
+    ledger_sales_total = db.Column(db.Float, nullable=False, default=0, server_default='0', comment='إجمالي مبيعات العميل')
+    ledger_paid_total = db.Column(db.Float, nullable=False, default=0, server_default='0', comment='إجمالي المدفوع من المبيعات')
+    ledger_returned_total = db.Column(db.Float, nullable=False, default=0, server_default='0', comment='مرتجعات مضافة كرصيد في الحساب')
+    
     # Relationships
     sales = db.relationship('Sale', backref='customer', lazy=True)
     
-    @property
+    @hybrid_property
     def total_debt(self):
         """إجمالي الدين المستحق على العميل"""
-        total_sales = sum(sale.total_amount for sale in self.sales if sale.payment_status != 'paid')
-        total_payments = sum(payment.amount for sale in self.sales for payment in sale.payments)
-        return max(0, total_sales - total_payments)
+        balance = (self.ledger_sales_total or 0) - (self.ledger_paid_total or 0) - (self.ledger_returned_total or 0)
+        return balance if balance >= DEBT_EPSILON else 0
+    
+    @total_debt.expression
+    def total_debt(cls):
+        balance = cls.ledger_sales_total - cls.ledger_paid_total - cls.ledger_returned_total
+        return case((balance >= DEBT_EPSILON, balance), else_=0)
     
     @property
     def total_sales_amount(self):
         """إجمالي مبلغ المبيعات للعميل"""
-        return sum(sale.total_amount for sale in self.sales)
+        return self.ledger_sales_total or 0
 
 class Sale(db.Model):
+    __table_args__ = (
+        # منع تكرار البيع عند إعادة رفع المبيعات المحفوظة أثناء عدم الاتصال
+        db.Index('uq_sale_user_local_id', 'user_id', 'local_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     subtotal = db.Column(db.Float, nullable=False, default=0, comment='المجموع الفرعي قبل الخصم')
     discount_type = db.Column(db.String(20), nullable=False, default='none', comment='نوع الخصم')  # 'none', 'percentage', 'fixed'
     discount_value = db.Column(db.Float, nullable=False, default=0, comment='قيمة الخصم')
     discount_amount = db.Column(db.Float, nullable=False, default=0, comment='مبلغ الخصم المحسوب')
     total_amount = db.Column(db.Float, nullable=False)
-    sale_date = db.Column(db.DateTime, default=datetime.utcnow)
+    sale_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
     payment_status = db.Column(db.String(20), nullable=False, default='paid')  # 'paid', 'partial', 'unpaid'
     payment_type = db.Column(db.String(20), nullable=False, default='cash')  # 'cash', 'credit'
     notes = db.Column(db.Text)
+    local_id = db.Column(db.String(64), nullable=True, comment='المعرف المحلي للبيع المحفوظ أثناء عدم الاتصال')
     
     # Relationships
     sale_items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
@@ -261,22 +281,13 @@ class Sale(db.Model):
     
     @property
     def total_profit(self):
-        """إجمالي ربح البيع"""
-        profit = 0
-        for item in self.sale_items:
-            if item.product:
-                # الربح = (سعر البيع - سعر الجملة) × الكمية
-                profit += (item.unit_price - item.product.wholesale_price) * item.quantity
-        return profit
+        """إجمالي ربح البيع (بسعر الجملة المسجل وقت البيع)"""
+        return sum(item.profit for item in self.sale_items)
     
     @property
     def cost_amount(self):
-        """إجمالي تكلفة البيع (بسعر الجملة)"""
-        cost = 0
-        for item in self.sale_items:
-            if item.product:
-                cost += item.product.wholesale_price * item.quantity
-        return cost
+        """إجمالي تكلفة البيع (بسعر الجملة المسجل وقت البيع)"""
+        return sum(item.cost_total for item in self.sale_items)
     
     @property
     def discount_type_ar(self):
@@ -305,7 +316,7 @@ class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    payment_date = db.Column(db.DateTime, default=datetime.utcnow)
+    payment_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     payment_method = db.Column(db.String(50), nullable=False, default='نقدي')  # نقدي، تحويل، إلخ
     notes = db.Column(db.Text)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # من سجل الدفعة
@@ -320,11 +331,30 @@ class SaleItem(db.Model):
     quantity = db.Column(db.Float, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
+    unit_cost = db.Column(db.Float, nullable=False, default=0, server_default='0', comment='سعر الجملة للوحدة وقت البيع')
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if self.quantity and self.unit_price:
             self.total_price = self.quantity * self.unit_price
+    
+    @hybrid_property
+    def cost_total(self):
+        """تكلفة الصنف بسعر الجملة وقت البيع"""
+        return (self.unit_cost or 0) * self.quantity
+    
+    @cost_total.expression
+    def cost_total(cls):
+        return cls.unit_cost * cls.quantity
+    
+    @hybrid_property
+    def profit(self):
+        """ربح الصنف = (سعر البيع - سعر الجملة) × الكمية"""
+        return (self.unit_price - (self.unit_cost or 0)) * self.quantity
+    
+    @profit.expression
+    def profit(cls):
+        return (cls.unit_price - cls.unit_cost) * cls.quantity
 
 # نموذج جديد للمصاريف
 class Expense(db.Model):
@@ -332,7 +362,7 @@ class Expense(db.Model):
     description = db.Column(db.String(200), nullable=False, comment='وصف المصروف')
     amount = db.Column(db.Float, nullable=False, comment='المبلغ')
     expense_type = db.Column(db.String(50), nullable=False, comment='نوع المصروف')  # 'salary', 'rent', 'utilities', 'other'
-    expense_date = db.Column(db.DateTime, default=datetime.utcnow, comment='تاريخ المصروف')
+    expense_date = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='تاريخ المصروف')
     category = db.Column(db.String(100), comment='فئة المصروف')
     notes = db.Column(db.Text, comment='ملاحظات')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, comment='المستخدم الذي سجل المصروف')
@@ -412,7 +442,7 @@ class Return(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
     total_amount = db.Column(db.Float, nullable=False, comment='إجمالي قيمة المرتجع')
     refund_amount = db.Column(db.Float, nullable=False, default=0, comment='قيمة المرتجعات المخصومة من مبيعات اليوم')
-    return_date = db.Column(db.DateTime, default=datetime.utcnow, comment='تاريخ الإرجاع')
+    return_date = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='تاريخ الإرجاع')
     reason = db.Column(db.String(200), nullable=False, comment='سبب الإرجاع')
     status = db.Column(db.String(20), nullable=False, default='pending', comment='حالة المرتجع')  # 'pending', 'approved', 'rejected'
     refund_method = db.Column(db.String(50), nullable=False, default='نقدي', comment='طريقة الاسترداد')  # 'نقدي', 'رصيد', 'تبديل'
@@ -477,6 +507,99 @@ class ReturnItem(db.Model):
         }
         return conditions.get(self.condition, self.condition)
 
+# إصدار كتالوج المنتجات
+class CatalogVersion(db.Model):
+    """عداد يزيد مع أي تعديل على المنتجات أو الأقسام أو المخزون (صف واحد)"""
+    __tablename__ = 'catalog_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# سجل المنتجات المحذوفة (للمزامنة التدريجية للكتالوج)
+class ProductTombstone(db.Model):
+    __tablename__ = 'product_tombstone'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, comment='رقم المنتج المحذوف')
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True, comment='تاريخ الحذف')
+
+# ملخص المبيعات اليومي
+class DailySalesSummary(db.Model):
+    """مجاميع يومية لكل بائع حسب اليوم المحلي (بتوقيت مصر) - تُحدث مع كل بيع ودفعة ومرتجع"""
+    __tablename__ = 'daily_sales_summary'
+    __table_args__ = (
+        db.UniqueConstraint('summary_date', 'user_id', name='uq_daily_sales_summary_date_user'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    summary_date = db.Column(db.Date, nullable=False, comment='اليوم بتوقيت مصر')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, comment='البائع')
+    sales_count = db.Column(db.Integer, nullable=False, default=0, comment='عدد المبيعات')
+    revenue = db.Column(db.Float, nullable=False, default=0, comment='إجمالي المبيعات')
+    discounts = db.Column(db.Float, nullable=False, default=0, comment='إجمالي الخصومات')
+    refunds = db.Column(db.Float, nullable=False, default=0, comment='المرتجعات المقبولة أو قيد المراجعة')
+    cost = db.Column(db.Float, nullable=False, default=0, comment='التكلفة بسعر الجملة وقت البيع')
+    profit = db.Column(db.Float, nullable=False, default=0, comment='الربح')
+    credit_count = db.Column(db.Integer, nullable=False, default=0, comment='عدد المبيعات الآجلة')
+    credit_revenue = db.Column(db.Float, nullable=False, default=0, comment='إجمالي المبيعات الآجلة')
+    payments = db.Column(db.Float, nullable=False, default=0, comment='الدفعات المحصلة على مبيعات البائع')
+
+# سجل حركات المخزون (إضافة فقط)
+class StockMovement(db.Model):
+    """كل تغيير في مخزون منتج: الكمية موجبة للإضافة وسالبة للخصم"""
+    __tablename__ = 'stock_movement'
+    __table_args__ = (
+        db.Index('ix_stock_movement_product_created', 'product_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, comment='رقم المنتج')
+    quantity = db.Column(db.Float, nullable=False, comment='التغير في الكمية')
+    kind = db.Column(db.String(20), nullable=False, comment='sale, return, restock, import, initial, adjustment, correction')
+    sale_id = db.Column(db.Integer, comment='البيع المرتبط')
+    return_id = db.Column(db.Integer, comment='المرتجع المرتبط')
+    user_id = db.Column(db.Integer, comment='المستخدم')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# لقطات دورية لأرصدة المخزون (نقاط بداية لحساب المخزون في تاريخ معين)
+class StockSnapshot(db.Model):
+    __tablename__ = 'stock_snapshot'
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_product_taken', 'product_id', 'taken_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, comment='رقم المنتج')
+    quantity = db.Column(db.Float, nullable=False, comment='الرصيد وقت اللقطة')
+    taken_at = db.Column(db.DateTime, nullable=False, index=True, comment='وقت اللقطة')
+
+# مهام الخلفية (الاستيراد والتصدير الطويل) في قاعدة SQLite مستقلة مشتركة بين العمليات
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_job'
+    __bind_key__ = 'jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, comment='نوع المهمة')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    progress = db.Column(db.Float, nullable=False, default=0, comment='نسبة الإنجاز من 0 إلى 1')
+    message = db.Column(db.String(200), comment='آخر رسالة تقدم')
+    params = db.Column(db.Text, comment='مدخلات المهمة (JSON)')
+    result = db.Column(db.Text, comment='نتيجة المهمة (JSON)')
+    result_path = db.Column(db.String(500), comment='ملف النتيجة للتحميل')
+    result_name = db.Column(db.String(200), comment='اسم ملف النتيجة عند التحميل')
+    result_mimetype = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    user_id = db.Column(db.Integer, comment='صاحب المهمة')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime, comment='آخر إشارة حياة من الخيط المنفذ')
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
 def create_static_user():
     """إنشاء المستخدم الثابت للنظام"""
     static_username = "araby"
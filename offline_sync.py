@@ -0,0 +1,292 @@
+"""
+استقبال المبيعات المحفوظة أثناء عدم الاتصال دفعة واحدة
+تُحمّل المنتجات المطلوبة في استعلام واحد، ثم يُحجز مخزون كل مجموعة مبيعات بجملة
+UPDATE شرطية واحدة (stock_reservation) وتُدرج المبيعات وأصنافها إدراجاً جماعياً داخل
+نقطة حفظ (savepoint) واحدة، مع معاملة واحدة في النهاية. إذا فشلت المجموعة يُعاد
+حجز وإدراج كل بيع وحده لتحديد البيع الذي نقص مخزونه أو فشل إدراجه.
+المعرف المحلي local_id يمنع تكرار البيع عند إعادة الرفع، حتى لو رُفعت نفس المبيعات
+من طلبين في نفس اللحظة.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+from models import db, Sale, SaleItem, Product
+from stock_reservation import requested_quantities, reserve_stock
+from debt_ledger import apply_ledger_delta
+from sales_rollup import apply_rollup_delta
+from stock_movements import movement_rows, insert_movements
+
+# عدد المبيعات في كل إدراج جماعي (نقطة حفظ واحدة لكل مجموعة)
+CHUNK_SIZE = 100
+
+# أقصى عدد قيم في استعلام IN واحد
+IN_BATCH_SIZE = 500
+
+
+class _PreparedSale:
+    """بيع تم التحقق منه وتجهيز صفوفه للإدراج"""
+
+    def __init__(self, data, local_id, sale_row, item_rows, quantities):
+        self.data = data
+        self.local_id = local_id
+        self.sale_row = sale_row
+        self.item_rows = item_rows
+        self.quantities = quantities
+        self.sale_id = None
+        self.existing_date = None  # تاريخ البيع إذا اتضح أنه رُفع سابقاً من طلب آخر
+
+
+def _local_key(sale_data):
+    local_id = sale_data.get('local_id')
+    return str(local_id) if local_id not in (None, '') else None
+
+
+def _batches(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _existing_local_ids(user_id, local_ids):
+    """المبيعات التي رُفعت سابقاً: {local_id: (رقم البيع، تاريخه)}"""
+    existing = {}
+    for batch in _batches(local_ids, IN_BATCH_SIZE):
+        rows = db.session.query(Sale.local_id, Sale.id, Sale.sale_date).filter(
+            Sale.user_id == user_id,
+            Sale.local_id.in_(batch)
+        )
+        existing.update({local_id: (sale_id, sale_date) for local_id, sale_id, sale_date in rows})
+    return existing
+
+
+def _product_id(value):
+    """رقم المنتج كعدد صحيح (التطبيق قد يرسله كنص) - None إذا لم يكن رقماً"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _prefetch_products(sales_data):
+    product_ids = {
+        _product_id(item.get('product_id')) for sale_data in sales_data for item in (sale_data.get('items') or [])
+    }
+    product_ids.discard(None)
+
+    products = {}
+    for batch in _batches(product_ids, IN_BATCH_SIZE):
+        products.update({p.id: p for p in Product.query.filter(Product.id.in_(batch))})
+    return products
+
+
+def _prepare_sale(sale_data, local_id, products, user_id, now):
+    """التحقق من البيع وتجهيز صفوفه - يرفع ValueError عند الخطأ (المخزون يُحجز عند الإدراج)"""
+    if not sale_data.get('items'):
+        raise ValueError('لا توجد عناصر في البيع')
+
+    item_rows = []
+    for item_data in sale_data['items']:
+        product_id = _product_id(item_data.get('product_id'))
+        if product_id is None:
+            raise ValueError(f"رقم المنتج غير صحيح: {item_data.get('product_id')}")
+        product = products.get(product_id)
+        if not product:
+            raise ValueError(f"المنتج رقم {item_data.get('product_id')} غير موجود")
+
+        item_rows.append({
+            'product_id': product.id,
+            'quantity': item_data['quantity'],
+            'unit_price': item_data['unit_price'],
+            'total_price': item_data['total_price'],
+            'unit_cost': product.wholesale_price
+        })
+
+    quantities = requested_quantities(sale_data['items'])
+
+    sale_row = {
+        'subtotal': sale_data.get('subtotal', 0),
+        'total_amount': sale_data.get('total_amount', 0),
+        'discount_type': sale_data.get('discount_type', 'none'),
+        'discount_value': sale_data.get('discount_value', 0),
+        'discount_amount': sale_data.get('discount_amount', 0),
+        'user_id': user_id,
+        'customer_id': sale_data.get('customer_id'),
+        'payment_status': sale_data.get('payment_status', 'paid'),
+        'payment_type': sale_data.get('payment_type', 'cash'),
+        'notes': sale_data.get('notes', ''),
+        'sale_date': now,
+        'local_id': local_id
+    }
+    return _PreparedSale(sale_data, local_id, sale_row, item_rows, quantities)
+
+
+def _insert_sales(prepared):
+    """إدراج جماعي للمبيعات ثم لأصنافها"""
+    sale_ids = db.session.scalars(
+        insert(Sale).returning(Sale.id, sort_by_parameter_order=True),
+        [entry.sale_row for entry in prepared]
+    ).all()
+
+    item_rows = []
+    for entry, sale_id in zip(prepared, sale_ids):
+        entry.sale_id = sale_id
+        item_rows.extend(dict(row, sale_id=sale_id) for row in entry.item_rows)
+    db.session.execute(insert(SaleItem), item_rows)
+
+
+def _reserve_and_insert(prepared):
+    """حجز مخزون المبيعات وإدراجها في نقطة حفظ واحدة - يرفع ValueError عند نقص المخزون"""
+    quantities = defaultdict(float)
+    for entry in prepared:
+        for product_id, quantity in entry.quantities.items():
+            quantities[product_id] += quantity
+
+    with db.session.begin_nested():
+        reserve_stock(quantities)
+        _insert_sales(prepared)
+
+
+def _apply_side_effects(inserted):
+    """تسجيل حركات المخزون (المحجوز مسبقاً) وتحديث دفتر الديون والملخص اليومي بمجاميع الدفعة"""
+    ledger = defaultdict(lambda: [0.0, 0.0])
+    rollup = defaultdict(lambda: defaultdict(float))
+
+    movements = []
+
+    for entry in inserted:
+        row = entry.sale_row
+        is_credit = row['payment_type'] == 'credit'
+        cost = sum(item['unit_cost'] * item['quantity'] for item in entry.item_rows)
+        profit = sum((item['unit_price'] - item['unit_cost']) * item['quantity'] for item in entry.item_rows)
+
+        sale_quantities = defaultdict(float)
+        for item in entry.item_rows:
+            sale_quantities[item['product_id']] -= item['quantity']
+        movements.extend(movement_rows(sale_quantities, 'sale', sale_id=entry.sale_id, user_id=row['user_id']))
+
+        if row['customer_id']:
+            ledger[row['customer_id']][0] += row['total_amount']
+            ledger[row['customer_id']][1] += 0 if is_credit else row['total_amount']
+
+        day = rollup[row['sale_date']]
+        day['sales_count'] += 1
+        day['revenue'] += row['total_amount']
+        day['discounts'] += row['discount_amount'] or 0
+        day['cost'] += cost
+        day['profit'] += profit
+        if is_credit:
+            day['credit_count'] += 1
+            day['credit_revenue'] += row['total_amount']
+
+    insert_movements(movements)
+
+    for customer_id, (sales_total, paid_total) in ledger.items():
+        apply_ledger_delta(customer_id, sales=sales_total, paid=paid_total)
+
+    user_id = inserted[0].sale_row['user_id'] if inserted else None
+    for sale_date, deltas in rollup.items():
+        apply_rollup_delta(sale_date, user_id, **deltas)
+
+
+def ingest_offline_sales(sales_data, user_id):
+    """مزامنة قائمة مبيعات محلية - يعيد نتيجة لكل بيع (نجاح أو خطأ)"""
+    results = {'success': [], 'errors': [], 'total': len(sales_data)}
+    now = datetime.utcnow()
+
+    local_ids = {_local_key(sale_data) for sale_data in sales_data} - {None}
+    existing = _existing_local_ids(user_id, local_ids)
+    products = _prefetch_products(sales_data)
+
+    prepared = []
+    in_batch = {}
+    duplicates = []  # (local_id, sale_data) مكرر داخل نفس الدفعة
+
+    for sale_data in sales_data:
+        local_id = _local_key(sale_data)
+
+        if local_id in existing:
+            sale_id, sale_date = existing[local_id]
+            results['success'].append({
+                'local_id': sale_data.get('local_id'),
+                'server_id': sale_id,
+                'sale_date': sale_date.isoformat(),
+                'duplicate': True
+            })
+            continue
+
+        if local_id and local_id in in_batch:
+            duplicates.append((local_id, sale_data))
+            continue
+
+        try:
+            entry = _prepare_sale(sale_data, local_id, products, user_id, now)
+        except (ValueError, KeyError, TypeError) as e:
+            results['errors'].append({'data': sale_data, 'error': str(e)})
+            continue
+
+        prepared.append(entry)
+        if local_id:
+            in_batch[local_id] = entry
+
+    inserted = []
+    for chunk in _batches(prepared, CHUNK_SIZE):
+        try:
+            _reserve_and_insert(chunk)
+            inserted.extend(chunk)
+            continue
+        except (ValueError, SQLAlchemyError):
+            pass
+
+        # فشل الحجز أو الإدراج الجماعي: إعادة المحاولة بيعاً بيعاً لتحديد البيع المسبب للخطأ
+        for entry in chunk:
+            try:
+                _reserve_and_insert([entry])
+                inserted.append(entry)
+            except ValueError as e:
+                entry.sale_id = None
+                results['errors'].append({'data': entry.data, 'error': str(e)})
+            except SQLAlchemyError as e:
+                entry.sale_id = None
+                # طلب آخر رفع نفس البيع في نفس اللحظة وسبقنا إلى الحفظ
+                existing_sale = None
+                if isinstance(e, IntegrityError) and entry.local_id:
+                    existing_sale = _existing_local_ids(user_id, [entry.local_id]).get(entry.local_id)
+
+                if existing_sale:
+                    entry.sale_id, entry.existing_date = existing_sale
+                    results['success'].append({
+                        'local_id': entry.data.get('local_id'),
+                        'server_id': entry.sale_id,
+                        'sale_date': entry.existing_date.isoformat(),
+                        'duplicate': True
+                    })
+                else:
+                    results['errors'].append({'data': entry.data, 'error': str(e.orig if hasattr(e, 'orig') else e)})
+
+    _apply_side_effects(inserted)
+    db.session.commit()
+
+    for entry in inserted:
+        results['success'].append({
+            'local_id': entry.data.get('local_id'),
+            'server_id': entry.sale_id,
+            'sale_date': now.isoformat()
+        })
+
+    for local_id, sale_data in duplicates:
+        entry = in_batch[local_id]
+        if entry.sale_id:
+            results['success'].append({
+                'local_id': sale_data.get('local_id'),
+                'server_id': entry.sale_id,
+                'sale_date': (entry.existing_date or now).isoformat(),
+                'duplicate': True
+            })
+        else:
+            results['errors'].append({'data': sale_data, 'error': 'تعذر حفظ البيع المكرر'})
+
+    return results
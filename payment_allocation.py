@@ -0,0 +1,92 @@
+"""
+توزيع دفعات العملاء على المبيعات الآجلة
+المبيعات المفتوحة للعميل تُقرأ مع مجموع المدفوع لكل بيع في استعلام مجمّع واحد،
+ويُوزع المبلغ عليها في الذاكرة بالأقدم أولاً (FIFO). التنفيذ يضيف الدفعات بجملة
+insert واحدة ويحدّث حالة الدفع بجملتي update، ثم دفتر العميل والملخص اليومي
+بمجموع الدفعة بدلاً من تعديل لكل بيع.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, case, insert, update
+
+from models import db, Sale, Payment, DEBT_EPSILON
+from debt_ledger import apply_ledger_delta
+from sales_rollup import apply_rollup_delta
+
+
+def open_sales(customer_id):
+    """المبيعات غير المسددة للعميل بالأقدم أولاً: (رقم البيع، البائع، الإجمالي، المدفوع)"""
+    paid = db.session.query(
+        Payment.sale_id.label('sale_id'),
+        func.sum(Payment.amount).label('paid')
+    ).join(Sale, Payment.sale_id == Sale.id).filter(
+        Sale.customer_id == customer_id
+    ).group_by(Payment.sale_id).subquery()
+
+    return db.session.query(
+        Sale.id, Sale.user_id, Sale.total_amount,
+        case((Sale.payment_type == 'cash', Sale.total_amount), else_=func.coalesce(paid.c.paid, 0)).label('paid')
+    ).outerjoin(paid, paid.c.sale_id == Sale.id).filter(
+        Sale.customer_id == customer_id,
+        Sale.payment_status.in_(['unpaid', 'partial'])
+    ).order_by(Sale.sale_date.asc(), Sale.id.asc()).all()
+
+
+def allocate_payment(customer_id, amount):
+    """توزيع المبلغ على المبيعات المفتوحة - يعيد (قائمة التوزيع، المبلغ الزائد)"""
+    allocations = []
+    remaining = amount
+
+    for sale_id, seller_id, total, paid in open_sales(customer_id):
+        if remaining <= 0:
+            break
+
+        sale_remaining = max(0, total - paid)
+        if sale_remaining <= 0:
+            continue
+
+        payment_amount = min(remaining, sale_remaining)
+        allocations.append({
+            'sale_id': sale_id,
+            'seller_id': seller_id,
+            'amount': payment_amount,
+            'remaining_before': sale_remaining,
+            'status': 'paid' if sale_remaining - payment_amount < DEBT_EPSILON else 'partial'
+        })
+        remaining -= payment_amount
+
+    return allocations, remaining
+
+
+def apply_allocation(customer_id, allocations, payment_method, notes, user_id):
+    """تسجيل دفعات التوزيع وتحديث حالة المبيعات والدفتر والملخص اليومي (بدون commit)"""
+    if not allocations:
+        return
+
+    now = datetime.utcnow()
+    db.session.execute(insert(Payment), [{
+        'sale_id': allocation['sale_id'],
+        'amount': allocation['amount'],
+        'payment_date': now,
+        'payment_method': payment_method,
+        'notes': notes,
+        'user_id': user_id
+    } for allocation in allocations])
+
+    for status in ('paid', 'partial'):
+        sale_ids = [allocation['sale_id'] for allocation in allocations if allocation['status'] == status]
+        if sale_ids:
+            db.session.execute(
+                update(Sale).where(Sale.id.in_(sale_ids)).values(payment_status=status)
+                .execution_options(synchronize_session='fetch')
+            )
+
+    apply_ledger_delta(customer_id, paid=sum(allocation['amount'] for allocation in allocations))
+
+    by_seller = defaultdict(float)
+    for allocation in allocations:
+        by_seller[allocation['seller_id']] += allocation['amount']
+    for seller_id, amount in by_seller.items():
+        apply_rollup_delta(now, seller_id, payments=amount)
@@ -0,0 +1,220 @@
+"""
+استيراد المنتجات من Excel
+يُقرأ الملف بوضع read_only صفاً صفاً، وتُحمّل الأقسام والمنتجات الموجودة مرة واحدة
+في قواميس بالاسم، ثم تُكتب الإضافات والتعديلات على دفعات بجمل insert/update
+جماعية بدلاً من استعلام وكائن لكل صف. مع dry_run يُتحقق من الملف ويُعاد تقرير
+لكل صف دون كتابة شيء.
+
+الكتابة الجماعية لا تمر بالـ flush، لذلك تُسجل حركات المخزون وفهرس البحث هنا
+صراحة (إصدار الكتالوج يزيد من do_orm_execute في catalog_cache).
+"""
+
+from datetime import datetime
+
+from openpyxl import load_workbook
+from sqlalchemy import insert, select, update
+
+from models import db, Category, Product
+from product_search import index_products
+from stock_movements import movement_rows, insert_movements
+
+REQUIRED_COLUMNS = ['اسم المنتج', 'الفئة', 'سعر الجملة', 'سعر البيع', 'الكمية']
+
+# عدد الصفوف في كل جملة insert/update
+BATCH_SIZE = 1000
+
+# عدد الأخطاء المعادة في نتيجة الاستيراد الفعلي
+MAX_REPORTED_ERRORS = 10
+
+_EMPTY_VALUES = ('none', 'nan', '')
+
+
+def _cell_text(value, default=''):
+    if value is None:
+        return default
+    text = str(value).strip()
+    return text if text.lower() not in _EMPTY_VALUES else default
+
+
+def read_import_rows(sheet):
+    """صفوف الورقة كـ (رقم الصف، قاموس عمود -> نص) - يرفع ValueError عند نقص أعمدة"""
+    rows = sheet.iter_rows(values_only=True)
+    headers = [_cell_text(value) for value in next(rows, ())]
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers]
+    if missing:
+        raise ValueError(f'أعمدة مفقودة: {", ".join(missing)}')
+
+    columns = [(index, header) for index, header in enumerate(headers) if header]
+    for row_num, row in enumerate(rows, 2):
+        if not row:
+            continue
+        values = {header: _cell_text(row[index]) for index, header in columns if index < len(row)}
+        # تجاهل الصفوف الفارغة
+        if any(values.values()):
+            yield row_num, values
+
+
+def _parse_row(values, categories):
+    """قيم المنتج من صف الملف - يرفع ValueError برسالة الخطأ"""
+    name = values.get('اسم المنتج', '')
+    if not name:
+        raise ValueError('اسم المنتج فارغ أو غير صحيح')
+
+    try:
+        wholesale_price = float(values.get('سعر الجملة') or '0')
+        retail_price = float(values.get('سعر البيع') or '0')
+        stock_quantity = float(values.get('الكمية') or '0')
+    except ValueError as e:
+        raise ValueError(f'خطأ في تحويل الأرقام - {e}')
+
+    if wholesale_price <= 0 or retail_price <= 0:
+        raise ValueError('أسعار غير صحيحة')
+    if retail_price <= wholesale_price:
+        raise ValueError('سعر البيع يجب أن يكون أكبر من سعر الجملة')
+
+    category_name = values.get('الفئة', '')
+    if category_name not in categories:
+        raise ValueError(f'الفئة "{category_name}" غير موجودة')
+
+    try:
+        min_stock = float(values.get('الحد الأدنى للمخزون') or '10')
+    except ValueError:
+        min_stock = 10
+
+    unit_type = values.get('نوع الوحدة') or 'كامل'
+    if unit_type not in ['كامل', 'جزئي']:
+        unit_type = 'كامل'
+
+    return {
+        'name_ar': name,
+        'description_ar': values.get('وصف المنتج', ''),
+        'category_id': categories[category_name],
+        'wholesale_price': wholesale_price,
+        'retail_price': retail_price,
+        'price': retail_price,
+        'stock_quantity': stock_quantity,
+        'min_stock_threshold': min_stock,
+        'unit_type': unit_type,
+        'unit_description': values.get('وصف الوحدة', '')
+    }
+
+
+class _ImportBatch:
+    """الإضافات والتعديلات المعلقة حتى تمتلئ الدفعة"""
+
+    def __init__(self, products, user_id):
+        self.products = products  # الاسم -> [رقم المنتج، المخزون المحفوظ]
+        self.user_id = user_id
+        self.new = {}  # الاسم -> قيم منتج جديد
+        self.updates = {}  # رقم المنتج -> قيم التعديل
+
+    def __len__(self):
+        return len(self.new) + len(self.updates)
+
+    def add(self, product):
+        self.new[product['name_ar']] = product
+
+    def update(self, product_id, product):
+        self.updates.setdefault(product_id, {'id': product_id}).update(product)
+
+    def flush(self):
+        movements = []
+        indexed = []
+
+        if self.new:
+            statement = insert(Product).returning(Product.id, Product.name_ar, Product.description_ar)
+            for row in db.session.execute(statement, list(self.new.values())):
+                stock = self.new[row.name_ar]['stock_quantity']
+                self.products[row.name_ar] = [row.id, stock]
+                movements.append((row.id, stock))
+                indexed.append(row)
+            self.new = {}
+
+        if self.updates:
+            now = datetime.utcnow()
+            for values in self.updates.values():
+                values['updated_at'] = now
+                current = self.products[values['name_ar']]
+                movements.append((values['id'], values['stock_quantity'] - current[1]))
+                current[1] = values['stock_quantity']
+            db.session.execute(update(Product), list(self.updates.values()))
+            indexed.extend(db.session.execute(
+                select(Product.id, Product.name_ar, Product.description_ar).where(Product.id.in_(self.updates))
+            ))
+            self.updates = {}
+
+        insert_movements(movement_rows(dict(movements), 'import', user_id=self.user_id))
+        index_products(indexed)
+
+
+def import_products(file, update_existing=False, dry_run=False, user_id=None, progress=None, commit_batches=False):
+    """استيراد ملف المنتجات - يعيد ملخص الاستيراد (ومع dry_run تقريراً لكل صف دون حفظ)
+    progress(نسبة) تُستدعى بعد كل دفعة لمهام الخلفية. مع commit_batches تُحفظ كل دفعة
+    في معاملتها حتى لا يبقى قفل الكتابة (SQLite) طوال الاستيراد، فلا يكون الاستيراد ذرياً"""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        return _import_sheet(workbook.active, update_existing, dry_run, user_id, progress, commit_batches)
+    finally:
+        workbook.close()
+
+
+def _import_sheet(sheet, update_existing, dry_run, user_id, progress, commit_batches):
+    total_rows = sheet.max_row or 0
+    categories = dict(db.session.execute(select(Category.name_ar, Category.id)).all())
+    products = {
+        name: [product_id, stock]
+        for product_id, name, stock in db.session.execute(select(Product.id, Product.name_ar, Product.stock_quantity))
+    }
+
+    result = {'added_count': 0, 'updated_count': 0, 'skipped_count': 0, 'errors': []}
+    report = []
+    batch = _ImportBatch(products, user_id)
+
+    for row_num, values in read_import_rows(sheet):
+        if progress and row_num % BATCH_SIZE == 0 and total_rows:
+            progress(row_num / total_rows)
+
+        try:
+            product = _parse_row(values, categories)
+        except ValueError as e:
+            result['errors'].append(f'الصف {row_num}: {e}')
+            result['skipped_count'] += 1
+            if dry_run:
+                report.append({'row': row_num, 'name': values.get('اسم المنتج', ''), 'action': 'error', 'message': str(e)})
+            continue
+
+        name = product['name_ar']
+        exists = name in products or name in batch.new
+        if exists and not update_existing:
+            action = 'skip'
+            result['skipped_count'] += 1
+        elif exists:
+            action = 'update'
+            result['updated_count'] += 1
+            if name in batch.new:
+                batch.new[name].update(product)
+            elif not dry_run:
+                batch.update(products[name][0], product)
+        else:
+            action = 'add'
+            result['added_count'] += 1
+            batch.add(product)
+
+        if dry_run:
+            report.append({'row': row_num, 'name': name, 'action': action})
+        elif len(batch) >= BATCH_SIZE:
+            batch.flush()
+            if commit_batches:
+                db.session.commit()
+
+    if dry_run:
+        result['rows'] = report
+    else:
+        batch.flush()
+        if commit_batches:
+            db.session.commit()
+        result['errors'] = result['errors'][:MAX_REPORTED_ERRORS]
+
+    result['total_rows_processed'] = result['added_count'] + result['updated_count'] + result['skipped_count']
+    return result
@@ -0,0 +1,255 @@
+"""
+البحث في المنتجات
+جدول فهرس منفصل product_search يحتوي اسم المنتج ووصفه بعد توحيد الكتابة
+العربية (الهمزات والتاء المربوطة والألف المقصورة والتشكيل والأرقام الهندية).
+على SQLite هو جدول FTS5 (رقم الصف = رقم المنتج) مرتب بـ bm25، وعلى PostgreSQL
+جدول عادي بفهرس pg_trgm مرتب بالتشابه. يُحدث الفهرس داخل نفس معاملة حفظ
+المنتج، ويمكن إعادة بنائه عبر: python manage.py rebuild-search-index
+"""
+
+import re
+from itertools import chain
+
+from sqlalchemy import DDL, event, inspect, select, and_, or_, func, column, table, text, Integer, String
+from sqlalchemy.orm import Session
+
+from models import db, Product
+
+SEARCH_TABLE = 'product_search'
+
+# وزن الاسم مقابل الوصف في ترتيب النتائج
+NAME_WEIGHT = 10.0
+
+# أقصى عدد تطابقات يُحسب ترتيبها في كل بحث
+RANK_CANDIDATES = 500
+
+_TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_NON_WORD = re.compile(r'[^\w]+')
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+
+_fts_table = table(SEARCH_TABLE, column('rowid', Integer), column('name', String), column('description', String))
+_trgm_table = table(SEARCH_TABLE, column('product_id', Integer), column('name', String), column('description', String))
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, description, tokenize='unicode61', prefix='2 3')"
+)
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+    "product_id INTEGER PRIMARY KEY, name TEXT NOT NULL DEFAULT '', description TEXT NOT NULL DEFAULT '')",
+    f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_trgm ON {SEARCH_TABLE} "
+    "USING gin (name gin_trgm_ops, description gin_trgm_ops)",
+)
+
+_available = False
+
+
+def normalize_arabic(value):
+    """توحيد النص العربي للفهرسة والبحث"""
+    if not value:
+        return ''
+    value = _TASHKEEL.sub('', str(value)).translate(_LETTERS).lower()
+    return ' '.join(_NON_WORD.sub(' ', value).split())
+
+
+def _strip_article(token):
+    return token[2:] if token.startswith('ال') and len(token) > 3 else token
+
+
+def _index_text(value):
+    """النص المفهرس: الكلمات كما هي مع نسخة بدون "ال" التعريف"""
+    tokens = normalize_arabic(value).split()
+    return ' '.join(tokens + [_strip_article(token) for token in tokens if _strip_article(token) != token])
+
+
+def _tokens(query):
+    # البحث بالكلمة بدون "ال" يطابق الشكلين المفهرسين
+    return [_strip_article(token) for token in normalize_arabic(query).split()]
+
+
+# ينشئ create_all جدول الفهرس مع جدول المنتجات ويحذفه drop_all معه
+event.listen(Product.__table__, 'after_create', DDL(_SQLITE_DDL).execute_if(dialect='sqlite'))
+for _statement in _POSTGRES_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+event.listen(Product.__table__, 'before_drop', DDL(f'DROP TABLE IF EXISTS {SEARCH_TABLE}'))
+
+
+def _search_table(dialect_name):
+    return _fts_table if dialect_name == 'sqlite' else _trgm_table
+
+
+def _id_column(search_table):
+    return search_table.c.rowid if search_table is _fts_table else search_table.c.product_id
+
+
+def search_index_available(connection=None):
+    """هل جدول الفهرس موجود (قبل تشغيل upgrade-db على قاعدة قديمة قد لا يكون)"""
+    global _available
+    if not _available:
+        _available = inspect(connection if connection is not None else db.engine).has_table(SEARCH_TABLE)
+    return _available
+
+
+def _index_rows(connection, products):
+    search_table = _search_table(connection.dialect.name)
+    id_column = _id_column(search_table)
+    ids = [p.id for p in products]
+
+    connection.execute(search_table.delete().where(id_column.in_(ids)))
+    connection.execute(search_table.insert(), [{
+        id_column.name: p.id,
+        'name': _index_text(p.name_ar),
+        'description': _index_text(p.description_ar)
+    } for p in products])
+
+
+def _remove_rows(connection, product_ids):
+    search_table = _search_table(connection.dialect.name)
+    connection.execute(search_table.delete().where(_id_column(search_table).in_(product_ids)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_search_index(session, flush_context):
+    new = session.new
+    changed = [
+        obj for obj in chain(new, session.dirty)
+        if isinstance(obj, Product) and obj.id is not None and (
+            obj in new
+            or inspect(obj).attrs.name_ar.history.has_changes()
+            or inspect(obj).attrs.description_ar.history.has_changes()
+        )
+    ]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Product) and obj.id is not None]
+
+    if not (changed or removed):
+        return
+
+    connection = session.connection()
+    if not search_index_available(connection):
+        return
+
+    if changed:
+        _index_rows(connection, changed)
+    if removed:
+        _remove_rows(connection, removed)
+
+
+def index_products(products):
+    """فهرسة منتجات كُتبت بجمل جماعية لا تمر بالـ flush (تكفي كائنات بها id و name_ar و description_ar)"""
+    connection = db.session.connection()
+    if products and search_index_available(connection):
+        _index_rows(connection, products)
+
+
+def ensure_search_index():
+    """إنشاء جدول الفهرس على قاعدة موجودة - يعيد True إذا أُنشئ الآن"""
+    global _available
+    if inspect(db.engine).has_table(SEARCH_TABLE):
+        return False
+
+    statements = (_SQLITE_DDL,) if db.engine.dialect.name == 'sqlite' else _POSTGRES_DDL
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    _available = True
+    return True
+
+
+def rebuild_search_index():
+    """إعادة بناء فهرس البحث لكل المنتجات - يعيد عدد المنتجات"""
+    ensure_search_index()
+    connection = db.session.connection()
+    connection.execute(_search_table(connection.dialect.name).delete())
+
+    count = 0
+    batch = []
+    for product in Product.query.order_by(Product.id).yield_per(1000):
+        batch.append(product)
+        if len(batch) >= 1000:
+            _index_rows(connection, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        _index_rows(connection, batch)
+        count += len(batch)
+
+    db.session.commit()
+    return count
+
+
+def _fts_match(tokens, names_only):
+    # كل كلمة كبادئة: "كلمة"* وكلها مطلوبة
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    return f'name : ({match})' if names_only else match
+
+
+def _trgm_criteria(tokens, names_only):
+    fields = [_trgm_table.c.name] if names_only else [_trgm_table.c.name, _trgm_table.c.description]
+    return and_(*[or_(*[field.contains(token, autoescape=True) for field in fields]) for token in tokens])
+
+
+def _matching_ids(tokens, names_only=False):
+    """استعلام أرقام المنتجات المطابقة"""
+    if db.engine.dialect.name == 'sqlite':
+        return select(_fts_table.c.rowid).where(
+            text(f'{SEARCH_TABLE} MATCH :match').bindparams(match=_fts_match(tokens, names_only))
+        )
+    return select(_trgm_table.c.product_id).where(_trgm_criteria(tokens, names_only))
+
+
+def _ranked_ids(tokens, limit, names_only=False):
+    """أرقام أفضل المنتجات المطابقة - يُرتب أول RANK_CANDIDATES تطابق فقط حتى يبقى البحث
+    سريعاً مع الكلمات الشائعة (كلما زادت الحروف المكتوبة قلّت التطابقات)"""
+    if db.engine.dialect.name == 'sqlite':
+        candidates = select(
+            _fts_table.c.rowid.label('product_id'),
+            text(f'bm25({SEARCH_TABLE}, {NAME_WEIGHT}, 1.0) AS score')
+        ).where(
+            text(f'{SEARCH_TABLE} MATCH :match').bindparams(match=_fts_match(tokens, names_only))
+        ).limit(RANK_CANDIDATES).subquery()
+        query = select(candidates.c.product_id).order_by(text('score'))
+    else:
+        phrase = ' '.join(tokens)
+        query = select(_trgm_table.c.product_id).where(_trgm_criteria(tokens, names_only)).order_by(
+            (func.similarity(_trgm_table.c.name, phrase) * NAME_WEIGHT
+             + func.similarity(_trgm_table.c.description, phrase)).desc()
+        )
+
+    return db.session.execute(query.limit(limit)).scalars().all()
+
+
+def product_search_filter(query, names_only=False):
+    """شرط فلترة المنتجات المطابقة للبحث (None إذا كان البحث فارغاً)"""
+    tokens = _tokens(query)
+    if not tokens:
+        return None
+
+    if not search_index_available():
+        condition = Product.name_ar.contains(query)
+        return condition if names_only else condition | Product.description_ar.contains(query)
+
+    return Product.id.in_(_matching_ids(tokens, names_only))
+
+
+def search_products(query, limit=10, names_only=False):
+    """المنتجات المطابقة للبحث مرتبة حسب الصلة"""
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+
+    if not search_index_available():
+        return Product.query.filter(product_search_filter(query, names_only)).order_by(
+            Product.name_ar
+        ).limit(limit).all()
+
+    ids = _ranked_ids(tokens, limit, names_only)
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+    return [products[product_id] for product_id in ids if product_id in products]
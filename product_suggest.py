@@ -0,0 +1,205 @@
+"""
+اقتراحات المنتجات لشاشة البيع
+فهرس في ذاكرة العملية: مصفوفة مرتبة من (كلمة موحدة، رقم المنتج) يُبحث فيها
+بالبادئة عبر bisect، مع بيانات المنتجات جاهزة للإرجاع. يُحدّث الفهرس تدريجياً
+من catalog_changes() عند تغير إصدار الكتالوج، وتُرتب النتائج بسرعة البيع
+(الكمية المباعة في آخر VELOCITY_DAYS يوماً).
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Sale, SaleItem
+from catalog_cache import current_catalog_version, catalog_changes
+from product_search import normalize_arabic
+
+# فترة حساب سرعة البيع ومدة صلاحيتها بالثواني
+VELOCITY_DAYS = 30
+VELOCITY_TTL = 300
+
+# إذا زاد عدد المنتجات المعدلة عن هذا الحد تُعاد كتابة المصفوفة بدلاً من التعديل عنصراً بعنصر
+MAX_INCREMENTAL_CHANGES = 500
+
+
+def _suggest_keys(product):
+    """كلمات الاسم الموحدة (مع نسخة بدون "ال") ورقم المنتج"""
+    tokens = normalize_arabic(product['name']).split()
+    keys = set(tokens)
+    keys.update(token[2:] for token in tokens if token.startswith('ال') and len(token) > 3)
+    keys.add(str(product['id']))
+    return keys
+
+
+class SuggestIndex:
+    """فهرس بادئات لأسماء المنتجات وأرقامها"""
+
+    def __init__(self):
+        self.version = None
+        self.cursor = None
+        self._words = []  # الكلمات مرتبة
+        self._word_ids = []  # رقم المنتج لكل كلمة في _words
+        self._keys = {}  # رقم المنتج -> كلماته
+        self._products = {}  # رقم المنتج -> بيانات المنتج
+        self._names = {}  # رقم المنتج -> الاسم الموحد
+        self._order = []  # أرقام المنتجات مرتبة حسب سرعة البيع ثم الاسم
+        self._rank = {}  # رقم المنتج -> موقعه في _order
+        self._rank_dirty = True
+        self._velocity = {}
+        self._velocity_expires = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """مزامنة الفهرس مع الكتالوج إذا تغير إصداره"""
+        version = current_catalog_version()
+        if version == self.version:
+            return
+
+        with self._lock:
+            if version == self.version:
+                return
+
+            changes = catalog_changes(self.cursor)
+            changed_ids = set(changes['deleted']) | {product['id'] for product in changes['updated']}
+
+            if changes['full'] or len(changed_ids) > MAX_INCREMENTAL_CHANGES:
+                # إعادة كتابة المصفوفة في مرور واحد ثم ترتيبها
+                if changes['full']:
+                    self._keys, self._products, self._names = {}, {}, {}
+                for product_id in changed_ids:
+                    self._forget(product_id)
+                entries = [
+                    (word, product_id) for product_id, words in self._keys.items() for word in words
+                ]
+                for product in changes['updated']:
+                    entries.extend((word, product['id']) for word in self._index(product))
+                entries.sort()
+                self._words = [word for word, _ in entries]
+                self._word_ids = [product_id for _, product_id in entries]
+            else:
+                for product_id in changes['deleted']:
+                    self._remove(product_id)
+                for product in changes['updated']:
+                    self._remove(product['id'])
+                    for word in self._index(product):
+                        self._insert(word, product['id'])
+
+            self.cursor = datetime.fromisoformat(changes['cursor'])
+            self.version = version
+
+    def _index(self, product):
+        product_id = product['id']
+        name = normalize_arabic(product['name'])
+        if self._names.get(product_id) != name:
+            self._rank_dirty = True
+
+        keys = _suggest_keys(product)
+        self._keys[product_id] = keys
+        self._products[product_id] = product
+        self._names[product_id] = name
+        return keys
+
+    def _forget(self, product_id):
+        if self._products.pop(product_id, None) is not None:
+            self._rank_dirty = True
+        self._keys.pop(product_id, None)
+        self._names.pop(product_id, None)
+
+    def _position(self, word, product_id):
+        start = bisect_left(self._words, word)
+        end = bisect_right(self._words, word, start)
+        return bisect_left(self._word_ids, product_id, start, end)
+
+    def _insert(self, word, product_id):
+        position = self._position(word, product_id)
+        self._words.insert(position, word)
+        self._word_ids.insert(position, product_id)
+
+    def _remove(self, product_id):
+        for word in self._keys.get(product_id, ()):
+            position = self._position(word, product_id)
+            if position < len(self._words) and self._words[position] == word \
+                    and self._word_ids[position] == product_id:
+                del self._words[position]
+                del self._word_ids[position]
+        self._forget(product_id)
+
+    def _prefix_matches(self, prefix):
+        start = bisect_left(self._words, prefix)
+        end = bisect_left(self._words, prefix + '\U0010ffff', start)
+        return set(self._word_ids[start:end])
+
+    def _refresh_velocity(self):
+        if self._velocity_expires > time.monotonic():
+            return
+
+        since = datetime.utcnow() - timedelta(days=VELOCITY_DAYS)
+        rows = db.session.query(SaleItem.product_id, func.sum(SaleItem.quantity)).join(
+            Sale, SaleItem.sale_id == Sale.id
+        ).filter(Sale.sale_date >= since).group_by(SaleItem.product_id)
+
+        velocity = {product_id: float(quantity or 0) for product_id, quantity in rows}
+        with self._lock:
+            self._velocity = velocity
+            self._velocity_expires = time.monotonic() + VELOCITY_TTL
+            self._rank_dirty = True
+
+    def _refresh_rank(self):
+        if not self._rank_dirty:
+            return
+        velocity, names = self._velocity, self._names
+        self._order = sorted(names, key=lambda product_id: (-velocity.get(product_id, 0), names[product_id]))
+        self._rank = {product_id: position for position, product_id in enumerate(self._order)}
+        self._rank_dirty = False
+
+    def suggest(self, query, limit=10, in_stock_only=False):
+        """أفضل المنتجات التي تبدأ كلماتها بكلمات البحث"""
+        if limit <= 0:
+            return []
+        self.refresh()
+        self._refresh_velocity()
+        tokens = normalize_arabic(query).split()
+
+        with self._lock:
+            self._refresh_rank()
+            products = self._products
+
+            def usable(product_id):
+                return not in_stock_only or products[product_id]['stock'] > 0
+
+            if not tokens:
+                best = []
+                for product_id in self._order:
+                    if usable(product_id):
+                        best.append(product_id)
+                        if len(best) == limit:
+                            break
+                return [products[product_id] for product_id in best]
+
+            # الكلمة الأطول أولاً (غالباً الأقل تطابقاً) حتى تبقى المجموعة المتقاطعة صغيرة
+            candidates = None
+            for token in sorted(tokens, key=len, reverse=True):
+                matches = self._prefix_matches(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+
+            ordered = heapq.nsmallest(limit * 3, candidates, key=self._rank.__getitem__)
+            best = [product_id for product_id in ordered if usable(product_id)]
+            if len(best) < limit and len(ordered) < len(candidates):
+                best = [product_id for product_id in sorted(candidates, key=self._rank.__getitem__)
+                        if usable(product_id)]
+
+            # رقم المنتج المطابق تماماً أولاً
+            if tokens[0].isdigit() and int(tokens[0]) in best:
+                best.remove(int(tokens[0]))
+                best.insert(0, int(tokens[0]))
+
+            return [products[product_id] for product_id in best[:limit]]
+
+
+suggest_index = SuggestIndex()
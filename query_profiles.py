@@ -0,0 +1,33 @@
+"""
+حزم خيارات التحميل المسبق للقوالب
+كل حزمة تحمّل مع الاستعلام العلاقات التي يمر عليها القالب (أصناف البيع ومنتجاتها،
+الدفعات ومن سجلها) باستعلام إضافي واحد لكل علاقة بدلاً من استعلام لكل صف،
+فيبقى عدد الاستعلامات ثابتاً مهما زاد عدد الصفوف في الصفحة.
+الحزم دوال لأن علاقات backref (مثل SaleItem.product) لا توجد قبل تهيئة النماذج.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Customer, Sale, SaleItem, Payment
+
+
+def sale_with_lines():
+    """البيع مع أصنافه ومنتجاتها والبائع"""
+    return (
+        selectinload(Sale.sale_items).joinedload(SaleItem.product),
+        joinedload(Sale.user),
+    )
+
+
+def sale_with_payments():
+    """البيع مع دفعاته ومن سجل كل دفعة (paid_amount و remaining_amount بدون استعلامات)"""
+    return (
+        selectinload(Sale.payments).joinedload(Payment.user),
+    )
+
+
+def customer_with_open_sales():
+    """العميل مع مبيعاته ودفعاتها (لحساب المبيعات غير المسددة)"""
+    return (
+        selectinload(Customer.sales).selectinload(Sale.payments),
+    )
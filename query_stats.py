@@ -0,0 +1,200 @@
+"""
+قياس استعلامات SQL لكل طلب
+أحداث المحرك (before/after_cursor_execute) تعدّ استعلامات الطلب الحالي وزمنها وتحتفظ
+بأبطأ الجمل، ثم يضيف after_request الترويسات X-Query-Count و Server-Timing، ويسجل
+في السجل الطلبات التي تتجاوز SLOW_REQUEST_MS أو SLOW_REQUEST_QUERIES.
+لكل مسار نافذة متحركة بآخر QUERY_STATS_WINDOW طلب تُحسب منها النسب المئوية في
+/admin/perf. الإحصائيات داخل العملية (لكل عامل gunicorn على حدة).
+الاستجابات المتدفقة (stream_with_context) تُسجل عند إغلاقها لتشمل استعلامات توليد
+المحتوى، أما الترويسات فتُرسل قبل المحتوى فتحمل استعلامات ما قبل التدفق فقط.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# عدد أبطأ الجمل المحفوظة لكل طلب وأقصى طول للجملة في السجل
+SLOWEST_STATEMENTS = 5
+STATEMENT_PREVIEW = 300
+
+
+class RequestQueries:
+    """استعلامات الطلب الحالي"""
+    __slots__ = ('started', 'count', 'duration', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []  # heap من (الزمن، الجملة)
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        item = (duration, statement[:STATEMENT_PREVIEW])
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, item)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def slowest_statements(self):
+        return [(round(duration * 1000, 2), statement) for duration, statement in sorted(self.slowest, reverse=True)]
+
+
+def current_queries():
+    """سجل استعلامات الطلب الحالي - None خارج الطلبات (مثل مهام الخلفية)"""
+    if not has_request_context():
+        return None
+    return g.get('_request_queries')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    queries = current_queries()
+    if queries is not None:
+        queries.add(statement, time.perf_counter() - started)
+
+
+def _percentile(values, fraction):
+    """النسبة المئوية من قائمة مرتبة (أقرب رتبة)"""
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class QueryStats:
+    """عدادات الاستعلامات لكل طلب ونوافذ متحركة لكل مسار"""
+
+    def __init__(self, window=500, slow_ms=500, slow_queries=50):
+        self.window = window
+        self.slow_ms = slow_ms
+        self.slow_queries = slow_queries
+        self._endpoints = {}
+        self._totals = {}
+        self._slow_requests = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """قراءة الإعدادات وتسجيل أحداث المحرك ودوال الطلب"""
+        app.extensions['query_stats'] = self
+        if not app.config.get('QUERY_STATS_ENABLED', True):
+            return
+
+        self.window = app.config.get('QUERY_STATS_WINDOW', self.window)
+        self.slow_ms = app.config.get('SLOW_REQUEST_MS', self.slow_ms)
+        self.slow_queries = app.config.get('SLOW_REQUEST_QUERIES', self.slow_queries)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self):
+        g._request_queries = RequestQueries()
+
+    def _finish_request(self, response):
+        queries = g.get('_request_queries') if response.is_streamed else g.pop('_request_queries', None)
+        if queries is None:
+            return response
+
+        total_ms = (time.perf_counter() - queries.started) * 1000
+        db_ms = queries.duration * 1000
+        response.headers['X-Query-Count'] = str(queries.count)
+        response.headers['Server-Timing'] = (
+            f'db;desc="{queries.count} queries";dur={db_ms:.2f}, app;dur={total_ms - db_ms:.2f}'
+        )
+
+        endpoint = request.endpoint
+        if endpoint and endpoint != 'static':
+            method, path = request.method, request.full_path.rstrip('?')
+            if response.is_streamed:
+                # المحتوى يُولد بعد after_request: التسجيل عند إغلاق الاستجابة بالعدد النهائي
+                response.call_on_close(lambda: self._record(
+                    endpoint, method, path, (time.perf_counter() - queries.started) * 1000,
+                    queries.duration * 1000, queries
+                ))
+            else:
+                self._record(endpoint, method, path, total_ms, db_ms, queries)
+        return response
+
+    def _record(self, endpoint, method, path, total_ms, db_ms, queries):
+        slow = total_ms > self.slow_ms or queries.count > self.slow_queries
+        with self._lock:
+            samples = self._endpoints.get(endpoint)
+            if samples is None:
+                samples = self._endpoints[endpoint] = deque(maxlen=self.window)
+            samples.append((total_ms, db_ms, queries.count))
+            self._totals[endpoint] = self._totals.get(endpoint, 0) + 1
+            if slow:
+                self._slow_requests.appendleft({
+                    'time': datetime.utcnow(),
+                    'method': method,
+                    'path': path,
+                    'endpoint': endpoint,
+                    'duration_ms': round(total_ms, 2),
+                    'db_ms': round(db_ms, 2),
+                    'queries': queries.count,
+                    'slowest': queries.slowest_statements()
+                })
+
+        if slow:
+            details = ''.join(f'\n  {ms}ms: {statement}' for ms, statement in queries.slowest_statements())
+            logger.warning(
+                f'طلب بطيء {method} {path}: {total_ms:.0f}ms، '
+                f'{queries.count} استعلام في {db_ms:.0f}ms{details}'
+            )
+
+    def endpoint_stats(self):
+        """النسب المئوية لكل مسار من النافذة المتحركة، الأبطأ (p95) أولاً"""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._endpoints.items()}
+            totals = dict(self._totals)
+
+        rows = []
+        for endpoint, samples in snapshot.items():
+            durations = sorted(sample[0] for sample in samples)
+            counts = sorted(sample[2] for sample in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': totals.get(endpoint, 0),
+                'samples': len(samples),
+                'p50_ms': round(_percentile(durations, 0.5), 2),
+                'p95_ms': round(_percentile(durations, 0.95), 2),
+                'p99_ms': round(_percentile(durations, 0.99), 2),
+                'max_ms': round(durations[-1], 2),
+                'avg_db_ms': round(sum(sample[1] for sample in samples) / len(samples), 2),
+                'p50_queries': _percentile(counts, 0.5),
+                'p95_queries': _percentile(counts, 0.95),
+                'max_queries': counts[-1]
+            })
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+    def slow_requests(self):
+        """آخر الطلبات التي تجاوزت الحد، الأحدث أولاً"""
+        with self._lock:
+            return list(self._slow_requests)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._totals.clear()
+            self._slow_requests.clear()
+
+
+query_stats = QueryStats()
@@ -0,0 +1,167 @@
+"""
+تصدير المبيعات بشكل متدفق
+يُقرأ كل صنف مباع مع بيعه وبائعه ومنتجه وقسمه في استعلام واحد على دفعات
+(yield_per) ويُكتب الناتج صفاً بصف بصيغة JSON أو NDJSON أو CSV أو XLSX، فلا
+يزيد استهلاك الذاكرة مع طول الفترة المطلوبة.
+"""
+
+import csv
+import io
+import json
+import tempfile
+from functools import lru_cache
+
+import pytz
+from openpyxl import Workbook
+
+from models import db, Sale, SaleItem, Product, Category, User
+from date_ranges import EGYPT_TZ, date_range_filter
+
+# عدد الصفوف المقروءة من قاعدة البيانات في كل دفعة
+EXPORT_BATCH_SIZE = 1000
+
+# حجم الأجزاء عند إرسال ملف XLSX
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv', 'xlsx')
+
+# (المفتاح، العنوان في CSV و XLSX)
+EXPORT_COLUMNS = [
+    ('sale_id', 'رقم البيع'),
+    ('sale_date', 'التاريخ'),
+    ('sale_time', 'الوقت'),
+    ('seller_name', 'البائع'),
+    ('seller_role', 'الصلاحية'),
+    ('product_name', 'المنتج'),
+    ('product_category', 'الفئة'),
+    ('quantity', 'الكمية'),
+    ('unit_price', 'سعر الوحدة'),
+    ('total_price', 'الإجمالي'),
+    ('unit_type', 'نوع الوحدة'),
+    ('sale_total', 'إجمالي البيع'),
+    ('notes', 'ملاحظات'),
+]
+
+
+@lru_cache(maxsize=4096)
+def _egypt_offset(utc_hour):
+    """فرق توقيت مصر لساعة UTC معينة (يتغير فقط مع التوقيت الصيفي)"""
+    return pytz.utc.localize(utc_hour).astimezone(EGYPT_TZ).utcoffset()
+
+
+def _egypt_local(utc_datetime):
+    utc_hour = utc_datetime.replace(minute=0, second=0, microsecond=0)
+    return utc_datetime + _egypt_offset(utc_hour)
+
+
+def _export_query(start_day=None, end_day=None, user_id=None):
+    query = db.session.query(
+        Sale.id, Sale.sale_date, Sale.total_amount, Sale.notes,
+        User.username, User.role,
+        Product.name_ar, Product.unit_type, Category.name_ar,
+        SaleItem.quantity, SaleItem.unit_price, SaleItem.total_price
+    ).select_from(SaleItem).join(
+        Sale, SaleItem.sale_id == Sale.id
+    ).join(
+        User, Sale.user_id == User.id
+    ).join(
+        Product, SaleItem.product_id == Product.id
+    ).outerjoin(
+        Category, Product.category_id == Category.id
+    ).filter(*date_range_filter(Sale.sale_date, start_day, end_day))
+
+    if user_id:
+        query = query.filter(Sale.user_id == user_id)
+    return query
+
+
+def count_export_rows(start_day=None, end_day=None, user_id=None):
+    """عدد الصفوف (الأصناف المباعة) في التصدير"""
+    return _export_query(start_day, end_day, user_id).with_entities(db.func.count(SaleItem.id)).scalar()
+
+
+def iter_export_rows(start_day=None, end_day=None, user_id=None):
+    """الصفوف كقواميس، الأحدث أولاً، مقروءة على دفعات"""
+    query = _export_query(start_day, end_day, user_id).order_by(
+        Sale.sale_date.desc(), Sale.id.desc(), SaleItem.id
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    for (sale_id, sale_date, sale_total, notes, username, role,
+         product_name, unit_type, category_name, quantity, unit_price, total_price) in query:
+        local = _egypt_local(sale_date) if sale_date else None
+        yield {
+            'sale_id': sale_id,
+            'sale_date': local.strftime('%d/%m/%Y') if local else '',
+            'sale_time': local.strftime('%I:%M:%S %p').replace('AM', 'ص').replace('PM', 'م') if local else '',
+            'seller_name': username,
+            'seller_role': role,
+            'product_name': product_name,
+            'product_category': category_name or 'غير محدد',
+            'quantity': float(quantity),
+            'unit_price': float(unit_price),
+            'total_price': float(total_price),
+            'unit_type': unit_type,
+            'sale_total': float(sale_total),
+            'notes': notes or ''
+        }
+
+
+def stream_json(rows):
+    """مصفوفة JSON تُكتب عنصراً بعنصر"""
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps(row, ensure_ascii=False)
+    yield ']'
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_csv(rows, columns=EXPORT_COLUMNS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM حتى يفتح Excel الملف بترميز UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in columns])
+
+    for row in rows:
+        writer.writerow([row[key] for key, _ in columns])
+        if buffer.tell() >= FILE_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def write_xlsx_sheets(sheets, output):
+    """كتابة أوراق [(العنوان، العناوين، صفوف كقوائم)] في ملف بوضع الكتابة فقط
+    (كل ورقة تُكتب إلى ملف مؤقت لا إلى الذاكرة)"""
+    wb = Workbook(write_only=True)
+    for title, headers, rows in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(headers)
+        for row in rows:
+            ws.append(row)
+    wb.save(output)
+
+
+def stream_file(write):
+    """تشغيل write(ملف) على ملف مؤقت ثم إرساله على أجزاء"""
+    with tempfile.TemporaryFile() as output:
+        write(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_xlsx(rows, columns=EXPORT_COLUMNS, sheet_title='المبيعات'):
+    """ملف XLSX من صفوف قواميس يُرسل على أجزاء"""
+    sheet = (sheet_title, [title for _, title in columns], ([row[key] for key, _ in columns] for row in rows))
+    return stream_file(lambda output: write_xlsx_sheets([sheet], output))
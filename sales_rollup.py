@@ -0,0 +1,172 @@
+"""
+ملخص المبيعات اليومي
+يحتفظ بمجاميع كل يوم (بتوقيت مصر) لكل بائع في جدول daily_sales_summary
+بدلاً من تجميع جدول المبيعات بالكامل عند كل تقرير. يُحدث الملخص بزيادات
+ذرية داخل نفس معاملة البيع أو الدفعة أو المرتجع، ويمكن إعادة بنائه بالكامل
+عبر: python manage.py rebuild-rollups
+"""
+
+from datetime import datetime
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Sale, SaleItem, Payment, Return, DailySalesSummary
+from date_ranges import to_egypt_date
+
+# حالات المرتجع التي تُخصم من مبيعات اليوم
+COUNTED_RETURN_STATUSES = ('pending', 'approved')
+
+ROLLUP_FIELDS = (
+    'sales_count', 'revenue', 'discounts', 'refunds', 'cost', 'profit',
+    'credit_count', 'credit_revenue', 'payments'
+)
+
+
+def apply_rollup_delta(when, user_id, **deltas):
+    """إضافة زيادات إلى صف اليوم/البائع، وإنشاء الصف إذا لم يكن موجوداً"""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not user_id or not deltas:
+        return
+
+    day = to_egypt_date(when or datetime.utcnow())
+    statement = update(DailySalesSummary).where(
+        DailySalesSummary.summary_date == day,
+        DailySalesSummary.user_id == user_id
+    ).values({
+        name: getattr(DailySalesSummary, name) + value for name, value in deltas.items()
+    })
+
+    if db.session.execute(statement).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(DailySalesSummary(
+                summary_date=day, user_id=user_id,
+                **{name: deltas.get(name, 0) for name in ROLLUP_FIELDS}
+            ))
+    except IntegrityError:
+        # أنشأ طلب آخر الصف في نفس اللحظة
+        db.session.execute(statement)
+
+
+def post_sale_to_rollup(sale):
+    """إضافة بيع جديد (بعد إضافة أصنافه إلى الجلسة)"""
+    profit, cost = db.session.query(
+        func.coalesce(func.sum(SaleItem.profit), 0),
+        func.coalesce(func.sum(SaleItem.cost_total), 0)
+    ).filter(SaleItem.sale_id == sale.id).one()
+
+    is_credit = sale.payment_type == 'credit'
+    apply_rollup_delta(
+        sale.sale_date, sale.user_id,
+        sales_count=1,
+        revenue=sale.total_amount,
+        discounts=sale.discount_amount or 0,
+        cost=float(cost),
+        profit=float(profit),
+        credit_count=1 if is_credit else 0,
+        credit_revenue=sale.total_amount if is_credit else 0
+    )
+
+
+def post_payment_to_rollup(sale, amount, payment_date=None):
+    """إضافة دفعة على بيع إلى يوم الدفعة"""
+    apply_rollup_delta(payment_date, sale.user_id, payments=amount)
+
+
+def post_return_to_rollup(return_obj, refund_delta):
+    """تعديل مرتجعات يوم الإرجاع (موجب عند الإنشاء، سالب عند الرفض)"""
+    apply_rollup_delta(return_obj.return_date, return_obj.sale.user_id, refunds=refund_delta)
+
+
+def rebuild_rollups():
+    """إعادة بناء الملخص اليومي بالكامل من البيانات الخام - يعيد عدد الصفوف"""
+    totals = {}
+
+    def row_for(when, user_id):
+        key = (to_egypt_date(when), user_id)
+        return totals.setdefault(key, dict.fromkeys(ROLLUP_FIELDS, 0))
+
+    item_totals = db.session.query(
+        SaleItem.sale_id.label('sale_id'),
+        func.sum(SaleItem.profit).label('profit'),
+        func.sum(SaleItem.cost_total).label('cost')
+    ).group_by(SaleItem.sale_id).subquery()
+
+    sale_rows = db.session.query(
+        Sale.sale_date, Sale.user_id, Sale.total_amount, Sale.discount_amount,
+        Sale.payment_type, item_totals.c.profit, item_totals.c.cost
+    ).outerjoin(item_totals, item_totals.c.sale_id == Sale.id).filter(
+        Sale.sale_date.isnot(None)
+    )
+
+    for sale_date, user_id, total, discount, payment_type, profit, cost in sale_rows.yield_per(1000):
+        row = row_for(sale_date, user_id)
+        row['sales_count'] += 1
+        row['revenue'] += total or 0
+        row['discounts'] += discount or 0
+        row['profit'] += profit or 0
+        row['cost'] += cost or 0
+        if payment_type == 'credit':
+            row['credit_count'] += 1
+            row['credit_revenue'] += total or 0
+
+    payment_rows = db.session.query(
+        Payment.payment_date, Sale.user_id, Payment.amount
+    ).join(Sale, Payment.sale_id == Sale.id).filter(Payment.payment_date.isnot(None))
+
+    for payment_date, user_id, amount in payment_rows.yield_per(1000):
+        row_for(payment_date, user_id)['payments'] += amount or 0
+
+    return_rows = db.session.query(
+        Return.return_date, Sale.user_id, Return.refund_amount
+    ).join(Sale, Return.sale_id == Sale.id).filter(
+        Return.return_date.isnot(None),
+        Return.status.in_(COUNTED_RETURN_STATUSES)
+    )
+
+    for return_date, user_id, refund in return_rows.yield_per(1000):
+        row_for(return_date, user_id)['refunds'] += refund or 0
+
+    DailySalesSummary.query.delete()
+    db.session.bulk_insert_mappings(DailySalesSummary, [
+        dict(values, summary_date=day, user_id=user_id)
+        for (day, user_id), values in totals.items()
+    ])
+    db.session.commit()
+
+    return len(totals)
+
+
+def rollup_totals(start_day=None, end_day=None, user_id=None):
+    """مجاميع الملخص لفترة (الأيام المحلية شاملة) وبائع اختياري"""
+    query = db.session.query(
+        *[func.coalesce(func.sum(getattr(DailySalesSummary, name)), 0).label(name) for name in ROLLUP_FIELDS]
+    ).filter(*_rollup_criteria(start_day, end_day, user_id))
+    return query.one()._asdict()
+
+
+def rollup_by_day(start_day=None, end_day=None, user_id=None, newest_first=False):
+    """مجاميع الملخص لكل يوم في الفترة"""
+    query = db.session.query(
+        DailySalesSummary.summary_date.label('date'),
+        *[func.sum(getattr(DailySalesSummary, name)).label(name) for name in ROLLUP_FIELDS]
+    ).filter(
+        *_rollup_criteria(start_day, end_day, user_id)
+    ).group_by(DailySalesSummary.summary_date)
+
+    order = DailySalesSummary.summary_date.desc() if newest_first else DailySalesSummary.summary_date
+    return query.order_by(order).all()
+
+
+def _rollup_criteria(start_day, end_day, user_id):
+    criteria = []
+    if start_day:
+        criteria.append(DailySalesSummary.summary_date >= start_day)
+    if end_day:
+        criteria.append(DailySalesSummary.summary_date <= end_day)
+    if user_id:
+        criteria.append(DailySalesSummary.user_id == user_id)
+    return criteria
@@ -0,0 +1,175 @@
+"""
+ترقيات مخطط قاعدة البيانات
+db.create_all() ينشئ الجداول الجديدة فقط ولا يضيف أعمدة إلى الجداول الموجودة،
+لذلك تضيف هذه الخطوات الأعمدة الناقصة وتملأ بياناتها. كل خطوة آمنة للتشغيل
+أكثر من مرة (SQLite و PostgreSQL)
+"""
+
+from sqlalchemy import inspect, text, func
+
+from models import db, Customer, Product, Sale, SaleItem, Payment, Expense, Return, DailySalesSummary, CatalogVersion, StockSnapshot, \
+    BackgroundJob
+
+# قائمة الخطوات بالترتيب: (الاسم، الدالة)
+UPGRADES = []
+
+
+def upgrade(name):
+    """تسجيل خطوة ترقية"""
+    def decorator(f):
+        UPGRADES.append((name, f))
+        return f
+    return decorator
+
+
+def add_missing_columns(model, *column_names):
+    """إضافة أعمدة النموذج غير الموجودة في الجدول - يعيد أسماء الأعمدة المضافة
+    (على قاعدة بيانات النموذج، ومنها قواعد SQLALCHEMY_BINDS)"""
+    table = model.__table__
+    engine = db.session.get_bind(mapper=model)
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    for name in column_names:
+        if name in existing:
+            continue
+
+        column = table.c[name]
+        ddl = f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(name)} ' \
+              f'{column.type.compile(dialect=engine.dialect)}'
+        if column.server_default is not None:
+            ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += ' NOT NULL'
+
+        db.session.execute(text(ddl), bind_arguments={'mapper': model})
+        added.append(name)
+
+    db.session.commit()
+    return added
+
+
+def add_missing_indexes(model, *column_names):
+    """إنشاء فهارس النموذج على الأعمدة المحددة إذا لم تكن موجودة - يعيد أسماء الفهارس المضافة"""
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(model.__tablename__)}
+    added = []
+
+    for index in model.__table__.indexes:
+        if index.name in existing or not {column.name for column in index.columns} <= set(column_names):
+            continue
+        index.create(db.engine)
+        added.append(index.name)
+
+    return added
+
+
+@upgrade('customer_debt_ledger')
+def customer_debt_ledger():
+    """أعمدة دفتر ديون العملاء"""
+    from debt_ledger import rebuild_ledger
+
+    added = add_missing_columns(
+        Customer, 'ledger_sales_total', 'ledger_paid_total', 'ledger_returned_total'
+    )
+    if added:
+        rebuild_ledger()
+    return added
+
+
+@upgrade('sale_item_unit_cost')
+def sale_item_unit_cost():
+    """تكلفة الوحدة وقت البيع - تُملأ للمبيعات القديمة بسعر الجملة الحالي (وصفر للمنتجات المحذوفة)"""
+    added = add_missing_columns(SaleItem, 'unit_cost')
+    if added:
+        db.session.execute(
+            SaleItem.__table__.update().values(
+                unit_cost=func.coalesce(
+                    db.select(Product.wholesale_price)
+                    .where(Product.id == SaleItem.product_id)
+                    .scalar_subquery(),
+                    0
+                )
+            )
+        )
+        db.session.commit()
+    return added
+
+
+@upgrade('date_indexes')
+def date_indexes():
+    """فهارس أعمدة التاريخ المستخدمة في فلترة النطاقات الزمنية"""
+    return (
+        add_missing_indexes(Sale, 'sale_date')
+        + add_missing_indexes(Payment, 'payment_date')
+        + add_missing_indexes(Expense, 'expense_date')
+        + add_missing_indexes(Return, 'return_date')
+    )
+
+
+@upgrade('daily_sales_summary')
+def daily_sales_summary():
+    """ملء ملخص المبيعات اليومي لأول مرة (الجدول نفسه ينشئه create_all)"""
+    from sales_rollup import rebuild_rollups
+
+    if DailySalesSummary.query.first() is None and Sale.query.first() is not None:
+        return [f'{rebuild_rollups()} rows']
+    return []
+
+
+@upgrade('product_updated_at_index')
+def product_updated_at_index():
+    """فهرس تاريخ تعديل المنتج المستخدم في المزامنة التدريجية"""
+    return add_missing_indexes(Product, 'updated_at')
+
+
+@upgrade('catalog_version')
+def catalog_version():
+    """إنشاء صف عداد إصدار الكتالوج"""
+    from catalog_cache import CATALOG_ROW_ID
+
+    if db.session.get(CatalogVersion, CATALOG_ROW_ID) is None:
+        db.session.add(CatalogVersion(id=CATALOG_ROW_ID, version=1))
+        db.session.commit()
+        return ['version row']
+    return []
+
+
+@upgrade('sale_local_id')
+def sale_local_id():
+    """المعرف المحلي للمبيعات المتزامنة وفهرس منع التكرار"""
+    return add_missing_columns(Sale, 'local_id') + add_missing_indexes(Sale, 'user_id', 'local_id')
+
+
+@upgrade('product_search_index')
+def product_search_index():
+    """جدول فهرس البحث في المنتجات وملؤه لأول مرة"""
+    from product_search import ensure_search_index, rebuild_search_index
+
+    if ensure_search_index():
+        return [f'{rebuild_search_index()} products']
+    return []
+
+
+@upgrade('stock_journal')
+def stock_journal():
+    """لقطة افتتاحية للمخزون الحالي حتى يبدأ سجل الحركات من رصيد معروف"""
+    from stock_movements import take_stock_snapshot
+
+    if StockSnapshot.query.first() is None:
+        return [f'{take_stock_snapshot()} opening balances']
+    return []
+
+
+@upgrade('background_job_heartbeat')
+def background_job_heartbeat():
+    """إشارة حياة المهام الخلفية لاكتشاف المهام التي توقف عاملها (قاعدة المهام)"""
+    return add_missing_columns(BackgroundJob, 'heartbeat_at')
+
+
+def run_upgrades(echo=print):
+    """إنشاء الجداول الجديدة ثم تنفيذ جميع خطوات الترقية"""
+    db.create_all()
+    for name, step in UPGRADES:
+        result = step()
+        echo(f"✅ {name}: {', '.join(result) if result else 'up to date'}")
@@ -285,7 +285,7 @@ function viewDaySales(date) {
 function exportDaySales(date) {
     try {
         // Create a link to export sales for this specific day
-        const url = `/api/export/sales?date_from=${date}&date_to=${date}`;
+        const url = `/api/export/sales?date_from=${date}&date_to=${date}&format=xlsx`;
         const link = document.createElement('a');
         link.href = url;
         link.download = `sales_${date}.xlsx`;
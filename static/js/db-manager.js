@@ -188,6 +188,34 @@ class DatabaseManager {
     });
   }
 
+  // تطبيق تغييرات الكتالوج من /api/products/changes
+  // (full = نسخة كاملة تستبدل المخزن، وإلا تحديثات وحذف فقط)
+  async applyProductChanges(changes) {
+    await this.waitForInit();
+    return new Promise((resolve, reject) => {
+      const transaction = this.db.transaction(["products"], "readwrite");
+      const store = transaction.objectStore("products");
+
+      transaction.oncomplete = () => resolve();
+      transaction.onerror = () => reject(transaction.error);
+
+      if (changes.full) {
+        store.clear();
+      }
+
+      (changes.deleted || []).forEach((id) => {
+        store.delete(id);
+      });
+
+      (changes.updated || []).forEach((product) => {
+        store.put({
+          ...product,
+          last_updated: new Date().toISOString(),
+        });
+      });
+    });
+  }
+
   // ==== عمليات الفئات ====
   async getCategories() {
     await this.waitForInit();
@@ -458,7 +486,10 @@ class DatabaseManager {
     ];
 
     return new Promise((resolve, reject) => {
-      const transaction = this.db.transaction(storeNames, "readwrite");
+      const transaction = this.db.transaction(
+        [...storeNames, "app_settings"],
+        "readwrite"
+      );
 
       transaction.oncomplete = () => resolve();
       transaction.onerror = () => reject(transaction.error);
@@ -467,6 +498,9 @@ class DatabaseManager {
         const store = transaction.objectStore(storeName);
         store.clear();
       });
+
+      // المنتجات حُذفت، فالمزامنة التالية يجب أن تكون كاملة
+      transaction.objectStore("app_settings").delete("productsCursor");
     });
   }
 
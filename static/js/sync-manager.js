@@ -135,8 +135,10 @@ class SyncManager {
   }
 
   async syncDataFromServer() {
+    // المنتجات: تغييرات فقط منذ آخر مؤشر
+    await this.syncProductChanges();
+
     const endpoints = [
-      { url: "/api/products", handler: "saveProducts" },
       { url: "/api/categories", handler: "saveCategories" },
       { url: "/api/customers", handler: "saveCustomers" },
     ];
@@ -161,6 +163,32 @@ class SyncManager {
     }
   }
 
+  async syncProductChanges() {
+    if (!window.dbManager) return;
+
+    try {
+      const cursor = await window.dbManager.getSetting("productsCursor");
+      const url = cursor
+        ? `/api/products/changes?since=${encodeURIComponent(cursor)}`
+        : "/api/products/changes";
+
+      const response = await fetch(url);
+      if (!response.ok) {
+        console.warn(`⚠️ Failed to fetch product changes: ${response.status}`);
+        return;
+      }
+
+      const changes = await response.json();
+      await window.dbManager.applyProductChanges(changes);
+      await window.dbManager.setSetting("productsCursor", changes.cursor);
+      console.log(
+        `✅ Synced products: ${changes.updated.length} updated, ${changes.deleted.length} deleted${changes.full ? " (full)" : ""}`
+      );
+    } catch (error) {
+      console.error("❌ Error syncing product changes:", error);
+    }
+  }
+
   async syncPendingOperations() {
     if (!window.dbManager) return;
 
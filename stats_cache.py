@@ -0,0 +1,162 @@
+"""
+ذاكرة مؤقتة للإحصائيات العامة (مثل إجمالي الديون في رأس الصفحة)
+تعمل داخل العملية افتراضياً، ويمكن مشاركتها بين العمال عبر Redis
+بتعيين STATS_CACHE_URL. تُمسح القيم بعد نجاح أي معاملة تعدل المبيعات
+أو الدفعات أو المرتجعات.
+في Redis يُمسح بزيادة عداد جيل مشترك (INCR) يدخل في اسم كل مفتاح: القيمة التي
+حُسبت قبل المسح تُكتب باسم الجيل القديم فلا يقرؤها أي عامل بعده.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# مفتاح إحصائيات الديون العامة
+DEBT_STATS_KEY = 'debt_stats'
+
+# اسم عداد الجيل المشترك في Redis (بعد البادئة)
+_GENERATION_KEY = 'generation'
+
+# مفتاح المفاتيح المطلوب مسحها داخل session.info
+_PENDING_KEY = 'stats_cache_pending'
+
+
+class StatsCache:
+    """ذاكرة مؤقتة بسيطة بمدة صلاحية وعدادات إصابة/إخفاق"""
+
+    def __init__(self, ttl=60, prefix='sara:stats:'):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.backend = None  # عميل Redis عند تفعيل الذاكرة المشتركة
+        self._local = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """قراءة الإعدادات وربط الذاكرة المشتركة إن وجدت"""
+        self.ttl = app.config.get('STATS_CACHE_TTL', self.ttl)
+        url = app.config.get('STATS_CACHE_URL')
+        if url:
+            try:
+                import redis
+                self.backend = redis.Redis.from_url(url)
+            except ImportError:
+                logger.warning('redis غير مثبت - سيتم استخدام الذاكرة المحلية للإحصائيات')
+        app.extensions['stats_cache'] = self
+
+    def get_or_compute(self, key, compute):
+        """إرجاع القيمة المخزنة أو حسابها وتخزينها"""
+        generation = self._current_generation()
+        found, value = self._get(key, generation)
+        if found:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        self._set(key, value, generation)
+        return value
+
+    def invalidate(self, *keys):
+        """مسح مفاتيح محددة أو كل القيم إذا لم تحدد مفاتيح (في Redis يُمسح الكل بزيادة الجيل)"""
+        with self._lock:
+            self._generation += 1
+            if keys:
+                for key in keys:
+                    self._local.pop(key, None)
+            else:
+                self._local.clear()
+
+        if self.backend is not None:
+            try:
+                # القيم القديمة تنتهي صلاحيتها وحدها بعد ttl
+                self.backend.incr(self.prefix + _GENERATION_KEY)
+            except Exception as e:
+                logger.warning(f'تعذر مسح الذاكرة المشتركة: {e}')
+
+    def stats(self):
+        """عدادات الذاكرة المؤقتة"""
+        total = self.hits + self.misses
+        return {
+            'backend': 'redis' if self.backend is not None else 'memory',
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else 0,
+            'keys': len(self._local)
+        }
+
+    def _current_generation(self):
+        """(جيل Redis أو None إذا لم تتوفر الذاكرة المشتركة، جيل العملية)"""
+        shared = None
+        if self.backend is not None:
+            try:
+                shared = int(self.backend.get(self.prefix + _GENERATION_KEY) or 0)
+            except Exception as e:
+                logger.warning(f'تعذر القراءة من الذاكرة المشتركة: {e}')
+        return shared, self._generation
+
+    def _shared_key(self, key, shared_generation):
+        return f'{self.prefix}{shared_generation}:{key}'
+
+    def _get(self, key, generation):
+        if generation[0] is not None:
+            try:
+                raw = self.backend.get(self._shared_key(key, generation[0]))
+                return (True, json.loads(raw)) if raw is not None else (False, None)
+            except Exception as e:
+                logger.warning(f'تعذر القراءة من الذاكرة المشتركة: {e}')
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry and entry[0] > time.monotonic():
+                return True, entry[1]
+        return False, None
+
+    def _set(self, key, value, generation):
+        if generation[0] is not None:
+            try:
+                # باسم الجيل الذي قُرئ قبل الحساب: إن مُسحت الذاكرة أثناءه لا يقرأ القيمة أحد
+                self.backend.setex(self._shared_key(key, generation[0]), self.ttl, json.dumps(value))
+                return
+            except Exception as e:
+                logger.warning(f'تعذر الكتابة في الذاكرة المشتركة: {e}')
+
+        with self._lock:
+            # لا نخزن قيمة حُسبت قبل آخر مسح حتى لا نعيد بيانات قديمة
+            if generation[1] == self._generation:
+                self._local[key] = (time.monotonic() + self.ttl, value)
+
+
+stats_cache = StatsCache()
+
+
+def invalidate_after_commit(session, *keys):
+    """جدولة مسح المفاتيح بعد نجاح المعاملة الحالية"""
+    session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_pending_invalidations(session):
+    # after_commit يُستدعى أيضاً عند تحرير نقطة حفظ، والبيانات لم تُحفظ بعد
+    if session.in_nested_transaction():
+        return
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        stats_cache.invalidate(*keys)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_pending_invalidations(session, transaction):
+    # after_rollback يُستدعى أيضاً عند إلغاء نقطة حفظ (begin_nested) بينما تكمل المعاملة الخارجية،
+    # لذلك لا تُلغى المفاتيح المعلقة إلا بانتهاء المعاملة الخارجية (بعد commit تكون قد مُسحت)
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,181 @@
+"""
+سجل حركات المخزون
+كل تغيير في Product.stock_quantity يُسجل كحركة في جدول stock_movement داخل نفس
+المعاملة. التغييرات العادية على كائن المنتج (تعديل المنتج، تحديث المخزون،
+المرتجعات، الاستيراد) تُلتقط تلقائياً بعد الـ flush بنوع الحركة الذي حدده
+set_stock_reason()، أما الخصم بجمل SQL (البيع والمزامنة) فيُسجل صراحة عبر
+record_movements().
+
+لقطات stock_snapshot الدورية (python manage.py snapshot-stock) تجعل حساب المخزون
+في تاريخ معين = آخر لقطة قبله + الحركات بعدها، دون المرور على السجل كله.
+"""
+
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event, func, inspect, insert, select, and_, or_
+from sqlalchemy.orm import Session
+
+from models import db, Product, StockMovement, StockSnapshot
+
+# أقصى فرق مقبول بين المخزون والسجل
+STOCK_TOLERANCE = 0.0001
+
+_REASON_KEY = 'stock_reason'
+
+
+def set_stock_reason(kind, sale_id=None, return_id=None, user_id=None, session=None):
+    """نوع الحركة لتغييرات المخزون القادمة في المعاملة الحالية"""
+    session = session or db.session
+    session.info[_REASON_KEY] = {'kind': kind, 'sale_id': sale_id, 'return_id': return_id, 'user_id': user_id}
+
+
+def movement_rows(quantities, kind, sale_id=None, return_id=None, user_id=None):
+    """صفوف حركات {رقم المنتج: التغير} جاهزة للإدراج"""
+    now = datetime.utcnow()
+    return [{
+        'product_id': product_id, 'quantity': quantity, 'kind': kind,
+        'sale_id': sale_id, 'return_id': return_id, 'user_id': user_id, 'created_at': now
+    } for product_id, quantity in quantities.items() if quantity]
+
+
+def insert_movements(rows):
+    if rows:
+        db.session.execute(insert(StockMovement), rows)
+
+
+def record_movements(quantities, kind, sale_id=None, return_id=None, user_id=None):
+    """تسجيل حركات {رقم المنتج: التغير} لخصم أو إضافة تمت بجملة SQL"""
+    insert_movements(movement_rows(quantities, kind, sale_id, return_id, user_id))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+@event.listens_for(Session, 'after_flush')
+def _journal_stock_changes(session, flush_context):
+    reason = session.info.get(_REASON_KEY) or {}
+    new = session.new
+    now = datetime.utcnow()
+    rows = []
+
+    for obj in chain(new, session.dirty):
+        if not isinstance(obj, Product):
+            continue
+
+        if obj in new:
+            delta = obj.stock_quantity if _is_number(obj.stock_quantity) else 0
+            kind = reason.get('kind', 'initial')
+        else:
+            history = inspect(obj).attrs.stock_quantity.history
+            if not (history.added and history.deleted):
+                continue
+            after, before = history.added[0], history.deleted[0]
+            # القيم التعبيرية (Product.stock_quantity - x) تُسجل صراحة
+            if not (_is_number(after) and _is_number(before)):
+                continue
+            delta = after - before
+            kind = reason.get('kind', 'adjustment')
+
+        if delta:
+            rows.append({
+                'product_id': obj.id, 'quantity': delta, 'kind': kind,
+                'sale_id': reason.get('sale_id'), 'return_id': reason.get('return_id'),
+                'user_id': reason.get('user_id'), 'created_at': now
+            })
+
+    if rows:
+        session.connection().execute(insert(StockMovement.__table__), rows)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _clear_stock_reason(session, transaction):
+    # نقاط الحفظ (begin_nested) تنتهي أيضاً بـ commit أو rollback، والسبب يبقى لباقي المعاملة الخارجية
+    if transaction.parent is None:
+        session.info.pop(_REASON_KEY, None)
+
+
+def take_stock_snapshot():
+    """لقطة لأرصدة كل المنتجات الآن - يعيد عدد المنتجات"""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        insert(StockSnapshot).from_select(
+            ['product_id', 'quantity', 'taken_at'],
+            select(Product.id, Product.stock_quantity, db.literal(now))
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def stock_at(when, product_ids=None):
+    """المخزون لكل منتج في لحظة معينة (UTC): {رقم المنتج: الكمية}"""
+    latest = select(
+        StockSnapshot.product_id, func.max(StockSnapshot.taken_at).label('taken_at')
+    ).where(StockSnapshot.taken_at <= when)
+    if product_ids is not None:
+        latest = latest.where(StockSnapshot.product_id.in_(product_ids))
+    latest = latest.group_by(StockSnapshot.product_id).subquery()
+
+    balances = {
+        product_id: quantity for product_id, quantity in db.session.execute(
+            select(StockSnapshot.product_id, StockSnapshot.quantity).join(latest, and_(
+                StockSnapshot.product_id == latest.c.product_id,
+                StockSnapshot.taken_at == latest.c.taken_at
+            ))
+        )
+    }
+
+    movements = select(StockMovement.product_id, func.sum(StockMovement.quantity)).outerjoin(
+        latest, StockMovement.product_id == latest.c.product_id
+    ).where(
+        StockMovement.created_at <= when,
+        or_(latest.c.taken_at.is_(None), StockMovement.created_at > latest.c.taken_at)
+    )
+    if product_ids is not None:
+        movements = movements.where(StockMovement.product_id.in_(product_ids))
+
+    for product_id, quantity in db.session.execute(movements.group_by(StockMovement.product_id)):
+        balances[product_id] = balances.get(product_id, 0) + (quantity or 0)
+    return balances
+
+
+def movement_summary(start=None, end=None, product_id=None):
+    """مجموع الحركات لكل منتج ونوع في فترة (UTC، النهاية غير شاملة)"""
+    query = db.session.query(
+        StockMovement.product_id, StockMovement.kind,
+        func.sum(StockMovement.quantity).label('quantity'),
+        func.count(StockMovement.id).label('movements')
+    )
+    if start:
+        query = query.filter(StockMovement.created_at >= start)
+    if end:
+        query = query.filter(StockMovement.created_at < end)
+    if product_id:
+        query = query.filter(StockMovement.product_id == product_id)
+
+    summary = {}
+    for row in query.group_by(StockMovement.product_id, StockMovement.kind):
+        summary.setdefault(row.product_id, {})[row.kind] = {
+            'quantity': float(row.quantity or 0), 'movements': row.movements
+        }
+    return summary
+
+
+def reconcile_stock(fix=False):
+    """مقارنة المخزون الحالي بالسجل - يعيد قائمة الفروقات، ومع fix تُسجل حركات تصحيح"""
+    expected = stock_at(datetime.utcnow())
+    drift = []
+
+    products = db.session.query(Product.id, Product.name_ar, Product.stock_quantity).order_by(Product.id)
+    for product_id, name, stock in products:
+        journal = expected.get(product_id, 0)
+        if abs((stock or 0) - journal) > STOCK_TOLERANCE:
+            drift.append({'product_id': product_id, 'name': name, 'stock': stock or 0, 'journal': journal})
+
+    if fix and drift:
+        record_movements({item['product_id']: item['stock'] - item['journal'] for item in drift}, 'correction')
+        db.session.commit()
+
+    return drift
@@ -0,0 +1,61 @@
+"""
+حجز المخزون عند البيع
+خصم كميات كل أصناف البيع في جملة UPDATE شرطية واحدة:
+stock_quantity = stock_quantity - الكمية بشرط stock_quantity >= الكمية.
+قاعدة البيانات تنفذ الشرط والخصم معاً، فلا يضيع خصم عند بيع نفس المنتج من
+جهازين في نفس اللحظة، ولا يُقفل إلا صفوف المنتجات المباعة.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import update, case
+
+from models import db, Product
+
+
+def requested_quantities(items):
+    """مجموع الكمية المطلوبة لكل منتج - يرفع ValueError عند بيانات غير صحيحة"""
+    quantities = defaultdict(float)
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = float(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('بيانات الصنف غير صحيحة')
+        if quantity <= 0:
+            raise ValueError('يجب أن تكون الكمية أكبر من صفر')
+        quantities[product_id] += quantity
+    return dict(quantities)
+
+
+def reserve_stock(quantities):
+    """خصم الكميات {رقم المنتج: الكمية} دفعة واحدة - يعيد {رقم المنتج: سعر الجملة}
+    ويرفع ValueError (دون خصم أي شيء) إذا كان منتج غير موجود أو كميته غير كافية"""
+    if not quantities:
+        return {}
+
+    product_ids = sorted(quantities)
+    requested = case(quantities, value=Product.id)
+    statement = update(Product).where(
+        Product.id.in_(product_ids),
+        Product.stock_quantity >= requested
+    ).values(
+        stock_quantity=Product.stock_quantity - requested
+    ).returning(
+        Product.id, Product.wholesale_price
+    ).execution_options(synchronize_session='fetch')
+
+    with db.session.begin_nested():
+        reserved = {product_id: wholesale_price for product_id, wholesale_price in db.session.execute(statement)}
+        if len(reserved) < len(product_ids):
+            # نقطة الحفظ تُلغى فيعود مخزون المنتجات التي خُصمت
+            raise ValueError(_shortage_message(set(product_ids) - set(reserved)))
+
+    return reserved
+
+
+def _shortage_message(product_ids):
+    products = Product.query.filter(Product.id.in_(product_ids)).order_by(Product.id).all()
+    if len(products) < len(product_ids):
+        return 'المنتج غير موجود'
+    return f'الكمية المطلوبة غير متوفرة للمنتج {products[0].name_ar} (المتوفر: {products[0].stock_quantity:g})'
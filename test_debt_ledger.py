@@ -0,0 +1,118 @@
+"""
+دفتر ديون العملاء
+الرصيد المخزن لكل عميل يجب أن يساوي الحساب القديم بالمرور على مبيعاته (المتبقي من
+كل بيع آجل، والبيع النقدي مدفوع بالكامل) مطروحاً منه المرتجعات المستردة كرصيد.
+"""
+
+import pytest
+
+from conftest import seed_store, logged_in_client
+from models import db, User, Customer, Sale, Product, Return
+from debt_ledger import CREDIT_REFUND_METHOD, post_sale_to_ledger, verify_ledger
+
+
+def _per_sale_debt(customer_id):
+    """الدين محسوباً من المبيعات والدفعات والمرتجعات الخام كما كان قبل الدفتر"""
+    sales = Sale.query.filter_by(customer_id=customer_id).all()
+    remaining = sum(sale.remaining_amount for sale in sales)
+    refunded = sum(
+        return_obj.refund_amount for sale in sales for return_obj in sale.returns
+        if return_obj.status == 'approved' and return_obj.refund_method == CREDIT_REFUND_METHOD
+    )
+    return max(0, remaining - refunded)
+
+
+def _assert_ledger_matches():
+    assert verify_ledger() == []
+    for customer in Customer.query.all():
+        assert customer.total_debt == pytest.approx(_per_sale_debt(customer.id), abs=0.01), customer.name
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        admin_id = seed_store(6)
+    return logged_in_client(app, admin_id)
+
+
+def _credit_sale(client, customer_id, paid_amount):
+    with client.application.app_context():
+        product = Product.query.order_by(Product.id).first()
+        product_id, price = product.id, product.retail_price
+    total = price * 4
+    response = client.post('/api/sales', json={
+        'items': [{'product_id': product_id, 'quantity': 4, 'unit_price': price, 'total_price': total}],
+        'subtotal': total, 'total_amount': total,
+        'payment_type': 'credit', 'customer_id': customer_id, 'paid_amount': paid_amount
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['sale_id'], total
+
+
+def _return_sale(client, sale_id, refund_method, action):
+    with client.application.app_context():
+        sale_item_id = db.session.get(Sale, sale_id).sale_items[0].id
+    response = client.post('/api/returns', json={
+        'sale_id': sale_id, 'reason': 'تالف', 'refund_method': refund_method,
+        'items': [{'sale_item_id': sale_item_id, 'quantity_returned': 1}]
+    })
+    assert response.get_json()['success'], response.get_json()
+    with client.application.app_context():
+        return_id = Return.query.filter_by(sale_id=sale_id).order_by(Return.id.desc()).first().id
+    response = client.post(f'/api/returns/{return_id}/process', json={'action': action})
+    assert response.get_json()['success'], response.get_json()
+
+
+def test_seeded_ledger_matches_per_sale_debt(client):
+    with client.application.app_context():
+        cash_customers = {sale.customer_id for sale in Sale.query.filter(
+            Sale.payment_type == 'cash', Sale.customer_id.isnot(None))}
+        assert cash_customers, 'البيانات التجريبية يجب أن تحتوي بيعاً نقدياً لعميل'
+        _assert_ledger_matches()
+
+
+def test_cash_sale_to_customer_adds_no_debt(client):
+    with client.application.app_context():
+        customer = Customer.query.order_by(Customer.id).first()
+        debt_before = customer.total_debt
+        product = Product.query.order_by(Product.id).first()
+        admin = User.query.filter_by(username='admin').one()
+        sale = Sale(subtotal=product.retail_price, total_amount=product.retail_price, user_id=admin.id,
+                    customer_id=customer.id, payment_type='cash', payment_status='paid')
+        db.session.add(sale)
+        post_sale_to_ledger(sale)
+        db.session.commit()
+
+        assert db.session.get(Customer, customer.id).total_debt == pytest.approx(debt_before)
+        _assert_ledger_matches()
+
+
+def test_credit_sale_payment_and_credit_refund(client):
+    with client.application.app_context():
+        customer_id = Customer.query.order_by(Customer.id).first().id
+        debt_before = db.session.get(Customer, customer_id).total_debt
+
+    sale_id, total = _credit_sale(client, customer_id, paid_amount=5)
+    with client.application.app_context():
+        assert db.session.get(Customer, customer_id).total_debt == pytest.approx(debt_before + total - 5)
+
+    _return_sale(client, sale_id, CREDIT_REFUND_METHOD, 'approve')
+    with client.application.app_context():
+        unit_price = db.session.get(Sale, sale_id).sale_items[0].unit_price
+        assert db.session.get(Customer, customer_id).total_debt == pytest.approx(debt_before + total - 5 - unit_price)
+        _assert_ledger_matches()
+
+
+def test_cash_refund_and_rejected_return_leave_debt(client):
+    with client.application.app_context():
+        customer_id = Customer.query.order_by(Customer.id).first().id
+
+    sale_id, _ = _credit_sale(client, customer_id, paid_amount=0)
+    with client.application.app_context():
+        debt = db.session.get(Customer, customer_id).total_debt
+
+    _return_sale(client, sale_id, 'نقدي', 'approve')
+    _return_sale(client, sale_id, CREDIT_REFUND_METHOD, 'reject')
+    with client.application.app_context():
+        assert db.session.get(Customer, customer_id).total_debt == pytest.approx(debt)
+        _assert_ledger_matches()
@@ -0,0 +1,125 @@
+"""
+مزامنة المبيعات المحفوظة أثناء عدم الاتصال
+المعرف المحلي local_id لا يُحفظ مرتين (في نفس الدفعة أو بين طلبين)، والبيع الذي نقص
+مخزونه يُرفض وحده دون أن ينزل المخزون تحت الصفر.
+"""
+
+import pytest
+from sqlalchemy import update
+
+import offline_sync
+from conftest import logged_in_client, set_stock, stock_of
+from models import db, Product, Sale
+from offline_sync import ingest_offline_sales
+
+pytestmark = pytest.mark.parametrize('store', [4], indirect=True)
+
+
+def _sale(local_id, product_id, quantity, price=10.0):
+    return {
+        'local_id': local_id,
+        'items': [{'product_id': product_id, 'quantity': quantity, 'unit_price': price, 'total_price': price * quantity}],
+        'subtotal': price * quantity,
+        'total_amount': price * quantity
+    }
+
+
+def test_duplicate_local_ids_in_one_upload_are_saved_once(store):
+    set_stock(1, 10)
+    results = ingest_offline_sales([_sale('a', 1, 2), _sale('a', 1, 2), _sale('b', 1, 1)], store)
+
+    assert not results['errors']
+    by_local_id = {}
+    for result in results['success']:
+        by_local_id.setdefault(result['local_id'], []).append(result)
+    assert [r.get('duplicate', False) for r in by_local_id['a']] == [False, True]
+    assert by_local_id['a'][0]['server_id'] == by_local_id['a'][1]['server_id']
+    assert Sale.query.filter_by(local_id='a').count() == 1
+    assert stock_of(1) == 7
+
+
+def test_reupload_returns_existing_sale_as_duplicate(store):
+    set_stock(1, 10)
+    first = ingest_offline_sales([_sale('a', 1, 2)], store)['success'][0]
+    again = ingest_offline_sales([_sale('a', 1, 2)], store)
+
+    assert again['success'] == [dict(first, duplicate=True)]
+    assert stock_of(1) == 8
+
+
+def test_concurrent_upload_of_same_local_id_is_a_duplicate(store, monkeypatch):
+    set_stock(1, 10)
+    first = ingest_offline_sales([_sale('a', 1, 2)], store)['success'][0]
+
+    # الطلب الآخر حفظ البيع بعد أن تحقق هذا الطلب من المعرفات السابقة
+    lookups = [{}]
+    real_lookup = offline_sync._existing_local_ids
+    monkeypatch.setattr(offline_sync, '_existing_local_ids',
+                        lambda user_id, local_ids: lookups.pop() if lookups else real_lookup(user_id, local_ids))
+    results = ingest_offline_sales([_sale('a', 1, 2), _sale('b', 1, 1)], store)
+
+    assert not results['errors']
+    duplicate = next(r for r in results['success'] if r['local_id'] == 'a')
+    assert duplicate['duplicate'] and duplicate['server_id'] == first['server_id']
+    assert Sale.query.filter_by(local_id='a').count() == 1
+    assert stock_of(1) == 7
+
+
+def test_stock_shortfall_rejects_only_that_sale(store):
+    set_stock(1, 5)
+    set_stock(2, 5)
+    results = ingest_offline_sales([_sale('a', 1, 3), _sale('b', 1, 3), _sale('c', 2, 1)], store)
+
+    assert [r['local_id'] for r in results['success']] == ['a', 'c']
+    assert [e['data']['local_id'] for e in results['errors']] == ['b']
+    assert stock_of(1) == 2
+    assert stock_of(2) == 4
+    assert Sale.query.filter_by(local_id='b').count() == 0
+
+
+def test_stock_sold_elsewhere_during_sync_is_not_oversold(store, monkeypatch):
+    set_stock(1, 10)
+
+    # بيع من نقطة البيع يخصم المخزون بعد أن قرأت المزامنة المنتجات
+    real_prefetch = offline_sync._prefetch_products
+
+    def prefetch_then_sell(sales_data):
+        products = real_prefetch(sales_data)
+        db.session.execute(update(Product).where(Product.id == 1).values(stock_quantity=Product.stock_quantity - 9)
+                           .execution_options(synchronize_session=False))
+        return products
+
+    monkeypatch.setattr(offline_sync, '_prefetch_products', prefetch_then_sell)
+    results = ingest_offline_sales([_sale('a', 1, 2)], store)
+
+    assert not results['success'] and len(results['errors']) == 1
+    assert stock_of(1) == 1
+
+
+def test_sync_endpoint(app, store):
+    set_stock(1, 10)
+    client = logged_in_client(app, store)
+    response = client.post('/api/sync', json={'type': 'sales', 'data': [_sale('a', 1, 4)]})
+
+    assert response.status_code == 200
+    assert [r['local_id'] for r in response.get_json()['results']['success']] == ['a']
+    assert stock_of(1) == 6
+
+
+def test_string_product_ids_are_accepted(store):
+    set_stock(1, 10)
+    results = ingest_offline_sales([_sale('a', '1', 2)], store)
+
+    assert not results['errors'], results['errors']
+    assert [r['local_id'] for r in results['success']] == ['a']
+    assert stock_of(1) == 8
+
+
+def test_non_numeric_product_id_rejects_only_that_sale(store):
+    set_stock(1, 10)
+    results = ingest_offline_sales([_sale('a', 'abc', 1), _sale('b', 1, 1)], store)
+
+    assert [r['local_id'] for r in results['success']] == ['b']
+    assert [e['data']['local_id'] for e in results['errors']] == ['a']
+    assert 'abc' in results['errors'][0]['error']
+    assert stock_of(1) == 9
@@ -0,0 +1,99 @@
+"""
+توزيع دفعات العملاء (payment_allocation)
+الدفعة تُوزع على المبيعات المفتوحة بالأقدم أولاً، وكل بيع يصبح مسدداً أو جزئياً حسب
+ما وصله، والزائد يبقى رصيداً. المعاينة تعيد نفس التوزيع دون تسجيل أي دفعة.
+"""
+
+import pytest
+
+from conftest import logged_in_client
+from models import db, Customer, Sale, Payment
+from debt_ledger import verify_ledger
+from payment_allocation import allocate_payment, open_sales
+
+
+def _open_sales(customer_id):
+    """المبيعات المفتوحة بالأقدم أولاً مع المتبقي من كل بيع"""
+    sales = Sale.query.filter(Sale.customer_id == customer_id, Sale.payment_status.in_(['unpaid', 'partial'])) \
+        .order_by(Sale.sale_date, Sale.id).all()
+    return [(sale.id, sale.remaining_amount) for sale in sales]
+
+
+def _customer_with_open_sales(count):
+    for customer in Customer.query.order_by(Customer.id):
+        if len(_open_sales(customer.id)) >= count:
+            return customer.id
+    pytest.fail(f'البيانات التجريبية يجب أن تحتوي عميلاً له {count} مبيعات مفتوحة')
+
+
+def test_open_sales_are_oldest_first_with_paid_amounts(store):
+    customer_id = _customer_with_open_sales(3)
+    rows = open_sales(customer_id)
+
+    assert [(sale_id, pytest.approx(total - paid)) for sale_id, _, total, paid in rows] == _open_sales(customer_id)
+
+
+def test_payment_settles_oldest_sale_first(store):
+    customer_id = _customer_with_open_sales(3)
+    (first_id, first_remaining), (second_id, second_remaining), *_ = _open_sales(customer_id)
+
+    allocations, remaining = allocate_payment(customer_id, first_remaining + second_remaining / 2)
+
+    assert [(a['sale_id'], a['status']) for a in allocations] == [(first_id, 'paid'), (second_id, 'partial')]
+    assert allocations[0]['amount'] == pytest.approx(first_remaining)
+    assert allocations[1]['amount'] == pytest.approx(second_remaining / 2)
+    assert allocations[1]['remaining_before'] == pytest.approx(second_remaining)
+    assert remaining == pytest.approx(0)
+
+
+def test_overpayment_pays_everything_and_keeps_the_rest(store):
+    customer_id = _customer_with_open_sales(3)
+    debt = sum(remaining for _, remaining in _open_sales(customer_id))
+
+    allocations, remaining = allocate_payment(customer_id, debt + 10)
+
+    assert [a['sale_id'] for a in allocations] == [sale_id for sale_id, _ in _open_sales(customer_id)]
+    assert {a['status'] for a in allocations} == {'paid'}
+    assert remaining == pytest.approx(10)
+
+
+def test_preview_records_nothing(app, store):
+    customer_id = _customer_with_open_sales(3)
+    amount = _open_sales(customer_id)[0][1] + 1
+    expected, _ = allocate_payment(customer_id, amount)
+    payments_before = Payment.query.count()
+    debt_before = db.session.get(Customer, customer_id).total_debt
+
+    response = logged_in_client(app, store).post('/api/quick-payment', json={
+        'customer_id': customer_id, 'amount': amount, 'preview': True
+    })
+
+    data = response.get_json()
+    assert data['success'] and data['preview']
+    assert [(a['sale_id'], a['status']) for a in data['allocations']] == \
+        [(a['sale_id'], a['status']) for a in expected]
+    assert [a['amount'] for a in data['allocations']] == pytest.approx([a['amount'] for a in expected])
+    db.session.expire_all()
+    assert Payment.query.count() == payments_before
+    assert db.session.get(Customer, customer_id).total_debt == pytest.approx(debt_before)
+
+
+def test_quick_payment_updates_sales_and_ledger(app, store):
+    customer_id = _customer_with_open_sales(3)
+    (first_id, first_remaining), (second_id, second_remaining), *_ = _open_sales(customer_id)
+    amount = first_remaining + second_remaining / 2
+    debt_before = db.session.get(Customer, customer_id).total_debt
+
+    response = logged_in_client(app, store).post('/api/quick-payment', json={
+        'customer_id': customer_id, 'amount': amount, 'payment_method': 'نقدي'
+    })
+
+    data = response.get_json()
+    assert data['success'], data
+    assert [p['sale_id'] for p in data['payments_made']] == [first_id, second_id]
+    db.session.expire_all()
+    assert db.session.get(Sale, first_id).payment_status == 'paid'
+    assert db.session.get(Sale, second_id).payment_status == 'partial'
+    assert db.session.get(Sale, second_id).remaining_amount == pytest.approx(second_remaining / 2)
+    assert db.session.get(Customer, customer_id).total_debt == pytest.approx(debt_before - amount)
+    assert verify_ledger() == []
@@ -0,0 +1,28 @@
+"""
+اقتراحات المنتجات أثناء الكتابة (/api/products/suggest)
+عدد النتائج محصور بين 1 و 50 مهما كانت قيمة limit في الطلب.
+"""
+
+import pytest
+
+from conftest import logged_in_client
+from product_suggest import suggest_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(store):
+    # كل اختبار يبني متجراً جديداً: إعادة بناء الفهرس بالكامل بدلاً من التحديث التدريجي
+    suggest_index.version = suggest_index.cursor = None
+
+
+@pytest.mark.parametrize('limit, expected', [('0', 1), ('-5', 1), ('3', 3), ('1000', 50)])
+def test_limit_is_clamped(app, store, limit, expected):
+    client = logged_in_client(app, store)
+
+    assert len(client.get(f'/api/products/suggest?limit={limit}').get_json()) == expected
+    assert len(client.get(f'/api/products/suggest?q=ب&limit={limit}').get_json()) <= expected
+
+
+def test_non_positive_limit_returns_nothing():
+    assert suggest_index.suggest('', limit=0) == []
+    assert suggest_index.suggest('ب', limit=-1) == []
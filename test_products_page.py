@@ -0,0 +1,34 @@
+"""
+صفحات قائمة المنتجات للتمرير اللانهائي (/api/products/page)
+"""
+
+import pytest
+
+from conftest import seed_store, logged_in_client
+from models import User
+
+
+@pytest.fixture(scope='module')
+def users(app):
+    with app.app_context():
+        admin_id = seed_store(2)
+        seller_id = User.query.filter_by(username='seller').one().id
+    return admin_id, seller_id
+
+
+def test_next_page_renders_rows(app, users):
+    client = logged_in_client(app, users[0])
+    response = client.get('/api/products/page?page=2')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['page'] == 2 and data['products']
+    assert data['html'].count('class="product-row"') == len(data['products'])
+    assert data['products'][0]['name'] in data['html']
+
+
+def test_sellers_cannot_page_the_admin_list(app, users):
+    client = logged_in_client(app, users[1])
+    response = client.get('/api/products/page?page=2')
+
+    assert response.status_code == 302
@@ -0,0 +1,69 @@
+"""
+ميزانية استعلامات SQL للصفحات الرئيسية
+كل صفحة تُطلب على متجر صغير وآخر أكبر بخمس مرات، ويُقرأ عدد الاستعلامات من ترويسة
+X-Query-Count (query_stats). الاختبار يفشل إذا تجاوز العدد ميزانية الصفحة أو زاد مع
+حجم البيانات، وهي علامة تحميل كسول (N+1) في القالب أو الاستعلام.
+"""
+
+import pytest
+
+from conftest import seed_store, logged_in_client
+
+SMALL_SCALE = 8
+LARGE_SCALE = 40
+
+# اسم المسار -> (الرابط، أقصى عدد استعلامات)
+QUERY_BUDGETS = {
+    'dashboard': ('/dashboard', 10),
+    'sales': ('/sales', 6),
+    'customers': ('/customers', 4),
+    'customer_account': ('/customers/1/account', 6),
+    'debts_report': ('/debts', 5),
+    'reports': ('/reports', 10),
+}
+
+
+def _query_count(client, url):
+    # الطلب الأول يملأ الذاكرة المؤقتة (إحصائيات الديون والكتالوج) والثاني هو المقاس
+    client.get(url)
+    response = client.get(url)
+    assert response.status_code == 200, f'{url}: {response.status_code}'
+    return int(response.headers['X-Query-Count'])
+
+
+@pytest.fixture(scope='module')
+def query_counts(app):
+    """عدد استعلامات كل صفحة لكل حجم بيانات: {الحجم: {المسار: العدد}}"""
+    counts = {}
+    for scale in (SMALL_SCALE, LARGE_SCALE):
+        with app.app_context():
+            admin_id = seed_store(scale)
+        client = logged_in_client(app, admin_id)
+        counts[scale] = {name: _query_count(client, url) for name, (url, _) in QUERY_BUDGETS.items()}
+    return counts
+
+
+@pytest.mark.parametrize('endpoint', list(QUERY_BUDGETS))
+def test_query_budget(query_counts, endpoint):
+    budget = QUERY_BUDGETS[endpoint][1]
+    small = query_counts[SMALL_SCALE][endpoint]
+    large = query_counts[LARGE_SCALE][endpoint]
+    assert large <= budget, f'{endpoint}: {large} استعلام والميزانية {budget}'
+    assert large <= small, f'{endpoint}: عدد الاستعلامات زاد مع حجم البيانات ({small} -> {large})'
+
+
+def test_streamed_response_counts_queries_after_headers(app):
+    with app.app_context():
+        admin_id = seed_store(SMALL_SCALE)
+    client = logged_in_client(app, admin_id)
+    stats = app.extensions['query_stats']
+    stats.reset()
+
+    response = client.get('/api/export/sales?format=ndjson')
+    assert response.status_code == 200
+    assert response.get_data()
+    response.close()
+
+    # استعلام الصفوف يُنفذ أثناء التدفق بعد إرسال الترويسات، فيظهر في الإحصائيات فقط
+    recorded = next(row for row in stats.endpoint_stats() if row['endpoint'] == 'api_export_sales')
+    assert recorded['max_queries'] > int(response.headers['X-Query-Count'])
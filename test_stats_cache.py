@@ -0,0 +1,62 @@
+"""
+ذاكرة الإحصائيات المؤقتة (stats_cache)
+القيمة التي حُسبت قبل مسح الذاكرة لا تُعاد بعده، سواء في ذاكرة العملية أو في Redis
+المشترك بين العمال (وهنا خادم Redis بسيط في الذاكرة يكفي لأوامر get و setex و incr).
+"""
+
+import pytest
+
+from stats_cache import StatsCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def setex(self, name, ttl, value):
+        self.values[name] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, name):
+        self.values[name] = str(int(self.values.get(name) or 0) + 1).encode()
+        return int(self.values[name])
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    cache = StatsCache(ttl=60)
+    if request.param == 'redis':
+        cache.backend = FakeRedis()
+    return cache
+
+
+def test_value_is_cached_until_invalidated(cache):
+    assert cache.get_or_compute('debt_stats', lambda: 1) == 1
+    assert cache.get_or_compute('debt_stats', lambda: 2) == 1
+
+    cache.invalidate()
+    assert cache.get_or_compute('debt_stats', lambda: 3) == 3
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_value_computed_during_invalidation_is_not_stored(cache):
+    def compute_while_committing():
+        cache.invalidate('debt_stats')
+        return 'stale'
+
+    assert cache.get_or_compute('debt_stats', compute_while_committing) == 'stale'
+    assert cache.get_or_compute('debt_stats', lambda: 'fresh') == 'fresh'
+
+
+def test_invalidation_from_another_worker_is_seen():
+    backend = FakeRedis()
+    worker, other_worker = StatsCache(), StatsCache()
+    worker.backend = other_worker.backend = backend
+
+    assert worker.get_or_compute('debt_stats', lambda: 'old') == 'old'
+    assert other_worker.get_or_compute('debt_stats', lambda: 'unused') == 'old'
+
+    other_worker.invalidate()
+    assert worker.get_or_compute('debt_stats', lambda: 'new') == 'new'
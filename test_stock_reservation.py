@@ -0,0 +1,73 @@
+"""
+حجز المخزون عند البيع (stock_reservation)
+الخصم شرطي في قاعدة البيانات: لا يُباع أكثر من المتوفر حتى لو قرأ طلب آخر قيمة قديمة،
+وفشل صنف واحد يلغي خصم كل أصناف البيع.
+"""
+
+import pytest
+from sqlalchemy import update
+
+from conftest import logged_in_client, set_stock, stock_of
+from models import db, Product, Sale
+from stock_reservation import requested_quantities, reserve_stock
+
+
+def _checkout(client, *lines):
+    items = [{'product_id': product_id, 'quantity': quantity, 'unit_price': 10.0, 'total_price': 10.0 * quantity}
+             for product_id, quantity in lines]
+    total = sum(item['total_price'] for item in items)
+    return client.post('/api/sales', json={'items': items, 'subtotal': total, 'total_amount': total})
+
+
+def test_requested_quantities_sums_repeated_products():
+    assert requested_quantities([
+        {'product_id': 1, 'quantity': 2}, {'product_id': '1', 'quantity': 1.5}, {'product_id': 2, 'quantity': 1}
+    ]) == {1: 3.5, 2: 1.0}
+    with pytest.raises(ValueError):
+        requested_quantities([{'product_id': 1, 'quantity': 0}])
+
+
+def test_sale_can_take_the_last_unit(app, store):
+    set_stock(1, 3)
+    response = _checkout(logged_in_client(app, store), (1, 2), (1, 1))
+
+    assert response.status_code == 200, response.get_json()
+    assert stock_of(1) == 0
+
+
+def test_insufficient_stock_deducts_nothing(app, store):
+    set_stock(1, 10)
+    set_stock(2, 1)
+    sales_before = Sale.query.count()
+
+    response = _checkout(logged_in_client(app, store), (1, 4), (2, 2))
+
+    assert response.status_code == 400
+    assert 'غير متوفرة' in response.get_json()['error']
+    assert stock_of(1) == 10
+    assert stock_of(2) == 1
+    assert Sale.query.count() == sales_before
+
+
+def test_unknown_product_is_rejected(store):
+    set_stock(1, 10)
+    with pytest.raises(ValueError, match='غير موجود'):
+        reserve_stock({1: 1, 99999: 1})
+    db.session.rollback()
+    assert stock_of(1) == 10
+
+
+def test_stale_read_cannot_oversell(store):
+    set_stock(1, 5)
+    product = db.session.get(Product, 1)
+    assert product.stock_quantity == 5
+
+    # بيع آخر يخصم 4 بعد أن قرأ هذا الطلب المخزون
+    db.session.execute(update(Product).where(Product.id == 1).values(stock_quantity=Product.stock_quantity - 4)
+                       .execution_options(synchronize_session=False))
+
+    with pytest.raises(ValueError):
+        reserve_stock({1: 2})
+    assert reserve_stock({1: 1}) == {1: product.wholesale_price}
+    db.session.commit()
+    assert stock_of(1) == 0